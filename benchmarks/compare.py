@@ -0,0 +1,77 @@
+"""Compare two benchmarks/e2e.py reports.
+
+    python -m benchmarks.compare baseline.json candidate.json --fail-above 10
+
+Prints the change of each latency percentile and of throughput per path. With
+--fail-above it exits 1 when a latency grows, or throughput drops, by more than that
+many percent.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+from typing import Optional
+
+_LATENCIES = [("ack_ms", "p50"), ("ack_ms", "p95"), ("ack_ms", "p99"), ("e2e_ms", "p50"), ("e2e_ms", "p95"), ("e2e_ms", "p99")]
+
+
+def _change(before: Optional[float], after: Optional[float]) -> Optional[float]:
+    if before is None or after is None or before == 0:
+        return None
+    return (after - before) / before * 100
+
+
+def compare(baseline: dict, candidate: dict, fail_above: Optional[float] = None) -> tuple[list[str], list[str]]:
+    """Return (report lines, regressions beyond fail_above)."""
+    lines = [f"{'path':<8}{'metric':<14}{'baseline':>11}{'candidate':>11}{'change':>9}"]
+    regressions = []
+    for path, after in candidate["paths"].items():
+        before = baseline["paths"].get(path)
+        if before is None:
+            lines.append(f"{path:<8}(not in baseline)")
+            continue
+        rows = [(f"{kind[:3]} {stat}", before[kind][stat], after[kind][stat], 1) for kind, stat in _LATENCIES]
+        rows.append(("updates/s", before["updates_per_s"], after["updates_per_s"], -1))
+        for name, old, new, direction in rows:
+            change = _change(old, new)
+            lines.append(f"{path:<8}{name:<14}{_fmt(old):>11}{_fmt(new):>11}{_pct(change):>9}")
+            if fail_above is not None and change is not None and change * direction > fail_above:
+                regressions.append(f"{path} {name}: {_pct(change)}")
+        if after["errors"] > before["errors"]:
+            regressions.append(f"{path} errors: {before['errors']} -> {after['errors']}")
+    return lines, regressions
+
+
+def _fmt(value: Optional[float]) -> str:
+    return "-" if value is None else f"{value:.1f}"
+
+
+def _pct(value: Optional[float]) -> str:
+    return "-" if value is None else f"{value:+.1f}%"
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Compare two telecode benchmark reports.")
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    parser.add_argument("--fail-above", type=float, metavar="PCT", help="Exit 1 on a regression above PCT percent")
+    args = parser.parse_args(argv)
+    with open(args.baseline, encoding="utf-8") as handle:
+        baseline = json.load(handle)
+    with open(args.candidate, encoding="utf-8") as handle:
+        candidate = json.load(handle)
+    if baseline.get("config") != candidate.get("config"):
+        print("Warning: the reports were run with different settings.", file=sys.stderr)
+    print(f"baseline {baseline.get('git_rev') or '?'} vs candidate {candidate.get('git_rev') or '?'}")
+    lines, regressions = compare(baseline, candidate, args.fail_above)
+    print("\n".join(lines))
+    if regressions:
+        print("Regressions:\n" + "\n".join(f"  {item}" for item in regressions))
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,307 @@
+"""End-to-end benchmark: real telecode server, fake engines, mock Telegram API.
+
+The server runs unchanged in a subprocess. The only differences from production are:
+- its Telegram base URL points at a local mock (TELEGRAM_API_URL);
+- `claude` and `codex` on PATH are benchmarks/fake_engine.py;
+- voice notes use a stand-in transcriber with a fixed latency.
+
+Each chat sends its updates one after another (closed loop), because updates queued on
+the same chat would be merged into one turn. Two latencies are recorded per update:
+- ack: time for the webhook to answer;
+- e2e: time from sending the update until the mock API receives the reply.
+Results are written as JSON for benchmarks/compare.py.
+
+    python -m benchmarks.e2e --chats 8 --updates 20 --out results.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import re
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from typing import Optional
+
+import httpx
+
+from benchmarks.mock_telegram import MockTelegram
+from telecode.bench import percentiles
+
+SCHEMA = 1
+PATHS = ("text", "photo", "voice")
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_BOT_TOKEN = "123456:bench"
+_SECRET = "bench-secret"
+_USER = {"id": 424242, "is_bot": False, "first_name": "Bench", "username": "bench"}
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def build_update(update_id: int, chat_id: int, message_id: int, path: str, marker: str, mock: MockTelegram) -> dict:
+    message: dict = {
+        "message_id": message_id,
+        "date": int(time.time()),
+        "chat": {"id": chat_id, "type": "private"},
+        "from": _USER,
+    }
+    if path == "text":
+        message["text"] = f"{marker} summarize the repository layout"
+    elif path == "photo":
+        data = os.urandom(32 << 10)
+        mock.add_file(f"photo-{marker}", data)
+        message["caption"] = f"{marker} what is in this picture?"
+        message["photo"] = [
+            {"file_id": f"photo-{marker}", "file_unique_id": f"u-photo-{marker}", "width": 1280, "height": 960, "file_size": len(data)}
+        ]
+    elif path == "voice":
+        # The stand-in transcriber returns the note's bytes, so the transcript carries the marker.
+        data = f"{marker} read me the latest test results".encode()
+        mock.add_file(f"voice-{marker}", data)
+        message["voice"] = {"file_id": f"voice-{marker}", "file_unique_id": f"u-voice-{marker}", "duration": 3, "file_size": len(data)}
+    else:
+        raise ValueError(f"unknown path {path!r}")
+    return {"update_id": update_id, "message": message}
+
+
+def _write_engine_wrappers(bin_dir: str) -> None:
+    fake_engine = os.path.join(REPO_ROOT, "benchmarks", "fake_engine.py")
+    for engine in ("claude", "codex"):
+        path = os.path.join(bin_dir, engine)
+        with open(path, "w", encoding="utf-8") as handle:
+            handle.write(f'#!/bin/sh\nexec "{sys.executable}" "{fake_engine}" {engine} "$@"\n')
+        os.chmod(path, 0o755)
+
+
+def _server_env(args: argparse.Namespace, workdir: str, bin_dir: str, mock: MockTelegram) -> dict[str, str]:
+    env = dict(os.environ)
+    env.update(
+        {
+            "PATH": bin_dir + os.pathsep + env.get("PATH", ""),
+            "HOME": workdir,
+            "PYTHONPATH": REPO_ROOT + os.pathsep + env.get("PYTHONPATH", ""),
+            "TELEGRAM_BOT_TOKEN": _BOT_TOKEN,
+            "TELEGRAM_WEBHOOK_SECRET": _SECRET,
+            "TELEGRAM_API_URL": mock.url,
+            "TELECODE_ENGINE": args.engine,
+            "TELECODE_STREAM": "1" if args.stream else "0",
+            "TELECODE_WARM": "1" if args.warm else "0",
+            # Measure telecode, not Telegram's flood limits; override with --env to include them.
+            "TELECODE_SEND_RATE_PER_CHAT": "1000",
+            "TELECODE_SEND_BURST_PER_CHAT": "1000",
+            "TELECODE_SEND_RATE_GLOBAL": "10000",
+            "BENCH_ENGINE_LATENCY_MS": str(args.engine_latency_ms),
+            "BENCH_ENGINE_OUTPUT_CHARS": str(args.output_chars),
+        }
+    )
+    if not args.real_whisper:
+        env["BENCH_WHISPER_LATENCY_MS"] = str(args.whisper_latency_ms)
+    for item in args.env:
+        key, _, value = item.partition("=")
+        env[key] = value
+    return env
+
+
+async def _wait_healthy(client: httpx.AsyncClient, base_url: str, proc: subprocess.Popen, timeout_s: float) -> None:
+    deadline = time.monotonic() + timeout_s
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"telecode exited with code {proc.returncode}; see server.log")
+        try:
+            if (await client.get(f"{base_url}/health")).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.1)
+    raise RuntimeError("telecode did not become healthy")
+
+
+async def _run_chat(
+    client: httpx.AsyncClient,
+    webhook: str,
+    mock: MockTelegram,
+    chat_index: int,
+    args: argparse.Namespace,
+    results: dict[str, dict],
+) -> None:
+    chat_id = 10_000 + chat_index
+    for index in range(args.updates):
+        path = args.paths[(chat_index + index) % len(args.paths)]
+        marker = f"bench-{chat_index}-{index}"
+        update_id = chat_index * 1_000_000 + index + 1
+        update = build_update(update_id, chat_id, index + 1, path, marker, mock)
+        stats = results[path]
+        reply = mock.expect(marker)
+        started = time.perf_counter()
+        try:
+            response = await client.post(webhook, json=update)
+            stats["ack_ms"].append((time.perf_counter() - started) * 1000)
+            response.raise_for_status()
+            finished = await asyncio.wait_for(reply, args.timeout_s)
+            stats["e2e_ms"].append((finished - started) * 1000)
+        except Exception as exc:
+            stats["errors"] += 1
+            print(f"{marker} ({path}) failed: {exc!r}", file=sys.stderr)
+
+
+async def run(args: argparse.Namespace) -> dict:
+    workdir = tempfile.mkdtemp(prefix="telecode-bench-")
+    bin_dir = os.path.join(workdir, "bin")
+    os.makedirs(bin_dir)
+    _write_engine_wrappers(bin_dir)
+    mock = MockTelegram(free_port(), latency_ms=args.telegram_latency_ms)
+    mock.start()
+    port = free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    log_path = os.path.join(workdir, "server.log")
+    log = open(log_path, "wb")
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "benchmarks.serve", "--port", str(port)],
+        cwd=workdir,
+        env=_server_env(args, workdir, bin_dir, mock),
+        stdout=log,
+        stderr=subprocess.STDOUT,
+    )
+    results: dict[str, dict] = {path: {"ack_ms": [], "e2e_ms": [], "errors": 0} for path in args.paths}
+    try:
+        limits = httpx.Limits(max_connections=args.chats + 4)
+        async with httpx.AsyncClient(timeout=args.timeout_s, limits=limits) as client:
+            await _wait_healthy(client, base_url, proc, 30)
+            webhook = f"{base_url}/telegram/{_SECRET}"
+            started = time.perf_counter()
+            await asyncio.gather(*(_run_chat(client, webhook, mock, chat, args, results) for chat in range(args.chats)))
+            elapsed_s = time.perf_counter() - started
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+            proc.wait()
+        log.close()
+        mock.stop()
+        if args.keep_workdir:
+            print(f"Work directory kept at {workdir}", file=sys.stderr)
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    paths = {}
+    for path, stats in results.items():
+        paths[path] = {
+            "ack_ms": percentiles(stats["ack_ms"]),
+            "e2e_ms": percentiles(stats["e2e_ms"]),
+            "errors": stats["errors"],
+            "updates_per_s": round(len(stats["e2e_ms"]) / elapsed_s, 3),
+        }
+    return {
+        "schema": SCHEMA,
+        "version": _version(),
+        "git_rev": _git_rev(),
+        "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "config": {
+            "chats": args.chats,
+            "updates": args.updates,
+            "paths": list(args.paths),
+            "engine": args.engine,
+            "engine_latency_ms": args.engine_latency_ms,
+            "output_chars": args.output_chars,
+            "whisper_latency_ms": None if args.real_whisper else args.whisper_latency_ms,
+            "telegram_latency_ms": args.telegram_latency_ms,
+            "stream": args.stream,
+            "warm": args.warm,
+            "env": list(args.env),
+        },
+        "elapsed_s": round(elapsed_s, 3),
+        "paths": paths,
+        "telegram_calls": dict(sorted(mock.calls.items())),
+    }
+
+
+def format_report(report: dict) -> str:
+    lines = [f"{'path':<8}{'ok':>6}{'err':>5}{'ack p50':>10}{'ack p99':>10}{'e2e p50':>10}{'e2e p95':>10}{'e2e p99':>10}{'upd/s':>9}"]
+    for path, stats in report["paths"].items():
+        ack, e2e = stats["ack_ms"], stats["e2e_ms"]
+        lines.append(
+            f"{path:<8}{e2e['count']:>6}{stats['errors']:>5}"
+            f"{_ms(ack['p50']):>10}{_ms(ack['p99']):>10}"
+            f"{_ms(e2e['p50']):>10}{_ms(e2e['p95']):>10}{_ms(e2e['p99']):>10}"
+            f"{stats['updates_per_s']:>9.2f}"
+        )
+    calls = ", ".join(f"{method}={count}" for method, count in report["telegram_calls"].items())
+    lines.append(f"Telegram calls: {calls}")
+    return "\n".join(lines)
+
+
+def _ms(value: Optional[float]) -> str:
+    return "-" if value is None else f"{value:.1f}"
+
+
+def _version() -> str:
+    try:
+        with open(os.path.join(REPO_ROOT, "pyproject.toml"), encoding="utf-8") as handle:
+            match = re.search(r'^version = "([^"]+)"', handle.read(), re.MULTILINE)
+        return match.group(1) if match else "unknown"
+    except OSError:
+        return "unknown"
+
+
+def _git_rev() -> Optional[str]:
+    try:
+        completed = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT, capture_output=True, text=True, timeout=10
+        )
+    except (OSError, subprocess.TimeoutExpired):
+        return None
+    return completed.stdout.strip() or None
+
+
+def _parse_args(argv: Optional[list[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="End-to-end telecode benchmark with fake engines and a mock Telegram API.")
+    parser.add_argument("--chats", type=int, default=4, help="Concurrent chats (default: 4)")
+    parser.add_argument("--updates", type=int, default=10, help="Updates sent by each chat (default: 10)")
+    parser.add_argument("--paths", default=",".join(PATHS), help="Comma-separated update kinds: text,photo,voice")
+    parser.add_argument("--engine", choices=["claude", "codex"], default="claude")
+    parser.add_argument("--engine-latency-ms", type=int, default=200, help="Fake engine time per turn")
+    parser.add_argument("--output-chars", type=int, default=200, help="Length of each fake answer")
+    parser.add_argument("--whisper-latency-ms", type=int, default=300, help="Stand-in transcription time")
+    parser.add_argument("--real-whisper", action="store_true", help="Transcribe with the installed Whisper instead")
+    parser.add_argument("--telegram-latency-ms", type=float, default=0.0, help="Added to every mock Bot API call")
+    parser.add_argument("--stream", action="store_true", help="Run with TELECODE_STREAM=1")
+    parser.add_argument("--warm", action="store_true", help="Run with TELECODE_WARM=1")
+    parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE", help="Extra server environment")
+    parser.add_argument("--timeout-s", type=float, default=60.0, help="Give up on one reply after this long")
+    parser.add_argument("--out", help="Write the JSON report here")
+    parser.add_argument("--keep-workdir", action="store_true", help="Keep the work directory and server.log")
+    args = parser.parse_args(argv)
+    args.paths = [path.strip() for path in args.paths.split(",") if path.strip()]
+    unknown = set(args.paths) - set(PATHS)
+    if unknown or not args.paths:
+        parser.error(f"--paths must be a subset of {','.join(PATHS)}")
+    return args
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    args = _parse_args(argv)
+    report = asyncio.run(run(args))
+    print(format_report(report))
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as handle:
+            json.dump(report, handle, indent=2)
+            handle.write("\n")
+        print(f"Wrote {args.out}")
+    return 1 if any(stats["errors"] for stats in report["paths"].values()) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
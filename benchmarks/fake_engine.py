@@ -0,0 +1,84 @@
+"""Stand-in for the `claude` and `codex` CLIs used by the benchmarks.
+
+Run as `fake_engine.py claude|codex <cli args...>`. It speaks the same output formats
+telecode reads (plain text, Claude stream-json in and out, Codex --json events).
+
+- BENCH_ENGINE_LATENCY_MS: how long each turn takes (default 200).
+- BENCH_ENGINE_OUTPUT_CHARS: length of each answer (default 200).
+
+Every answer starts with "ANSWER <marker>", where marker is the first bench-... token in
+the prompt, so the mock Telegram API can match a reply to the update that caused it.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import re
+import sys
+import time
+import uuid
+
+_MARKER = re.compile(r"bench-[0-9-]+[0-9]")
+_FILLER = "lorem ipsum dolor sit amet consectetur adipiscing elit "
+
+
+def answer_for(prompt: str) -> str:
+    match = _MARKER.search(prompt)
+    head = f"ANSWER {match.group(0) if match else 'unknown'}"
+    size = int(os.getenv("BENCH_ENGINE_OUTPUT_CHARS", "200"))
+    filler = (_FILLER * (size // len(_FILLER) + 1))[: max(0, size - len(head) - 1)]
+    return f"{head} {filler}".strip()
+
+
+def _think() -> None:
+    time.sleep(int(os.getenv("BENCH_ENGINE_LATENCY_MS", "200")) / 1000)
+
+
+def _emit(event: dict) -> None:
+    sys.stdout.write(json.dumps(event) + "\n")
+    sys.stdout.flush()
+
+
+def _claude_turn(prompt: str, stream: bool) -> None:
+    _think()
+    text = answer_for(prompt)
+    if not stream:
+        print(text)
+        return
+    _emit({"type": "assistant", "message": {"role": "assistant", "content": [{"type": "text", "text": text}]}})
+    _emit({"type": "result", "subtype": "success", "is_error": False, "result": text})
+
+
+def run_claude(args: list[str]) -> None:
+    stream = "stream-json" in args
+    if "--input-format" in args:
+        # Warm-worker mode: one user message per stdin line, one result per message.
+        for line in sys.stdin:
+            message = json.loads(line).get("message") or {}
+            text = "".join(part.get("text", "") for part in message.get("content") or [])
+            _claude_turn(text, stream=True)
+        return
+    _claude_turn(args[-1] if args else "", stream)
+
+
+def run_codex(args: list[str]) -> None:
+    prompt = sys.stdin.read() if "--image" in args else (args[-1] if args else "")
+    thread_id = args[args.index("resume") + 1] if "resume" in args else str(uuid.uuid4())
+    _emit({"type": "thread.started", "thread_id": thread_id})
+    _emit({"type": "turn.started"})
+    _think()
+    _emit({"type": "item.completed", "item": {"id": "item_0", "type": "agent_message", "text": answer_for(prompt)}})
+    _emit({"type": "turn.completed", "usage": {"input_tokens": len(prompt) // 4, "output_tokens": 50}})
+
+
+def main() -> None:
+    engine, args = sys.argv[1], sys.argv[2:]
+    if engine == "codex":
+        run_codex(args)
+    else:
+        run_claude(args)
+
+
+if __name__ == "__main__":
+    main()
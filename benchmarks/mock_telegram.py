@@ -0,0 +1,134 @@
+"""A local stand-in for the Telegram Bot API, run in a background thread.
+
+It answers every Bot API method telecode uses, serves files registered with add_file
+for getFile and downloads, and counts calls per method. Any outgoing text that contains
+"ANSWER <marker>" completes the future returned by expect(marker).
+"""
+
+from __future__ import annotations
+
+import asyncio
+import itertools
+import json
+import re
+import threading
+import time
+from collections import Counter
+from typing import Optional
+
+import uvicorn
+from fastapi import FastAPI, Request, Response
+
+_ANSWER = re.compile(r"ANSWER (bench-[0-9-]+[0-9])")
+
+
+class MockTelegram:
+    def __init__(self, port: int, latency_ms: float = 0.0) -> None:
+        self.port = port
+        self.latency_s = latency_ms / 1000
+        self.calls: Counter[str] = Counter()
+        self._files: dict[str, bytes] = {}
+        self._expected: dict[str, tuple[asyncio.AbstractEventLoop, asyncio.Future]] = {}
+        self._lock = threading.Lock()
+        self._message_ids = itertools.count(1000)
+        self._server: Optional[uvicorn.Server] = None
+        self._thread: Optional[threading.Thread] = None
+        self.app = self._build_app()
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    def add_file(self, file_id: str, data: bytes) -> None:
+        with self._lock:
+            self._files[file_id] = data
+
+    def expect(self, marker: str) -> asyncio.Future:
+        """Future resolved with time.perf_counter() when a reply carrying marker is sent."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        with self._lock:
+            self._expected[marker] = (loop, future)
+        return future
+
+    def start(self) -> None:
+        config = uvicorn.Config(self.app, host="127.0.0.1", port=self.port, log_level="warning", access_log=False)
+        self._server = uvicorn.Server(config)
+        self._thread = threading.Thread(target=self._server.run, name="mock-telegram", daemon=True)
+        self._thread.start()
+        deadline = time.monotonic() + 10
+        while not self._server.started:
+            if time.monotonic() > deadline:
+                raise RuntimeError("mock Telegram API did not start")
+            time.sleep(0.02)
+
+    def stop(self) -> None:
+        if self._server is not None:
+            self._server.should_exit = True
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+    def _complete(self, text: str) -> None:
+        now = time.perf_counter()
+        for marker in _ANSWER.findall(text):
+            with self._lock:
+                waiter = self._expected.pop(marker, None)
+            if waiter is not None:
+                loop, future = waiter
+                loop.call_soon_threadsafe(_resolve, future, now)
+
+    def _build_app(self) -> FastAPI:
+        app = FastAPI()
+
+        @app.post("/bot{token}/{method}")
+        async def bot_method(token: str, method: str, request: Request) -> dict:
+            body = await request.body()
+            self.calls[method] += 1
+            if self.latency_s:
+                await asyncio.sleep(self.latency_s)
+            payload = _json_or_empty(body, request.headers.get("content-type", ""))
+            # Uploads are multipart; the answer marker is found in the raw document bytes.
+            self._complete(json.dumps(payload) if payload else body.decode("utf-8", "replace"))
+            return {"ok": True, "result": self._result(method, payload)}
+
+        @app.get("/file/bot{token}/files/{file_id}")
+        async def download(token: str, file_id: str) -> Response:
+            self.calls["download"] += 1
+            with self._lock:
+                data = self._files.get(file_id)
+            if data is None:
+                return Response(status_code=404)
+            return Response(content=data, media_type="application/octet-stream")
+
+        return app
+
+    def _result(self, method: str, payload: dict) -> object:
+        if method in {"sendMessage", "sendAudio", "sendDocument"}:
+            message_id = next(self._message_ids)
+            result: dict = {"message_id": message_id, "date": int(time.time()), "chat": {"id": payload.get("chat_id")}}
+            if method == "sendAudio":
+                result["audio"] = {"file_id": f"audio-{message_id}", "file_unique_id": f"u-audio-{message_id}"}
+            return result
+        if method == "getFile":
+            file_id = str(payload.get("file_id"))
+            with self._lock:
+                size = len(self._files.get(file_id, b""))
+            return {"file_id": file_id, "file_unique_id": f"u-{file_id}", "file_size": size, "file_path": f"files/{file_id}"}
+        if method in {"getMyCommands", "getUpdates"}:
+            return []
+        return True
+
+
+def _json_or_empty(body: bytes, content_type: str) -> dict:
+    if "json" not in content_type:
+        return {}
+    try:
+        value = json.loads(body)
+    except ValueError:
+        return {}
+    return value if isinstance(value, dict) else {}
+
+
+def _resolve(future: asyncio.Future, value: float) -> None:
+    if not future.done():
+        future.set_result(value)
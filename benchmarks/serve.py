@@ -0,0 +1,43 @@
+"""Run the real telecode FastAPI app for the benchmarks.
+
+With BENCH_WHISPER_LATENCY_MS set, voice notes go to a stand-in transcriber that waits
+that long and returns the note's bytes as the transcript. This lets the voice path be
+measured on hosts without Whisper, numpy and ffmpeg. Everything else is unchanged.
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import time
+
+import uvicorn
+
+from telecode import metrics, server, tracing
+
+
+def _stand_in_transcriber(latency_s: float):
+    def transcribe(audio: bytes | str) -> str:
+        with tracing.span("transcribe"), metrics.WHISPER_SECONDS.time():
+            time.sleep(latency_s)
+            if isinstance(audio, str):
+                with open(audio, "rb") as handle:
+                    audio = handle.read()
+            return audio.decode("utf-8", "replace")
+
+    return transcribe
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, required=True)
+    args = parser.parse_args()
+    latency_ms = os.getenv("BENCH_WHISPER_LATENCY_MS")
+    if latency_ms:
+        server.transcribe_with_whisper = _stand_in_transcriber(float(latency_ms) / 1000)
+    uvicorn.run(server.app, host=args.host, port=args.port, log_level="warning", access_log=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+from __future__ import annotations
+
+import os
+import shutil
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Iterator, Optional
+
+
+@dataclass
+class _Artifact:
+    size: int
+    last_used: float
+    refs: int = 0
+
+
+class ArtifactStore:
+    """Temp files under one directory, kept within a byte and age budget.
+
+    Files handed to a running engine turn are leased; a leased file is never evicted.
+    Released files stay on disk until the background sweeper drops them, oldest use first,
+    once they exceed max_age_s or the directory exceeds max_bytes.
+    """
+
+    def __init__(
+        self,
+        root: str,
+        max_bytes: int = 512 << 20,
+        max_age_s: float = 86400,
+        sweep_interval_s: float = 60,
+    ) -> None:
+        self.root = root
+        self.max_bytes = max_bytes
+        self.max_age_s = max_age_s
+        self.sweep_interval_s = sweep_interval_s
+        self.evicted = 0
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[str, _Artifact] = OrderedDict()
+        self._bytes = 0
+        self._wake = threading.Event()
+        self._closed = False
+        self._sweeper: Optional[threading.Thread] = None
+        os.makedirs(root, exist_ok=True)
+        self._index_existing()
+        if self._entries:
+            self._ensure_sweeper()
+            self._wake.set()
+
+    @property
+    def total_bytes(self) -> int:
+        return self._bytes
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def write(self, data: bytes, prefix: str, suffix: str) -> str:
+        """Write data to a new file and return its path, leased to the caller."""
+        path = os.path.join(self.root, f"{prefix}_{uuid.uuid4().hex}{suffix}")
+        with open(path, "wb") as handle:
+            handle.write(data)
+        return self.add(path)
+
+    def link(self, source: str, prefix: str, suffix: str) -> str:
+        """Hard-link (or copy) source into the store and return the new path, leased."""
+        path = os.path.join(self.root, f"{prefix}_{uuid.uuid4().hex}{suffix}")
+        link_or_copy(source, path)
+        return self.add(path)
+
+    def add(self, path: str) -> str:
+        """Adopt a file already written under root, leased to the caller."""
+        size = os.path.getsize(path)
+        with self._lock:
+            self._entries[path] = _Artifact(size, time.time(), refs=1)
+            self._bytes += size
+            over_budget = self._bytes > self.max_bytes
+            self._ensure_sweeper()
+        if over_budget:
+            self._wake.set()
+        return path
+
+    def acquire(self, path: str) -> bool:
+        """Lease an existing artifact; returns False if it has already been evicted."""
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is None:
+                return False
+            entry.refs += 1
+            entry.last_used = time.time()
+            self._entries.move_to_end(path)
+            return True
+
+    def release(self, path: Optional[str]) -> None:
+        if not path:
+            return
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is None or entry.refs == 0:
+                return
+            entry.refs -= 1
+            entry.last_used = time.time()
+            self._entries.move_to_end(path)
+
+    @contextmanager
+    def lease(self, path: str) -> Iterator[bool]:
+        acquired = self.acquire(path)
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                self.release(path)
+
+    def sweep(self, now: Optional[float] = None) -> int:
+        """Delete expired and least recently used unleased files; returns how many were removed."""
+        now = time.time() if now is None else now
+        cutoff = now - self.max_age_s
+        victims: list[str] = []
+        with self._lock:
+            excess = self._bytes - self.max_bytes
+            for path, entry in list(self._entries.items()):
+                if entry.refs:
+                    continue
+                if entry.last_used >= cutoff and excess <= 0:
+                    continue
+                del self._entries[path]
+                self._bytes -= entry.size
+                excess -= entry.size
+                victims.append(path)
+            self.evicted += len(victims)
+        for path in victims:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            except OSError as exc:
+                print(f"Warning: failed to remove {path}: {exc}")
+        return len(victims)
+
+    def close(self) -> None:
+        self._closed = True
+        self._wake.set()
+        if self._sweeper is not None:
+            self._sweeper.join()
+
+    def _index_existing(self) -> None:
+        try:
+            entries = list(os.scandir(self.root))
+        except OSError:
+            return
+        found = []
+        for entry in entries:
+            if not entry.is_file(follow_symlinks=False):
+                continue
+            stat = entry.stat(follow_symlinks=False)
+            found.append((stat.st_mtime, entry.path, stat.st_size))
+        for mtime, path, size in sorted(found):
+            self._entries[path] = _Artifact(size, mtime)
+            self._bytes += size
+
+    def _ensure_sweeper(self) -> None:
+        if self._sweeper is None and not self._closed:
+            self._sweeper = threading.Thread(target=self._sweep_loop, name="telecode-sweeper", daemon=True)
+            self._sweeper.start()
+
+    def _sweep_loop(self) -> None:
+        while not self._closed:
+            self._wake.wait(self.sweep_interval_s)
+            self._wake.clear()
+            if self._closed:
+                return
+            self.sweep()
+
+
+def link_or_copy(source: str, dest: str) -> None:
+    """Hard-link source to dest, copying instead when linking is not possible."""
+    try:
+        os.link(source, dest)
+    except OSError:
+        temp_path = f"{dest}.{uuid.uuid4().hex}.part"
+        shutil.copyfile(source, temp_path)
+        os.replace(temp_path, dest)
@@ -0,0 +1,405 @@
+"""`telecode bench`: fire synthetic Telegram updates at a webhook and measure the acks.
+
+Updates look like what Telegram sends: text, inline-button callbacks, photos, voice
+notes, albums (several photo updates sharing a media_group_id) and edited messages.
+They are spread over --chats chats.
+
+- fixed mode: updates are sent evenly spaced, with at most --concurrency requests in
+  flight. A slow server therefore slows the sender down, and latency is timed from the
+  actual send.
+- open mode: updates arrive as a Poisson process and are sent on schedule whatever the
+  server does. Latency is timed from the scheduled arrival, so queueing in the client
+  counts against the server.
+
+With --ramp the rate grows step by step until a step breaks a threshold. The last rate
+that held is reported as the saturation point.
+
+Ack latency is the time until the webhook answers. Photos and voice notes carry made-up
+file ids, so the work after the ack fails at getFile unless the server's
+TELEGRAM_API_URL points at a mock such as benchmarks/mock_telegram.py.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+from collections import Counter
+from typing import Optional
+
+import httpx
+
+KINDS = ("text", "callback", "photo", "voice", "album", "edit")
+DEFAULT_MIX = "text=50,callback=10,photo=10,voice=10,album=10,edit=10"
+
+_PROMPTS = (
+    "What does this repository do?",
+    "Run the tests and tell me what fails.",
+    "Refactor the config loader to read environment variables once.",
+    "Why is the webhook slow under load? Look at the dispatcher.",
+    "Summarize the last commit.",
+    "Add a docstring to every public function in telecode/jobs.py and keep the style of the file.",
+    "ok",
+    "thanks!",
+)
+_CAPTIONS = ("", "", "What is wrong in this screenshot?", "Implement this design.")
+
+
+def parse_mix(raw: str) -> dict[str, float]:
+    """Parse "text=50,photo=10" into normalized weights."""
+    weights: dict[str, float] = {}
+    for part in raw.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        kind, _, weight = part.partition("=")
+        kind = kind.strip()
+        if kind not in KINDS:
+            raise ValueError(f"unknown update kind {kind!r}; expected one of {', '.join(KINDS)}")
+        try:
+            value = float(weight) if weight else 1.0
+        except ValueError:
+            raise ValueError(f"invalid weight for {kind}: {weight!r}") from None
+        if value < 0:
+            raise ValueError(f"weight for {kind} must not be negative")
+        weights[kind] = value
+    total = sum(weights.values())
+    if total <= 0:
+        raise ValueError("the mix needs at least one positive weight")
+    return {kind: value / total for kind, value in weights.items() if value > 0}
+
+
+class UpdateFactory:
+    """Builds realistic update payloads with unique update ids."""
+
+    def __init__(self, chats: int, user_id: int, username: str, seed: Optional[int] = None) -> None:
+        self.chats = max(1, chats)
+        self.user = {"id": user_id, "is_bot": False, "first_name": "Bench", "username": username}
+        self._rng = random.Random(seed)
+        # Start somewhere random so a second run is not dropped as duplicates.
+        self._update_id = self._rng.randrange(1 << 30)
+        self._message_ids: dict[int, int] = {}
+        self._groups = 0
+
+    def make(self, kind: str) -> list[dict]:
+        """One user action; an album is several updates."""
+        chat_id = 10_000 + self._rng.randrange(self.chats)
+        if kind == "album":
+            self._groups += 1
+            group = f"bench{self._groups}"
+            return [
+                self._wrap("message", self._photo(chat_id, caption=(index == 0), media_group_id=group))
+                for index in range(self._rng.randint(2, 4))
+            ]
+        if kind == "text":
+            message = self._message(chat_id)
+            message["text"] = self._rng.choice(_PROMPTS)
+            return [self._wrap("message", message)]
+        if kind == "photo":
+            return [self._wrap("message", self._photo(chat_id, caption=True))]
+        if kind == "voice":
+            message = self._message(chat_id)
+            message["voice"] = {
+                **self._file("voice"),
+                "duration": self._rng.randint(1, 60),
+                "mime_type": "audio/ogg",
+                "file_size": self._rng.randint(4_000, 400_000),
+            }
+            return [self._wrap("message", message)]
+        if kind == "callback":
+            message = self._message(chat_id)
+            message["from"] = {"id": 1, "is_bot": True, "first_name": "telecode"}
+            message["text"] = "Pick one:\n1. Yes\n2. No"
+            callback = {
+                "id": str(self._rng.getrandbits(63)),
+                "from": self.user,
+                "message": message,
+                "chat_instance": str(chat_id),
+                "data": f"opt:{self._rng.randint(1, 2)}",
+            }
+            return [self._wrap("callback_query", callback)]
+        if kind == "edit":
+            message = self._message(chat_id, new=False)
+            message["text"] = self._rng.choice(_PROMPTS)
+            message["edit_date"] = message["date"] + self._rng.randint(1, 30)
+            return [self._wrap("edited_message", message)]
+        raise ValueError(f"unknown update kind {kind!r}")
+
+    def _wrap(self, field: str, payload: dict) -> dict:
+        self._update_id += 1
+        return {"update_id": self._update_id, field: payload}
+
+    def _message(self, chat_id: int, new: bool = True) -> dict:
+        last = self._message_ids.get(chat_id, 0)
+        if new or not last:
+            last += 1
+            self._message_ids[chat_id] = last
+        return {
+            "message_id": last,
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private", "first_name": "Bench"},
+            "from": self.user,
+        }
+
+    def _photo(self, chat_id: int, caption: bool, media_group_id: Optional[str] = None) -> dict:
+        message = self._message(chat_id)
+        base = self._file("photo")
+        message["photo"] = [
+            {
+                "file_id": f"{base['file_id']}-{width}",
+                "file_unique_id": f"{base['file_unique_id']}-{width}",
+                "width": width,
+                "height": width * 3 // 4,
+                "file_size": width * width // 8,
+            }
+            for width in (90, 320, 1280)
+        ]
+        if media_group_id:
+            message["media_group_id"] = media_group_id
+        text = self._rng.choice(_CAPTIONS) if caption else ""
+        if text:
+            message["caption"] = text
+        return message
+
+    def _file(self, prefix: str) -> dict:
+        token = f"{self._rng.getrandbits(64):016x}"
+        return {"file_id": f"bench-{prefix}-{token}", "file_unique_id": f"u{token}"}
+
+
+def percentiles(samples: list[float]) -> dict[str, Optional[float]]:
+    """Nearest-rank p50/p95/p99 plus mean and max, rounded to 0.01."""
+    if not samples:
+        return {"count": 0, "p50": None, "p95": None, "p99": None, "mean": None, "max": None}
+    ordered = sorted(samples)
+
+    def rank(q: float) -> float:
+        return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))], 2)
+
+    return {
+        "count": len(ordered),
+        "p50": rank(0.50),
+        "p95": rank(0.95),
+        "p99": rank(0.99),
+        "mean": round(sum(ordered) / len(ordered), 2),
+        "max": round(ordered[-1], 2),
+    }
+
+
+async def _post(
+    client: httpx.AsyncClient,
+    url: str,
+    kind: str,
+    update: dict,
+    started: float,
+    samples: list[tuple[str, float, Optional[str]]],
+) -> None:
+    error = None
+    try:
+        response = await client.post(url, json=update)
+        if response.status_code >= 300:
+            error = f"HTTP {response.status_code}"
+    except httpx.TimeoutException:
+        error = "timeout"
+    except httpx.HTTPError as exc:
+        error = type(exc).__name__
+    samples.append((kind, (time.perf_counter() - started) * 1000, error))
+
+
+async def run_step(
+    client: httpx.AsyncClient,
+    url: str,
+    factory: UpdateFactory,
+    mix: dict[str, float],
+    rate: float,
+    duration_s: float,
+    mode: str = "fixed",
+    concurrency: int = 64,
+    seed: Optional[int] = None,
+) -> dict:
+    """Send rate updates per second for duration_s and summarize the acks.
+
+    The updates of an album go out together and use up as many ticks of the schedule.
+    """
+    rng = random.Random(seed)
+    kinds, weights = list(mix), list(mix.values())
+    slots = asyncio.Semaphore(max(1, concurrency)) if mode == "fixed" else None
+    samples: list[tuple[str, float, Optional[str]]] = []
+    tasks: set[asyncio.Task] = set()
+    begin = time.perf_counter()
+    due = 0.0
+    sent = 0
+    while due < duration_s:
+        delay = begin + due - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        kind = rng.choices(kinds, weights)[0]
+        updates = factory.make(kind)
+        for update in updates:
+            if slots is not None:
+                await slots.acquire()
+                task = asyncio.create_task(_post(client, url, kind, update, time.perf_counter(), samples))
+                task.add_done_callback(lambda _: slots.release())
+            else:
+                task = asyncio.create_task(_post(client, url, kind, update, begin + due, samples))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+            sent += 1
+            due += rng.expovariate(rate) if mode == "open" else 1 / rate
+    if tasks:
+        await asyncio.gather(*tasks)
+    return summarize(samples, rate, time.perf_counter() - begin, sent)
+
+
+def summarize(samples: list[tuple[str, float, Optional[str]]], rate: float, elapsed_s: float, sent: int) -> dict:
+    errors = Counter(error for _, _, error in samples if error)
+    by_kind: dict[str, list[float]] = {}
+    for kind, latency_ms, error in samples:
+        if error is None:
+            by_kind.setdefault(kind, []).append(latency_ms)
+    ok = [latency for latencies in by_kind.values() for latency in latencies]
+    failed = sum(errors.values())
+    return {
+        "target_rate": round(rate, 3),
+        "achieved_rate": round(len(samples) / elapsed_s, 3) if elapsed_s > 0 else 0.0,
+        "sent": sent,
+        "errors": failed,
+        "error_rate": round(failed / len(samples), 4) if samples else 0.0,
+        "error_kinds": dict(errors.most_common()),
+        "ack_ms": percentiles(ok),
+        "kinds": {kind: percentiles(latencies) for kind, latencies in sorted(by_kind.items())},
+    }
+
+
+def breach(step: dict, max_error_rate: float, max_p99_ms: float, min_rate_ratio: float = 0.9) -> Optional[str]:
+    """Why a step counts as saturated, or None if it held."""
+    if step["error_rate"] > max_error_rate:
+        return f"error rate {step['error_rate']:.2%} > {max_error_rate:.2%}"
+    p99 = step["ack_ms"]["p99"]
+    if p99 is not None and p99 > max_p99_ms:
+        return f"p99 {p99:.1f} ms > {max_p99_ms:.1f} ms"
+    if step["achieved_rate"] < step["target_rate"] * min_rate_ratio:
+        return f"achieved {step['achieved_rate']:.1f}/s of {step['target_rate']:.1f}/s"
+    return None
+
+
+async def run(args: argparse.Namespace) -> dict:
+    mix = parse_mix(args.mix)
+    factory = UpdateFactory(args.chats, args.user_id, args.username, seed=args.seed)
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    steps = []
+    saturation = None
+    rate = args.rate
+    async with httpx.AsyncClient(timeout=args.timeout_s, limits=limits) as client:
+        while True:
+            step = await run_step(
+                client,
+                args.url,
+                factory,
+                mix,
+                rate,
+                args.duration_s,
+                mode=args.mode,
+                concurrency=args.concurrency,
+                seed=None if args.seed is None else args.seed + len(steps),
+            )
+            step["breach"] = breach(step, args.max_error_rate, args.max_p99_ms)
+            steps.append(step)
+            print(format_step(step), flush=True)
+            if step["breach"] is not None:
+                break
+            saturation = rate
+            rate *= args.ramp_factor
+            if not args.ramp or rate > args.max_rate:
+                break
+    return {
+        "url": args.url,
+        "mode": args.mode,
+        "mix": mix,
+        "thresholds": {"max_error_rate": args.max_error_rate, "max_p99_ms": args.max_p99_ms},
+        "saturated": steps[-1]["breach"] is not None,
+        "saturation_rate": saturation,
+        "steps": steps,
+    }
+
+
+def format_step(step: dict) -> str:
+    ack = step["ack_ms"]
+    line = (
+        f"rate {step['target_rate']:>8.1f}/s  achieved {step['achieved_rate']:>8.1f}/s  "
+        f"sent {step['sent']:>6}  errors {step['error_rate']:>6.2%}  "
+        f"p50 {_ms(ack['p50'])}  p95 {_ms(ack['p95'])}  p99 {_ms(ack['p99'])} ms"
+    )
+    if step["error_kinds"]:
+        line += "  (" + ", ".join(f"{kind}: {count}" for kind, count in step["error_kinds"].items()) + ")"
+    if step["breach"]:
+        line += f"  SATURATED: {step['breach']}"
+    return line
+
+
+def _ms(value: Optional[float]) -> str:
+    return f"{'-':>7}" if value is None else f"{value:>7.1f}"
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="telecode bench",
+        description="Load-test a telecode webhook with synthetic Telegram updates.",
+    )
+    parser.add_argument("url", help="Webhook URL, e.g. http://127.0.0.1:8000/telegram/<secret>")
+    parser.add_argument("--rate", type=float, default=10.0, help="Updates per second (start rate with --ramp)")
+    parser.add_argument("--duration-s", type=float, default=10.0, help="Length of the run, or of each ramp step")
+    parser.add_argument(
+        "--mode",
+        choices=["fixed", "open"],
+        default="fixed",
+        help="fixed: evenly spaced, bounded by --concurrency; open: Poisson arrivals, never waits",
+    )
+    parser.add_argument("--concurrency", type=int, default=64, help="Connections (and in-flight limit in fixed mode)")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"Update kinds and weights (default: {DEFAULT_MIX})")
+    parser.add_argument("--chats", type=int, default=50, help="Number of distinct chats")
+    parser.add_argument("--user-id", type=int, default=424242, help="Sender id; must pass TELECODE_ALLOWED_USERS")
+    parser.add_argument("--username", default="telecode_bench", help="Sender username")
+    parser.add_argument("--ramp", action="store_true", help="Raise the rate each step until saturation")
+    parser.add_argument("--ramp-factor", type=float, default=1.5, help="Rate multiplier per ramp step")
+    parser.add_argument("--max-rate", type=float, default=10_000.0, help="Stop ramping above this rate")
+    parser.add_argument("--max-error-rate", type=float, default=0.01, help="Saturated above this error fraction")
+    parser.add_argument("--max-p99-ms", type=float, default=1000.0, help="Saturated above this p99 ack latency")
+    parser.add_argument("--timeout-s", type=float, default=10.0, help="Per-request timeout")
+    parser.add_argument("--seed", type=int, help="Seed for a reproducible update stream")
+    parser.add_argument("--json", dest="json_path", help="Write the full report to this file")
+    return parser
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.rate <= 0 or args.duration_s <= 0 or args.ramp_factor <= 1:
+        parser.error("--rate and --duration-s must be positive and --ramp-factor above 1")
+    try:
+        parse_mix(args.mix)
+    except ValueError as exc:
+        parser.error(str(exc))
+    print(f"Sending {args.mode} load to {args.url}")
+    try:
+        report = asyncio.run(run(args))
+    except KeyboardInterrupt:
+        return 130
+    if args.ramp and not report["saturated"]:
+        print(f"No saturation up to {report['saturation_rate']:.1f} updates/s")
+    elif args.ramp and report["saturation_rate"] is None:
+        print("Saturated at the first step; lower --rate.")
+    elif args.ramp:
+        print(f"Saturation point: {report['saturation_rate']:.1f} updates/s")
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as handle:
+            json.dump(report, handle, indent=2)
+            handle.write("\n")
+        print(f"Wrote {args.json_path}")
+    return 0 if args.ramp or not report["saturated"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,11 +1,9 @@
-import subprocess
-import threading
+import json
 import time
 import os
-from typing import Optional
+from typing import Callable, Optional
 
-
-_CLAUDE_LOCK = threading.Lock()
+from telecode import runner
 
 
 def ask_claude_code(
@@ -13,52 +11,59 @@ def ask_claude_code(
     session_id: str,
     timeout_s: Optional[int],
     image_paths: Optional[list[str]] = None,
+    on_text: Optional[Callable[[str], None]] = None,
 ) -> str:
-    """Run Claude Code CLI with a fixed session_id; serialized via global lock."""
-    return _run_locked(prompt, session_id, timeout_s=timeout_s, image_paths=image_paths)
+    """Run Claude Code CLI with a fixed session_id; callers serialize per session.
 
-
-def _run_locked(
-    prompt: str,
-    session_id: str,
-    timeout_s: Optional[int],
-    image_paths: Optional[list[str]],
-) -> str:
-    with _CLAUDE_LOCK:
-        return _run_with_fallback(prompt, session_id, timeout_s, image_paths)
+    When on_text is given, output is streamed and on_text receives the partial answer.
+    """
+    return _run_with_fallback(prompt, session_id, timeout_s, image_paths, on_text)
 
 def _run_with_fallback(
     prompt: str,
     session_id: str,
     timeout_s: Optional[int],
     image_paths: Optional[list[str]],
+    on_text: Optional[Callable[[str], None]] = None,
 ) -> str:
-    cmd_resume = _build_cmd(["--resume", session_id], prompt, image_paths)
+    stream = on_text is not None
+    cmd_resume = _build_cmd(["--resume", session_id], prompt, image_paths, stream=stream)
     try:
-        return _run_claude(cmd_resume, timeout_s)
+        return _run_claude(cmd_resume, timeout_s, on_text)
     except RuntimeError as exc:
         message = str(exc)
         if "No conversation found" not in message and "already in use" not in message:
             raise
         if "No conversation found" in message:
-            cmd_new = _build_cmd(["--session-id", session_id], prompt, image_paths)
-            return _run_claude(cmd_new, timeout_s)
+            cmd_new = _build_cmd(["--session-id", session_id], prompt, image_paths, stream=stream)
+            return _run_claude(cmd_new, timeout_s, on_text)
 
-    return _retry_resume(cmd_resume, timeout_s)
+    return _retry_resume(cmd_resume, timeout_s, on_text)
 
 
-def _retry_resume(cmd: list[str], timeout_s: Optional[int]) -> str:
+def _retry_resume(
+    cmd: list[str],
+    timeout_s: Optional[int],
+    on_text: Optional[Callable[[str], None]] = None,
+) -> str:
     for _ in range(5):
         time.sleep(2)
         try:
-            return _run_claude(cmd, timeout_s)
+            return _run_claude(cmd, timeout_s, on_text)
         except RuntimeError as exc:
             if "already in use" not in str(exc):
                 raise
     raise RuntimeError("Claude failed: Session ID is already in use.")
 
-def _build_cmd(args: list[str], prompt: str, image_paths: Optional[list[str]]) -> list[str]:
+def _build_cmd(
+    args: list[str],
+    prompt: str,
+    image_paths: Optional[list[str]],
+    stream: bool = False,
+) -> list[str]:
     cmd = ["claude"] + args + ["--print"]
+    if stream:
+        cmd.extend(["--output-format", "stream-json", "--verbose", "--include-partial-messages"])
     if image_paths:
         dirs = sorted({os.path.dirname(path) or "." for path in image_paths})
         for directory in dirs:
@@ -67,21 +72,83 @@ def _build_cmd(args: list[str], prompt: str, image_paths: Optional[list[str]]) -
     return cmd
 
 
-def _run_claude(cmd: list[str], timeout_s: Optional[int]) -> str:
+def _run_claude(
+    cmd: list[str],
+    timeout_s: Optional[int],
+    on_text: Optional[Callable[[str], None]] = None,
+) -> str:
+    parser = StreamParser(on_text) if on_text is not None else None
     try:
-        completed = subprocess.run(
+        completed = runner.default_runner().run(
             cmd,
-            text=True,
-            capture_output=True,
-            timeout=timeout_s,
-            check=True,
+            timeout_s=timeout_s,
+            on_line=parser.feed if parser else None,
         )
-    except subprocess.TimeoutExpired as exc:
+    except runner.ProcessTimeout as exc:
         raise RuntimeError(f"Claude timed out after {timeout_s}s") from exc
-    except subprocess.CalledProcessError as exc:
-        stderr = (exc.stderr or "").strip()
-        stdout = (exc.stdout or "").strip()
-        detail = stderr or stdout or str(exc)
-        raise RuntimeError(f"Claude failed: {detail}") from exc
+    except runner.ProcessCancelled as exc:
+        raise RuntimeError("Claude turn was cancelled.") from exc
+
+    if parser is None:
+        if completed.returncode != 0:
+            detail = completed.stderr.strip() or completed.stdout.strip() or f"exit code {completed.returncode}"
+            raise RuntimeError(f"Claude failed: {detail}")
+        return completed.stdout.strip()
+    if completed.returncode != 0 or parser.is_error:
+        detail = completed.stderr.strip() or (parser.result or "").strip() or f"exit code {completed.returncode}"
+        raise RuntimeError(f"Claude failed: {detail}")
+    return (parser.result if parser.result is not None else parser.text).strip()
+
+
+class StreamParser:
+    """Incremental reader for `claude --output-format stream-json` lines."""
+
+    def __init__(self, on_text: Callable[[str], None]) -> None:
+        self._on_text = on_text
+        self.text = ""
+        self.result: Optional[str] = None
+        self.is_error = False
+
+    def feed(self, line: str) -> None:
+        line = line.strip()
+        if not line:
+            return
+        try:
+            event = json.loads(line)
+        except json.JSONDecodeError:
+            return
+        if not isinstance(event, dict):
+            return
+        kind = event.get("type")
+        if kind == "stream_event":
+            self._feed_partial(event.get("event") or {})
+        elif kind == "assistant":
+            text = _message_text(event.get("message") or {})
+            if text and text != self.text:
+                self.text = text
+                self._on_text(self.text)
+        elif kind == "result":
+            result = event.get("result")
+            self.result = result if isinstance(result, str) else self.text
+            self.is_error = bool(event.get("is_error"))
+
+    def _feed_partial(self, event: dict) -> None:
+        if event.get("type") == "message_start":
+            self.text = ""
+            return
+        delta = event.get("delta") or {}
+        if event.get("type") == "content_block_delta" and delta.get("type") == "text_delta":
+            self.text += delta.get("text") or ""
+            self._on_text(self.text)
+
 
-    return completed.stdout.strip()
+def _message_text(message: dict) -> str:
+    content = message.get("content")
+    if not isinstance(content, list):
+        return ""
+    parts = [
+        block.get("text") or ""
+        for block in content
+        if isinstance(block, dict) and block.get("type") == "text"
+    ]
+    return "".join(parts)
@@ -2,12 +2,15 @@ import argparse
 import atexit
 import os
 import re
+import sys
 import uuid
 
 import uvicorn
 
+from telecode import bench
 from telecode.telegram import (
     TelegramConfig,
+    telegram_delete_webhook,
     telegram_get_my_commands,
     telegram_set_my_commands,
     telegram_set_webhook,
@@ -164,6 +167,11 @@ def _store_global_env_value(key: str, value: str) -> None:
     _write_env_lines(env_path, lines)
 
 
+def _is_polling_enabled() -> bool:
+    value = os.getenv("TELECODE_POLLING", "").strip().lower()
+    return value in {"1", "true", "yes", "on", "enable", "enabled"}
+
+
 def _ensure_tunnel_url(disable_ngrok: bool) -> str | None:
     current = os.getenv("TELEGRAM_TUNNEL_URL")
     if current:
@@ -231,11 +239,16 @@ def _print_command_help() -> None:
     lines = [
         "Telegram bot commands:",
         "/engine            Show current engine",
+        "/engine default X  Set the default engine for all chats",
         "/claude            Switch to Claude",
         "/codex             Switch to Codex",
         "/cli <cmd>         Run a shell command",
         "/tts_on            Enable TTS audio responses",
         "/tts_off           Disable TTS audio responses",
+        "/cancel            Stop the running turn",
+        "/jobs              List /cli jobs",
+        "/tail <id>         Show recent output of a job",
+        "/kill <id>         Stop a job",
     ]
     if not os.getenv("TELECODE_ALLOWED_USERS", "").strip():
         lines.extend(
@@ -249,16 +262,25 @@ def _print_command_help() -> None:
     _print_boxed_message(lines)
 
 
+def _telegram_config(bot_token: str) -> TelegramConfig:
+    api_root = os.getenv("TELEGRAM_API_URL", "").strip().rstrip("/")
+    return TelegramConfig(bot_token=bot_token, api_root=api_root) if api_root else TelegramConfig(bot_token=bot_token)
+
+
 def _ensure_bot_commands(bot_token: str) -> None:
     desired = [
-        {"command": "engine", "description": "Switch engine: /engine claude|codex"},
+        {"command": "engine", "description": "Switch engine: /engine claude|codex|default <name>"},
         {"command": "claude", "description": "Use Claude for this chat"},
         {"command": "codex", "description": "Use Codex for this chat"},
         {"command": "cli", "description": "Run a shell command: /cli <cmd>"},
         {"command": "tts_on", "description": "Enable TTS audio responses"},
         {"command": "tts_off", "description": "Disable TTS audio responses"},
+        {"command": "cancel", "description": "Stop the running Claude/Codex turn"},
+        {"command": "jobs", "description": "List /cli jobs of this chat"},
+        {"command": "tail", "description": "Show recent output of a job: /tail <id>"},
+        {"command": "kill", "description": "Stop a job: /kill <id>"},
     ]
-    telegram = TelegramConfig(bot_token=bot_token)
+    telegram = _telegram_config(bot_token)
     existing = telegram_get_my_commands(telegram)
     existing_commands = {cmd.get("command") for cmd in existing if isinstance(cmd, dict)}
     missing = [cmd for cmd in desired if cmd["command"] not in existing_commands]
@@ -268,9 +290,15 @@ def _ensure_bot_commands(bot_token: str) -> None:
 
 
 def main() -> None:
+    if sys.argv[1:2] == ["bench"]:
+        raise SystemExit(bench.main(sys.argv[2:]))
+
     _load_config()
 
-    parser = argparse.ArgumentParser(description="Telecode webhook server")
+    parser = argparse.ArgumentParser(
+        description="Telecode webhook server",
+        epilog="Run `telecode bench --help` to load-test a running server.",
+    )
     default_host = os.getenv("TELECODE_HOST", "0.0.0.0")
     default_port = int(os.getenv("TELECODE_PORT", "8000"))
     parser.add_argument("--host", default=default_host, help="Host to bind")
@@ -291,6 +319,12 @@ def main() -> None:
         action="store_true",
         help="Disable auto-starting ngrok when tunnel URL is missing",
     )
+    parser.add_argument(
+        "--polling",
+        action="store_true",
+        default=_is_polling_enabled(),
+        help="Pull updates with getUpdates instead of exposing a webhook",
+    )
     parser.add_argument(
         "-v",
         "--verbose",
@@ -307,9 +341,13 @@ def main() -> None:
     os.environ["TELECODE_PORT"] = str(args.port)
     if args.verbose:
         os.environ["TELECODE_VERBOSE"] = "1"
+    os.environ["TELECODE_POLLING"] = "1" if args.polling else "0"
+    if args.polling:
+        # Nothing is registered with Telegram, so lock the webhook route with a throwaway secret.
+        os.environ["TELEGRAM_WEBHOOK_SECRET"] = str(uuid.uuid4())
 
     bot_token = _ensure_bot_token()
-    tunnel_url = _ensure_tunnel_url(args.no_ngrok)
+    tunnel_url = None if args.polling else _ensure_tunnel_url(args.no_ngrok)
     if tunnel_url:
         _print_boxed_message([f"Tunnel URL: {tunnel_url}"])
     if bot_token:
@@ -317,12 +355,18 @@ def main() -> None:
             _ensure_bot_commands(bot_token)
         except Exception as exc:
             print(f"Warning: failed to register bot commands: {exc}")
+    if bot_token and args.polling:
+        try:
+            telegram_delete_webhook(_telegram_config(bot_token))
+            _print_boxed_message(["Polling mode: pulling updates with getUpdates (no webhook)."])
+        except Exception as exc:
+            print(f"Warning: failed to remove Telegram webhook: {exc}")
     if bot_token and tunnel_url:
         secret = str(uuid.uuid4())
         os.environ["TELEGRAM_WEBHOOK_SECRET"] = secret
         webhook_url = f"{tunnel_url.rstrip('/')}/telegram/{secret}"
         try:
-            telegram_set_webhook(TelegramConfig(bot_token=bot_token), webhook_url)
+            telegram_set_webhook(_telegram_config(bot_token), webhook_url)
         except Exception as exc:
             print(f"Warning: failed to set Telegram webhook: {exc}")
 
@@ -1,7 +1,8 @@
 import json
-import re
-import subprocess
-from typing import Optional
+from typing import Callable, Optional
+
+from telecode import runner
+from telecode.metrics import ENGINE_TOKENS
 
 
 def ask_codex_exec(
@@ -9,23 +10,172 @@ def ask_codex_exec(
     session_id: Optional[str],
     timeout_s: Optional[int],
     image_paths: Optional[list[str]] = None,
+    on_text: Optional[Callable[[str], None]] = None,
+    on_tool: Optional[Callable[[str, str], None]] = None,
 ) -> tuple[str, Optional[str], str]:
-    """Run codex exec, optionally resuming a session, and return answer + session_id + logs."""
+    """Run codex exec --json, optionally resuming a session, and return answer + session_id + logs.
+
+    Events are parsed as they arrive: on_text receives each agent message and on_tool
+    each started tool call as (kind, summary). logs holds the tail of stderr and a
+    usage summary.
+    """
     use_images = image_paths or []
     cmd = _build_cmd(prompt, session_id, image_paths=use_images)
     prompt_input = prompt if use_images else None
-    stdout, stderr = _run_codex(cmd, timeout_s, prompt_input=prompt_input)
-
-    new_session_id = _extract_session_id(stdout + "\n" + stderr)
-    answer = _extract_last_message(stdout)
-    if not new_session_id:
-        new_session_id = _extract_session_id(answer)
-
+    parser = CodexEventParser(on_text=on_text, on_tool=on_tool)
+    completed = _run_process(cmd, timeout_s, prompt_input, parser.feed)
+    stderr = completed.stderr.strip()
+    if completed.returncode != 0:
+        raise RuntimeError(f"Codex failed: {parser.error or stderr or f'exit code {completed.returncode}'}")
+    for kind, count in parser.usage.items():
+        ENGINE_TOKENS.inc(count, engine="codex", kind=kind)
+    answer = parser.text.strip()
     if not answer:
         raise RuntimeError("Codex returned empty output.")
-
-    logs = "\n".join([stdout, stderr]).strip()
-    return answer, new_session_id or session_id, logs
+    logs = "\n".join(part for part in [stderr, parser.summary()] if part)
+    return answer, parser.session_id or session_id, logs
+
+
+class CodexEventParser:
+    """Single-pass reader for `codex exec --json` lines.
+
+    Only the session id, the latest agent message, token usage, tool counts and the last
+    error are kept, so memory stays flat however long the run's event log grows. Both the
+    thread/item events and the older {"msg": {...}} envelope are understood.
+    """
+
+    def __init__(
+        self,
+        on_text: Optional[Callable[[str], None]] = None,
+        on_tool: Optional[Callable[[str, str], None]] = None,
+    ) -> None:
+        self._on_text = on_text
+        self._on_tool = on_tool
+        self.session_id: Optional[str] = None
+        self.text = ""
+        self.error: Optional[str] = None
+        self.usage: dict[str, int] = {}
+        self.tool_calls: dict[str, int] = {}
+
+    def feed(self, line: str) -> None:
+        event = _parse_event(line)
+        if event is None:
+            return
+        kind = event.get("type")
+        if kind == "thread.started":
+            self.session_id = self.session_id or _normalize(event.get("thread_id"))
+        elif kind in {"item.started", "item.completed"}:
+            item = event.get("item")
+            if isinstance(item, dict):
+                self._feed_item(kind == "item.completed", item)
+        elif kind == "turn.completed":
+            self._add_usage(event.get("usage"))
+        elif kind == "turn.failed":
+            error = event.get("error")
+            self.error = (_normalize(error.get("message")) if isinstance(error, dict) else None) or self.error
+        elif kind == "error":
+            self.error = _normalize(event.get("message")) or self.error
+        msg = event.get("msg")
+        if isinstance(msg, dict):
+            self._feed_msg(msg)
+
+    def summary(self) -> str:
+        parts = [f"{key}={value}" for key, value in self.usage.items()]
+        parts += [f"{key}={value}" for key, value in self.tool_calls.items()]
+        return f"codex {' '.join(parts)}" if parts else ""
+
+    def _feed_item(self, completed: bool, item: dict) -> None:
+        kind = item.get("type")
+        if kind in {"agent_message", "assistant_message"}:
+            if completed:
+                self._set_text(_normalize(item.get("text")))
+        elif kind in _TOOL_ITEMS:
+            if completed:
+                self.tool_calls[kind] = self.tool_calls.get(kind, 0) + 1
+            else:
+                self._tool(kind, _TOOL_ITEMS[kind](item))
+
+    def _feed_msg(self, msg: dict) -> None:
+        kind = msg.get("type")
+        if kind == "session_configured":
+            self.session_id = self.session_id or _normalize(msg.get("session_id"))
+        elif kind == "agent_message":
+            self._set_text(_normalize(msg.get("message")))
+        elif kind == "agent_message_delta":
+            self._set_text(self.text + (msg.get("delta") or ""))
+        elif kind == "token_count":
+            info = msg.get("info")
+            total = info.get("total_token_usage") if isinstance(info, dict) else msg
+            if isinstance(total, dict) and any(key in total for key in _USAGE_KEYS):
+                # Running totals so far, not per-turn increments.
+                self.usage = {}
+                self._add_usage(total)
+        elif kind in _TOOL_MSGS:
+            name = _TOOL_MSGS[kind]
+            self.tool_calls[name] = self.tool_calls.get(name, 0) + 1
+            self._tool(name, _tool_summary(msg))
+        elif kind in {"error", "stream_error"}:
+            self.error = _normalize(msg.get("message")) or self.error
+
+    def _set_text(self, text: Optional[str]) -> None:
+        if text is None or text == self.text:
+            return
+        self.text = text
+        if self._on_text is not None:
+            self._on_text(text)
+
+    def _add_usage(self, usage: object) -> None:
+        if not isinstance(usage, dict):
+            return
+        for key in _USAGE_KEYS:
+            value = usage.get(key)
+            if isinstance(value, int) and value:
+                name = key.removesuffix("_tokens")
+                self.usage[name] = self.usage.get(name, 0) + value
+
+    def _tool(self, kind: str, summary: str) -> None:
+        if self._on_tool is not None:
+            self._on_tool(kind, summary)
+
+
+def _command_summary(item: dict) -> str:
+    command = item.get("command")
+    return " ".join(command) if isinstance(command, list) else str(command or "")
+
+
+def _file_change_summary(item: dict) -> str:
+    changes = item.get("changes")
+    if not isinstance(changes, list):
+        return ""
+    return ", ".join(str(change.get("path")) for change in changes if isinstance(change, dict))
+
+
+_USAGE_KEYS = ("input_tokens", "cached_input_tokens", "output_tokens", "reasoning_output_tokens")
+_TOOL_ITEMS: dict[str, Callable[[dict], str]] = {
+    "command_execution": _command_summary,
+    "file_change": _file_change_summary,
+    "mcp_tool_call": lambda item: f"{item.get('server', '')}.{item.get('tool', '')}".strip("."),
+    "web_search": lambda item: str(item.get("query") or ""),
+}
+_TOOL_MSGS = {
+    "exec_command_begin": "command_execution",
+    "patch_apply_begin": "file_change",
+    "mcp_tool_call_begin": "mcp_tool_call",
+    "web_search_begin": "web_search",
+}
+
+
+def _tool_summary(msg: dict) -> str:
+    if msg.get("type") == "exec_command_begin":
+        return _command_summary(msg)
+    if msg.get("type") == "patch_apply_begin":
+        changes = msg.get("changes")
+        return ", ".join(changes) if isinstance(changes, dict) else ""
+    if msg.get("type") == "mcp_tool_call_begin":
+        invocation = msg.get("invocation")
+        if isinstance(invocation, dict):
+            return f"{invocation.get('server', '')}.{invocation.get('tool', '')}".strip(".")
+    return str(msg.get("query") or "")
 
 
 def _build_cmd(
@@ -33,7 +183,7 @@ def _build_cmd(
     session_id: Optional[str],
     image_paths: list[str],
 ) -> list[str]:
-    base = ["codex", "exec"]
+    base = ["codex", "exec", "--json"]
     for path in image_paths:
         base.extend(["--image", path])
     if session_id:
@@ -44,119 +194,38 @@ def _build_cmd(
     return base
 
 
-def _run_codex(
+def _run_process(
     cmd: list[str],
     timeout_s: Optional[int],
-    prompt_input: Optional[str] = None,
-) -> tuple[str, str]:
+    prompt_input: Optional[str],
+    on_line: Optional[Callable[[str], None]] = None,
+) -> runner.ProcessResult:
     try:
-        completed = subprocess.run(
+        return runner.default_runner().run(
             cmd,
-            text=True,
-            capture_output=True,
-            input=prompt_input,
-            timeout=timeout_s,
-            check=True,
+            timeout_s=timeout_s,
+            input_text=prompt_input,
+            on_line=on_line,
+            capture=False,
         )
-    except subprocess.TimeoutExpired as exc:
+    except runner.ProcessTimeout as exc:
         raise RuntimeError(f"Codex timed out after {timeout_s}s") from exc
-    except subprocess.CalledProcessError as exc:
-        stderr = (exc.stderr or "").strip()
-        stdout = (exc.stdout or "").strip()
-        detail = stderr or stdout or str(exc)
-        raise RuntimeError(f"Codex failed: {detail}") from exc
-
-    return completed.stdout, completed.stderr
-
-
-def _extract_session_id(stdout: str) -> Optional[str]:
-    for line in stdout.splitlines():
-        line = line.strip()
-        if not line:
-            continue
-        try:
-            data = json.loads(line)
-        except json.JSONDecodeError:
-            continue
-        session_id = _pick_session_id(data)
-        if session_id:
-            return session_id
-    return _extract_session_id_from_text(stdout)
-
-
-def _pick_session_id(data: object, parent_key: Optional[str] = None) -> Optional[str]:
-    if isinstance(data, dict):
-        for key in ("session_id", "sessionId", "sessionID", "conversation_id", "conversationId", "conversationID"):
-            value = data.get(key)
-            if isinstance(value, str) and value:
-                return value
-        if parent_key in {"session", "conversation"}:
-            value = data.get("id")
-            if isinstance(value, str) and value:
-                return value
-        for key, value in data.items():
-            found = _pick_session_id(value, parent_key=key)
-            if found:
-                return found
-    elif isinstance(data, list):
-        for item in data:
-            found = _pick_session_id(item, parent_key=parent_key)
-            if found:
-                return found
-    return None
+    except runner.ProcessCancelled as exc:
+        raise RuntimeError("Codex turn was cancelled.") from exc
 
 
-def _extract_session_id_from_text(text: str) -> Optional[str]:
-    patterns = [
-        r'"(?:session_id|sessionId|sessionID|conversation_id|conversationId|conversationID)"\s*:\s*"([^"]+)"',
-        r'"session"\s*:\s*{[^}]*"id"\s*:\s*"([^"]+)"',
-        r'"conversation"\s*:\s*{[^}]*"id"\s*:\s*"([^"]+)"',
-        r'(?:session_id|sessionId|sessionID|conversation_id|conversationId|conversationID)\s*[:=]\s*([A-Za-z0-9_-]+)',
-        r'session\s+id\s*[:=]\s*([A-Za-z0-9_-]+)',
-    ]
-    for pattern in patterns:
-        match = re.search(pattern, text)
-        if match:
-            return match.group(1)
-    return None
+def _parse_event(line: str) -> Optional[dict]:
+    line = line.strip()
+    if not line.startswith("{"):
+        return None
+    try:
+        event = json.loads(line)
+    except json.JSONDecodeError:
+        return None
+    return event if isinstance(event, dict) else None
 
 
-def _extract_last_message(output: str) -> str:
-    if not output:
-        return ""
-    lines = [line.rstrip() for line in output.splitlines()]
-    while lines and not lines[-1].strip():
-        lines.pop()
-    if not lines:
-        return ""
-    role_markers = {"assistant", "codex"}
-    stop_prefixes = (
-        "tokens used",
-        "mcp startup",
-        "reasoning summaries",
-        "reasoning effort",
-        "workdir:",
-        "model:",
-        "provider:",
-        "approval:",
-        "sandbox:",
-        "session id:",
-        "user",
-        "thinking",
-    )
-    start_index = None
-    for idx, line in enumerate(lines):
-        if line.strip().lower() in role_markers:
-            start_index = idx
-    if start_index is None:
-        return "\n".join(lines).strip()
-    message_lines: list[str] = []
-    for line in lines[start_index + 1 :]:
-        stripped = line.strip()
-        lowered = stripped.lower()
-        if lowered in role_markers:
-            break
-        if any(lowered.startswith(prefix) for prefix in stop_prefixes):
-            break
-        message_lines.append(line)
-    return "\n".join(message_lines).strip()
+def _normalize(value: object) -> Optional[str]:
+    if isinstance(value, str) and value:
+        return value
+    return None
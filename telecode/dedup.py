@@ -0,0 +1,137 @@
+from __future__ import annotations
+
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+
+class UpdateDeduplicator:
+    """Bounded, time-windowed index of handled Telegram update_ids.
+
+    Telegram redelivers an update when the webhook is slow to acknowledge it. check()
+    records each id once; later deliveries inside the window are reported as duplicates.
+    When a path is given, ids are also journaled to SQLite so the window survives restarts;
+    a background thread writes them in batches, so check() never waits on disk.
+    """
+
+    def __init__(
+        self,
+        window_s: float = 3600,
+        max_size: int = 10000,
+        path: Optional[str] = None,
+        flush_interval_s: float = 0.5,
+    ) -> None:
+        self.window_s = window_s
+        self.max_size = max(1, max_size)
+        self.flush_interval_s = flush_interval_s
+        self.dropped = 0
+        self._seen: OrderedDict[int, float] = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._db_lock = threading.Lock()
+        self._pending: list[tuple[int, float]] = []
+        self._since_prune = 0
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._flusher: Optional[threading.Thread] = None
+        if path:
+            self._open(path)
+
+    def __len__(self) -> int:
+        return len(self._seen)
+
+    def check(self, update_id: object) -> bool:
+        """Return True if update_id was already seen; otherwise record it and return False."""
+        if not isinstance(update_id, int):
+            return False
+        now = time.time()
+        with self._lock:
+            self._evict(now)
+            if update_id in self._seen:
+                self.dropped += 1
+                return True
+            self._seen[update_id] = now
+            if len(self._seen) > self.max_size:
+                self._seen.popitem(last=False)
+            if self._conn is None:
+                return False
+            self._pending.append((update_id, now))
+            self._ensure_flusher()
+        self._wake.set()
+        return False
+
+    def flush(self) -> None:
+        with self._lock:
+            batch, self._pending = self._pending, []
+        if not batch:
+            return
+        with self._db_lock:
+            if self._conn is None:
+                return
+            self._since_prune += len(batch)
+            try:
+                self._conn.execute("BEGIN")
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO seen_updates (update_id, seen_at) VALUES (?, ?)",
+                    batch,
+                )
+                if self._since_prune >= 1000:
+                    self._since_prune = 0
+                    self._conn.execute("DELETE FROM seen_updates WHERE seen_at < ?", (batch[-1][1] - self.window_s,))
+                self._conn.execute("COMMIT")
+            except sqlite3.Error as exc:
+                if self._conn.in_transaction:
+                    self._conn.execute("ROLLBACK")
+                print(f"Warning: failed to persist {len(batch)} update ids: {exc}")
+
+    def close(self) -> None:
+        self._stop.set()
+        self._wake.set()
+        if self._flusher is not None:
+            self._flusher.join()
+        self.flush()
+        with self._db_lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def _evict(self, now: float) -> None:
+        cutoff = now - self.window_s
+        while self._seen:
+            seen_at = next(iter(self._seen.values()))
+            if seen_at >= cutoff:
+                break
+            self._seen.popitem(last=False)
+
+    def _open(self, path: str) -> None:
+        conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS seen_updates (update_id INTEGER PRIMARY KEY, seen_at REAL)"
+        )
+        cutoff = time.time() - self.window_s
+        conn.execute("DELETE FROM seen_updates WHERE seen_at < ?", (cutoff,))
+        rows = conn.execute(
+            "SELECT update_id, seen_at FROM seen_updates ORDER BY seen_at DESC LIMIT ?",
+            (self.max_size,),
+        ).fetchall()
+        for update_id, seen_at in reversed(rows):
+            self._seen[int(update_id)] = float(seen_at)
+        self._conn = conn
+
+    def _ensure_flusher(self) -> None:
+        if self._flusher is None and not self._stop.is_set():
+            self._flusher = threading.Thread(target=self._flush_loop, name="telecode-dedup", daemon=True)
+            self._flusher.start()
+
+    def _flush_loop(self) -> None:
+        while not self._stop.is_set():
+            self._wake.wait()
+            # Gather a burst into one transaction; close() cuts the wait short and flushes itself.
+            if self._stop.wait(self.flush_interval_s):
+                return
+            self._wake.clear()
+            self.flush()
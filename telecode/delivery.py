@@ -0,0 +1,76 @@
+from __future__ import annotations
+
+import re
+import tempfile
+from typing import IO
+
+# Breakpoints in order of preference: paragraph, line, sentence, word.
+_BREAKS = (re.compile(r"\n\s*\n"), re.compile(r"\n"), re.compile(r"(?<=[.!?])\s+"), re.compile(r"\s+"))
+_FENCE = re.compile(r"^```.*$", re.MULTILINE)
+# Text kept in memory before the spool rolls over to a file on disk.
+_SPOOL_MEMORY_BYTES = 1 << 20
+
+
+def split_message(text: str, limit: int = 4096) -> list[str]:
+    """Split text into ordered chunks of at most limit characters, on natural boundaries.
+
+    A code block that spans a split is closed at the end of one chunk and reopened,
+    with its language tag, at the start of the next.
+    """
+    text = text.strip()
+    if len(text) <= limit:
+        return [text] if text else []
+    chunks: list[str] = []
+    reopen = ""
+    while text:
+        budget = limit - len(reopen)
+        if len(text) <= budget:
+            chunks.append(reopen + text)
+            break
+        # Leave room for the "\n```" that closes a code block left open by the cut.
+        cut = _find_break(text, budget - 4)
+        head, text = text[:cut].rstrip(), text[cut:].lstrip()
+        fence = _open_fence(reopen + head)
+        if fence:
+            head += "\n```"
+        chunks.append(reopen + head)
+        reopen = f"{fence}\n" if fence else ""
+    return chunks
+
+
+def spool_text(text: str) -> IO[bytes]:
+    """Write text to a temp file that stays in memory until it is large, rewound for reading."""
+    spool = tempfile.SpooledTemporaryFile(max_size=_SPOOL_MEMORY_BYTES)
+    spool.write(text.encode("utf-8"))
+    spool.seek(0)
+    return spool
+
+
+def preview(text: str, limit: int) -> str:
+    """The first chunk of text that fits in limit characters, marked as cut when it is."""
+    text = text.strip()
+    if len(text) <= limit:
+        return text
+    # Leave room for a closing "\n```" and the ellipsis.
+    head = text[: _find_break(text, limit - 5)].rstrip()
+    if _open_fence(head):
+        head += "\n```"
+    return head + "…"
+
+
+def _find_break(text: str, budget: int) -> int:
+    budget = max(1, budget)
+    window = text[:budget + 1]
+    for pattern in _BREAKS:
+        matches = [match.start() for match in pattern.finditer(window) if match.start() > budget // 2]
+        if matches:
+            return matches[-1]
+    return budget
+
+
+def _open_fence(text: str) -> str:
+    """The opening line of a code block left open at the end of text, or ""."""
+    fences = _FENCE.findall(text)
+    if len(fences) % 2 == 0:
+        return ""
+    return fences[-1].strip()
@@ -0,0 +1,133 @@
+from __future__ import annotations
+
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Hashable, Optional
+
+
+class QueueFull(RuntimeError):
+    """Raised by Dispatcher.submit when the global queue is at capacity."""
+
+    def __init__(self, depth: int) -> None:
+        super().__init__(f"Queue is full ({depth} jobs waiting).")
+        self.depth = depth
+
+
+class Dispatcher:
+    """Bounded job queue with one FIFO lane per chat, drained by a fixed worker pool.
+
+    Jobs for the same key never run concurrently and always run in submission order;
+    different keys are served round-robin so one busy chat cannot starve the others.
+    """
+
+    def __init__(self, workers: int = 8, max_queue: int = 200) -> None:
+        self.workers = max(1, workers)
+        self.max_queue = max(1, max_queue)
+        self._cond = threading.Condition()
+        self._lanes: dict[Hashable, deque[tuple[Callable[..., Any], tuple, dict]]] = {}
+        self._ready: deque[Hashable] = deque()
+        self._active: set[Hashable] = set()
+        self._threads: list[threading.Thread] = []
+        self._queued = 0
+        self._running = 0
+        self._stopping = False
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+
+    def submit(self, key: Hashable, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> int:
+        """Queue fn(*args, **kwargs) on the lane for key.
+
+        Returns 0 when a worker is free to pick the job up, otherwise the number of jobs
+        now waiting for a worker. Raises QueueFull when max_queue jobs are already waiting.
+        """
+        with self._cond:
+            if self._stopping:
+                raise RuntimeError("Dispatcher is shut down.")
+            if self._queued >= self.max_queue:
+                self.rejected += 1
+                raise QueueFull(self._queued)
+            lane = self._lanes.setdefault(key, deque())
+            lane.append((fn, args, kwargs))
+            self._queued += 1
+            self.submitted += 1
+            if key not in self._active and len(lane) == 1:
+                self._ready.append(key)
+            self._ensure_workers()
+            self._cond.notify()
+            if self._running + len(self._ready) <= self.workers:
+                return 0
+            return self._queued
+
+    def stats(self) -> dict[str, int]:
+        with self._cond:
+            return {
+                "workers": self.workers,
+                "max_queue": self.max_queue,
+                "queued": self._queued,
+                "running": self._running,
+                "lanes": len(self._lanes),
+                "submitted": self.submitted,
+                "completed": self.completed,
+                "failed": self.failed,
+                "rejected": self.rejected,
+            }
+
+    def join(self, timeout_s: Optional[float] = None) -> bool:
+        """Wait until every queued and running job has finished."""
+        deadline = None if timeout_s is None else time.monotonic() + timeout_s
+        with self._cond:
+            while self._queued or self._running:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+            return True
+
+    def shutdown(self) -> None:
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+
+    def _ensure_workers(self) -> None:
+        while len(self._threads) < self.workers:
+            thread = threading.Thread(
+                target=self._work,
+                name=f"telecode-worker-{len(self._threads)}",
+                daemon=True,
+            )
+            self._threads.append(thread)
+            thread.start()
+
+    def _work(self) -> None:
+        while True:
+            with self._cond:
+                while not self._ready and not self._stopping:
+                    self._cond.wait()
+                if self._stopping:
+                    return
+                key = self._ready.popleft()
+                fn, args, kwargs = self._lanes[key].popleft()
+                self._active.add(key)
+                self._queued -= 1
+                self._running += 1
+            ok = True
+            try:
+                fn(*args, **kwargs)
+            except Exception as exc:
+                ok = False
+                print(f"Warning: job for {key} failed: {exc}")
+            with self._cond:
+                self._running -= 1
+                self._active.discard(key)
+                if ok:
+                    self.completed += 1
+                else:
+                    self.failed += 1
+                if self._lanes[key]:
+                    self._ready.append(key)
+                else:
+                    del self._lanes[key]
+                self._cond.notify_all()
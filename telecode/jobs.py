@@ -0,0 +1,156 @@
+from __future__ import annotations
+
+import itertools
+import threading
+import time
+from collections import deque
+from typing import Callable, Optional
+
+from telecode.runner import EngineRunner, ProcessTimeout, RunHandle
+
+
+class Job:
+    """One shell command started by /cli, with its merged stdout/stderr kept in memory.
+
+    Output beyond max_output_chars is dropped from the front, so the tail is always
+    available. A job starts in the foreground; detach() hands it to the background.
+    """
+
+    def __init__(self, job_id: int, chat_id: int, command: str, max_output_chars: int) -> None:
+        self.id = job_id
+        self.chat_id = chat_id
+        self.command = command
+        self.state = "running"
+        self.returncode: Optional[int] = None
+        self.timeout_s: Optional[float] = None
+        self.background = False
+        self.dropped = 0
+        self.started_at = time.monotonic()
+        self.finished_at: Optional[float] = None
+        self._max_output_chars = max_output_chars
+        self._chunks: deque[str] = deque()
+        self._size = 0
+        self._lock = threading.Lock()
+        self._done = threading.Event()
+        self._handle: Optional[RunHandle] = None
+
+    @property
+    def done(self) -> bool:
+        return self._done.is_set()
+
+    @property
+    def elapsed_s(self) -> float:
+        return (self.finished_at or time.monotonic()) - self.started_at
+
+    def append(self, text: str) -> None:
+        with self._lock:
+            self._chunks.append(text)
+            self._size += len(text)
+            while self._size > self._max_output_chars and len(self._chunks) > 1:
+                dropped = self._chunks.popleft()
+                self._size -= len(dropped)
+                self.dropped += len(dropped)
+
+    def output(self) -> str:
+        with self._lock:
+            return "".join(self._chunks)
+
+    def tail(self, chars: int) -> str:
+        text = self.output()
+        return text[-chars:] if len(text) > chars else text
+
+    def wait(self, timeout_s: Optional[float] = None) -> bool:
+        return self._done.wait(timeout_s)
+
+    def detach(self) -> bool:
+        """Move a running job to the background; False if it has already finished."""
+        with self._lock:
+            if self.done:
+                return False
+            self.background = True
+            return True
+
+    def kill(self) -> bool:
+        if self.done or self._handle is None:
+            return False
+        self._handle.cancel()
+        return True
+
+    def _finish(self, state: str, returncode: Optional[int]) -> bool:
+        with self._lock:
+            self.state = state
+            self.returncode = returncode
+            self.finished_at = time.monotonic()
+            self._done.set()
+            return self.background
+
+
+class JobManager:
+    """Runs /cli commands on their own runner, so shell jobs never take engine slots."""
+
+    def __init__(self, max_parallel: int = 8, max_output_chars: int = 1 << 20, keep_finished: int = 20) -> None:
+        self.max_output_chars = max_output_chars
+        self.keep_finished = keep_finished
+        self._runner = EngineRunner(max_parallel)
+        self._jobs: dict[int, Job] = {}
+        self._ids = itertools.count(1)
+        self._guard = threading.Lock()
+
+    @property
+    def running(self) -> int:
+        with self._guard:
+            return sum(1 for job in self._jobs.values() if not job.done)
+
+    def start(
+        self,
+        chat_id: int,
+        command: str,
+        timeout_s: Optional[float] = None,
+        on_background_exit: Optional[Callable[[Job], None]] = None,
+    ) -> Job:
+        """Run command through /bin/sh with stderr merged into stdout.
+
+        on_background_exit is called, on the runner loop, when a detached job ends.
+        """
+        job = Job(next(self._ids), chat_id, command, self.max_output_chars)
+        job.timeout_s = timeout_s
+        with self._guard:
+            self._jobs[job.id] = job
+            self._prune(chat_id)
+        job._handle = self._runner.start(["/bin/sh", "-c", "exec 2>&1\n" + command], timeout_s, on_line=job.append)
+        job._handle.add_done_callback(lambda handle: self._finished(job, handle, on_background_exit))
+        return job
+
+    def get(self, chat_id: int, job_id: int) -> Optional[Job]:
+        with self._guard:
+            job = self._jobs.get(job_id)
+        return job if job is not None and job.chat_id == chat_id else None
+
+    def jobs(self, chat_id: int) -> list[Job]:
+        with self._guard:
+            return [job for job in self._jobs.values() if job.chat_id == chat_id]
+
+    def shutdown(self) -> None:
+        self._runner.shutdown()
+
+    def _finished(self, job: Job, handle: RunHandle, on_background_exit: Optional[Callable[[Job], None]]) -> None:
+        returncode = None
+        try:
+            returncode = handle.result().returncode
+            state = "done" if returncode == 0 else "failed"
+        except ProcessTimeout:
+            state = "timed out"
+        except Exception as exc:
+            state = "killed" if handle.cancelled else "failed"
+            if not handle.cancelled:
+                job.append(f"{exc}\n")
+        if job._finish(state, returncode) and on_background_exit is not None:
+            try:
+                on_background_exit(job)
+            except Exception as exc:
+                print(f"Warning: job #{job.id} exit handler failed: {exc}")
+
+    def _prune(self, chat_id: int) -> None:
+        finished = [job.id for job in self._jobs.values() if job.chat_id == chat_id and job.done]
+        for job_id in finished[: max(0, len(finished) - self.keep_finished)]:
+            del self._jobs[job_id]
@@ -0,0 +1,128 @@
+from __future__ import annotations
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+from telecode.artifacts import link_or_copy
+
+_HASH_CHUNK_SIZE = 1 << 20
+
+
+@dataclass
+class _Entry:
+    digest: str
+    suffix: str
+    size: int
+    last_used: float
+
+
+class MediaCache:
+    """Downloaded Telegram media, keyed by file_unique_id and stored by content hash.
+
+    file_unique_id is stable across chats and re-sends, so a forwarded photo maps to the
+    entry of the original. Blobs are named by sha256, so different ids with identical bytes
+    share one file. The index lives in SQLite beside the blobs and is served from memory.
+    """
+
+    def __init__(self, root: str, max_bytes: int = 256 << 20) -> None:
+        self.root = root
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._entries: dict[str, _Entry] = {}
+        os.makedirs(root, exist_ok=True)
+        self._conn = sqlite3.connect(os.path.join(root, "index.db"), check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS media ("
+            "file_unique_id TEXT PRIMARY KEY, digest TEXT, suffix TEXT, size INTEGER, last_used REAL)"
+        )
+        for unique_id, digest, suffix, size, last_used in self._conn.execute(
+            "SELECT file_unique_id, digest, suffix, size, last_used FROM media"
+        ):
+            if os.path.exists(self._blob_path(digest, suffix)):
+                self._entries[unique_id] = _Entry(digest, suffix, int(size), float(last_used))
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def total_bytes(self) -> int:
+        with self._lock:
+            return sum(self._blob_sizes().values())
+
+    def get_path(self, file_unique_id: Optional[str]) -> Optional[str]:
+        """Return the cached file for an id, or None on a miss."""
+        if not file_unique_id:
+            return None
+        with self._lock:
+            entry = self._entries.get(file_unique_id)
+            if entry is not None:
+                path = self._blob_path(entry.digest, entry.suffix)
+                if os.path.exists(path):
+                    entry.last_used = time.time()
+                    self.hits += 1
+                    return path
+                del self._entries[file_unique_id]
+            self.misses += 1
+            return None
+
+    def put_file(self, file_unique_id: Optional[str], source: str, file_path: str) -> None:
+        """Add a downloaded file under its id, linking it into place by content hash."""
+        if not file_unique_id:
+            return
+        digest = hashlib.sha256()
+        size = 0
+        with open(source, "rb") as handle:
+            for chunk in iter(lambda: handle.read(_HASH_CHUNK_SIZE), b""):
+                digest.update(chunk)
+                size += len(chunk)
+        suffix = os.path.splitext(file_path)[1]
+        path = self._blob_path(digest.hexdigest(), suffix)
+        if not os.path.exists(path):
+            link_or_copy(source, path)
+        now = time.time()
+        with self._lock:
+            self._entries[file_unique_id] = _Entry(digest.hexdigest(), suffix, size, now)
+            self._conn.execute(
+                "INSERT OR REPLACE INTO media (file_unique_id, digest, suffix, size, last_used) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (file_unique_id, digest.hexdigest(), suffix, size, now),
+            )
+            self._evict()
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def _blob_path(self, digest: str, suffix: str) -> str:
+        return os.path.join(self.root, f"{digest}{suffix}")
+
+    def _blob_sizes(self) -> dict[tuple[str, str], int]:
+        return {(entry.digest, entry.suffix): entry.size for entry in self._entries.values()}
+
+    def _evict(self) -> None:
+        blobs = self._blob_sizes()
+        total = sum(blobs.values())
+        if total <= self.max_bytes:
+            return
+        for unique_id, entry in sorted(self._entries.items(), key=lambda item: item[1].last_used):
+            if total <= self.max_bytes:
+                break
+            del self._entries[unique_id]
+            self._conn.execute("DELETE FROM media WHERE file_unique_id = ?", (unique_id,))
+            blob = (entry.digest, entry.suffix)
+            if any((other.digest, other.suffix) == blob for other in self._entries.values()):
+                continue
+            total -= blobs[blob]
+            try:
+                os.remove(self._blob_path(*blob))
+            except OSError:
+                pass
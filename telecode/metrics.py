@@ -0,0 +1,198 @@
+from __future__ import annotations
+
+import bisect
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Iterator, Optional
+
+LabelKey = tuple[tuple[str, str], ...]
+
+_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+_LONG_BUCKETS = (0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0, 300.0, 600.0)
+_BYTE_BUCKETS = (1 << 10, 16 << 10, 64 << 10, 256 << 10, 1 << 20, 4 << 20, 16 << 20, 64 << 20)
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help_text: str) -> None:
+        self.name = name
+        self.help_text = help_text
+        self._lock = threading.Lock()
+        self._fn: Optional[Callable[[], float]] = None
+        REGISTRY.append(self)
+
+    def set_function(self, fn: Callable[[], float]) -> None:
+        """Compute the value at scrape time instead of tracking it on the hot path."""
+        self._fn = fn
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+        if self._fn is not None:
+            try:
+                lines.append(f"{self.name} {_format_value(self._fn())}")
+            except Exception:
+                pass
+            return lines
+        return lines + self._samples()
+
+    def _samples(self) -> list[str]:
+        return []
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str) -> None:
+        super().__init__(name, help_text)
+        self._values: dict[LabelKey, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(_label_key(labels), 0.0)
+
+    def _samples(self) -> list[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{_format_labels(key)} {_format_value(value)}" for key, value in items]
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, name: str, help_text: str) -> None:
+        super().__init__(name, help_text)
+        self._values: dict[LabelKey, float] = {}
+
+    def set(self, value: float, **labels: str) -> None:
+        with self._lock:
+            self._values[_label_key(labels)] = value
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels: str) -> None:
+        self.inc(-amount, **labels)
+
+    def _samples(self) -> list[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{_format_labels(key)} {_format_value(value)}" for key, value in items]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, buckets: tuple[float, ...] = _LATENCY_BUCKETS) -> None:
+        super().__init__(name, help_text)
+        self.buckets = tuple(sorted(buckets))
+        self._series: dict[LabelKey, list[float]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = _label_key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                # One slot per bucket, then +Inf, sum and count.
+                series = [0.0] * (len(self.buckets) + 3)
+                self._series[key] = series
+            series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    @contextmanager
+    def time(self, **labels: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def count(self, **labels: str) -> int:
+        series = self._series.get(_label_key(labels))
+        return int(series[-1]) if series else 0
+
+    def _samples(self) -> list[str]:
+        with self._lock:
+            items = [(key, list(series)) for key, series in self._series.items()]
+        lines: list[str] = []
+        for key, series in items:
+            cumulative = 0.0
+            for bound, count in zip(self.buckets + (math.inf,), series):
+                cumulative += count
+                le = "+Inf" if bound == math.inf else _format_value(bound)
+                lines.append(f"{self.name}_bucket{_format_labels(key + (('le', le),))} {_format_value(cumulative)}")
+            lines.append(f"{self.name}_sum{_format_labels(key)} {_format_value(series[-2])}")
+            lines.append(f"{self.name}_count{_format_labels(key)} {_format_value(series[-1])}")
+        return lines
+
+
+REGISTRY: list[_Metric] = []
+
+
+def render() -> str:
+    """Render every registered metric in the Prometheus text exposition format."""
+    lines: list[str] = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+def _label_key(labels: dict[str, str]) -> LabelKey:
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def _format_labels(key: LabelKey) -> str:
+    if not key:
+        return ""
+    parts = []
+    for name, value in key:
+        escaped = value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        parts.append(f'{name}="{escaped}"')
+    return "{" + ",".join(parts) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == int(value) and abs(value) < 1e15:
+        return str(int(value))
+    return repr(float(value))
+
+
+WEBHOOK_ACK_SECONDS = Histogram(
+    "telecode_webhook_ack_seconds", "Time from webhook request to acknowledgement."
+)
+ENGINE_SECONDS = Histogram(
+    "telecode_engine_seconds", "Wall time of one Claude/Codex subprocess turn.", _LONG_BUCKETS
+)
+TELEGRAM_API_SECONDS = Histogram(
+    "telecode_telegram_api_seconds", "Latency of Telegram Bot API calls by method."
+)
+DOWNLOAD_SECONDS = Histogram("telecode_download_seconds", "Time to download a Telegram file.")
+DOWNLOAD_BYTES = Histogram("telecode_download_bytes", "Size of downloaded Telegram files.", _BYTE_BUCKETS)
+WHISPER_SECONDS = Histogram("telecode_whisper_seconds", "Whisper transcription time.", _LONG_BUCKETS)
+TTS_SECONDS = Histogram("telecode_tts_seconds", "Text-to-speech synthesis time.", _LONG_BUCKETS)
+TTS_CACHE = Counter("telecode_tts_cache_total", "TTS replies by cache result: file_id, audio or miss.")
+JOBS_IN_FLIGHT = Gauge("telecode_jobs_in_flight", "Update handlers currently running.")
+JOBS_QUEUED = Gauge("telecode_jobs_queued", "Updates waiting for a worker.")
+JOBS_REJECTED = Counter("telecode_jobs_rejected_total", "Updates rejected because the queue was full.")
+TELEGRAM_RETRY_AFTER = Counter("telecode_telegram_retry_after_total", "Telegram 429 responses per method.")
+OUTBOUND_MERGED_EDITS = Counter("telecode_outbound_merged_edits_total", "Message edits replaced by a newer edit before being sent.")
+OUTBOUND_WAITING = Gauge("telecode_outbound_waiting", "Bot API calls waiting for the rate limiter.")
+DUPLICATE_UPDATES = Counter("telecode_duplicate_updates_total", "Redelivered updates dropped by update_id.")
+SESSION_LOCKS_HELD = Gauge("telecode_session_locks_held", "Chat session locks currently held.")
+OPTION_CACHE_ENTRIES = Gauge("telecode_option_cache_entries", "Entries in the inline option cache.")
+TEMP_DIR_BYTES = Gauge("telecode_temp_dir_bytes", "Bytes stored under .telecode_tmp.")
+ENGINE_TOKENS = Counter("telecode_engine_tokens_total", "Tokens reported by the engines, by engine and kind.")
+ENGINE_PROCESSES = Gauge("telecode_engine_processes", "Claude/Codex subprocesses currently running.")
+ENGINE_WAITING = Gauge("telecode_engine_waiting", "Engine turns waiting for a free subprocess slot.")
+CLI_JOBS = Gauge("telecode_cli_jobs", "/cli commands currently running, foreground or background.")
+WARM_WORKERS = Gauge("telecode_warm_workers", "Long-lived Claude processes kept for active chats.")
@@ -0,0 +1,238 @@
+from __future__ import annotations
+
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Hashable, Optional, TypeVar
+
+from telecode.metrics import OUTBOUND_MERGED_EDITS, TELEGRAM_RETRY_AFTER
+from telecode.telegram import TelegramRetryAfter
+
+T = TypeVar("T")
+
+# Idle per-chat buckets are dropped once there are more than this many.
+_MAX_IDLE_BUCKETS = 4096
+
+
+class _Bucket:
+    """Token bucket kept as a theoretical arrival time: rate calls/s, bursts of up to burst."""
+
+    def __init__(self, rate: float, burst: int) -> None:
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self.tolerance = self.interval * (max(1, burst) - 1)
+        self.tat = 0.0
+        self.blocked_until = 0.0
+
+    def earliest(self, now: float) -> float:
+        return max(now, self.tat - self.tolerance, self.blocked_until)
+
+    def take(self, at: float) -> None:
+        self.tat = max(self.tat, at) + self.interval
+
+    def idle(self, now: float) -> bool:
+        return self.tat <= now and self.blocked_until <= now
+
+
+@dataclass
+class _PendingEdit:
+    call: Callable[[], Any]
+    future: Future = field(default_factory=Future)
+    waiters: int = 0
+
+
+class OutboundScheduler:
+    """Paces Bot API calls per chat and globally, and retries them after 429 responses.
+
+    Calls run in the caller's thread once both the chat's bucket and the global bucket
+    allow it. A 429 blocks the chat for retry_after seconds and the call is repeated.
+    Edits of one message that are still waiting are merged, so only the newest text
+    is sent.
+    """
+
+    def __init__(
+        self,
+        chat_rate: float = 1.0,
+        chat_burst: int = 3,
+        global_rate: float = 30.0,
+        max_retries: int = 3,
+        max_retry_after_s: float = 60.0,
+    ) -> None:
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.max_retries = max_retries
+        self.max_retry_after_s = max_retry_after_s
+        self._global = _Bucket(global_rate, max(1, int(global_rate)))
+        self._chats: dict[Hashable, _Bucket] = {}
+        self._edits: dict[tuple[Hashable, int], _PendingEdit] = {}
+        self._lock = threading.Lock()
+        self._waiting = 0
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    @property
+    def waiting(self) -> int:
+        return self._waiting
+
+    def send(self, chat_id: Optional[Hashable], call: Callable[[], T], limited: bool = True) -> T:
+        """Run call when the chat may send again. limited=False skips the buckets but not 429 blocks."""
+        attempt = 0
+        while True:
+            self._wait_turn(chat_id, limited)
+            try:
+                return call()
+            except TelegramRetryAfter as exc:
+                attempt += 1
+                self._retry_after(chat_id, exc, attempt)
+
+    def edit(
+        self,
+        chat_id: Hashable,
+        message_id: int,
+        call: Callable[[], T],
+        wait: bool = True,
+    ) -> Optional[T]:
+        """Edit a message, replacing any edit of it that has not been sent yet.
+
+        With wait=False the edit is delivered in the background and failures are only logged.
+        """
+        key = (chat_id, message_id)
+        with self._lock:
+            pending = self._edits.get(key)
+            owner = pending is None
+            if owner:
+                pending = _PendingEdit(call)
+                self._edits[key] = pending
+            else:
+                pending.call = call
+                OUTBOUND_MERGED_EDITS.inc()
+            if wait:
+                pending.waiters += 1
+        if owner:
+            if wait:
+                self._deliver(key, pending)
+            else:
+                self._ensure_executor().submit(self._deliver, key, pending)
+        if wait:
+            return pending.future.result()
+        return None
+
+    def shutdown(self) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+    def _deliver(self, key: tuple[Hashable, int], pending: _PendingEdit) -> None:
+        chat_id = key[0]
+        attempt = 0
+        while True:
+            self._wait_turn(chat_id, True)
+            with self._lock:
+                if self._edits.get(key) is pending:
+                    # From here on a newer edit opens its own slot and is sent after this one.
+                    del self._edits[key]
+                call = pending.call
+            try:
+                pending.future.set_result(call())
+                return
+            except TelegramRetryAfter as exc:
+                attempt += 1
+                try:
+                    self._retry_after(chat_id, exc, attempt)
+                except TelegramRetryAfter as final:
+                    self._fail(pending, final)
+                    return
+                with self._lock:
+                    superseded = key in self._edits
+                if superseded:
+                    pending.future.set_result(None)
+                    return
+            except Exception as exc:
+                self._fail(pending, exc)
+                return
+
+    def _fail(self, pending: _PendingEdit, exc: BaseException) -> None:
+        with self._lock:
+            unobserved = pending.waiters == 0
+        pending.future.set_exception(exc)
+        if unobserved:
+            print(f"Warning: Telegram edit failed: {exc}")
+
+    def _retry_after(self, chat_id: Optional[Hashable], exc: TelegramRetryAfter, attempt: int) -> None:
+        TELEGRAM_RETRY_AFTER.inc(method=exc.method or "unknown")
+        if attempt > self.max_retries or exc.retry_after > self.max_retry_after_s:
+            raise exc
+        with self._lock:
+            bucket = self._global if chat_id is None else self._chat_bucket(chat_id)
+            bucket.blocked_until = max(bucket.blocked_until, time.monotonic() + exc.retry_after)
+
+    def _wait_turn(self, chat_id: Optional[Hashable], limited: bool) -> None:
+        with self._lock:
+            now = time.monotonic()
+            chat = self._chat_bucket(chat_id) if chat_id is not None else None
+            start = max(now, self._global.blocked_until)
+            if chat is not None:
+                start = max(start, chat.blocked_until)
+            if limited:
+                start = max(start, self._global.earliest(now))
+                if chat is not None:
+                    start = max(start, chat.earliest(now))
+                    chat.take(start)
+                self._global.take(start)
+            delay = start - now
+            if delay > 0:
+                self._waiting += 1
+        if delay <= 0:
+            return
+        try:
+            time.sleep(delay)
+        finally:
+            with self._lock:
+                self._waiting -= 1
+
+    def _chat_bucket(self, chat_id: Hashable) -> _Bucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            if len(self._chats) >= _MAX_IDLE_BUCKETS:
+                now = time.monotonic()
+                for key in [key for key, value in self._chats.items() if value.idle(now)]:
+                    del self._chats[key]
+            bucket = _Bucket(self.chat_rate, self.chat_burst)
+            self._chats[chat_id] = bucket
+        return bucket
+
+    def _ensure_executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="telecode-outbound")
+            return self._executor
+
+
+_DEFAULT: Optional[OutboundScheduler] = None
+_DEFAULT_GUARD = threading.Lock()
+
+
+def configure(chat_rate: float, chat_burst: int, global_rate: float) -> OutboundScheduler:
+    global _DEFAULT
+    with _DEFAULT_GUARD:
+        previous = _DEFAULT
+        _DEFAULT = OutboundScheduler(chat_rate, chat_burst, global_rate)
+    if previous is not None:
+        previous.shutdown()
+    return _DEFAULT
+
+
+def default_scheduler() -> OutboundScheduler:
+    global _DEFAULT
+    with _DEFAULT_GUARD:
+        if _DEFAULT is None:
+            _DEFAULT = OutboundScheduler()
+        return _DEFAULT
+
+
+def shutdown() -> None:
+    global _DEFAULT
+    with _DEFAULT_GUARD:
+        scheduler, _DEFAULT = _DEFAULT, None
+    if scheduler is not None:
+        scheduler.shutdown()
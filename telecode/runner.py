@@ -0,0 +1,351 @@
+from __future__ import annotations
+
+import asyncio
+import os
+import queue
+import signal
+import threading
+from collections import deque
+from concurrent.futures import CancelledError, Future
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import AsyncIterator, Awaitable, Callable, Iterator, MutableSequence, Optional, TypeVar
+
+# Grace period between SIGTERM and SIGKILL when a run is stopped.
+_TERMINATE_GRACE_S = 3.0
+_LINES_DONE = object()
+# stream-json lines carry whole tool results, far beyond asyncio's 64 KiB default.
+LINE_LIMIT = 16 << 20
+# stderr lines kept for error messages when a run does not capture its output.
+_STDERR_TAIL_LINES = 200
+_T = TypeVar("_T")
+_OBSERVER: ContextVar[Optional[Callable[["RunHandle"], None]]] = ContextVar("telecode_run_observer", default=None)
+
+
+@dataclass
+class ProcessResult:
+    returncode: int
+    stdout: str
+    stderr: str
+
+
+class ProcessTimeout(RuntimeError):
+    def __init__(self, timeout_s: float) -> None:
+        super().__init__(f"Process timed out after {timeout_s}s")
+        self.timeout_s = timeout_s
+
+
+class ProcessCancelled(RuntimeError):
+    def __init__(self) -> None:
+        super().__init__("Process was cancelled.")
+
+
+class RunHandle:
+    """A subprocess started on the runner loop, observed and stopped from any thread."""
+
+    def __init__(self, runner: "EngineRunner") -> None:
+        self._runner = runner
+        self._lines: "queue.SimpleQueue[object]" = queue.SimpleQueue()
+        self._future: Optional[Future] = None
+        self.cancelled = False
+
+    def lines(self) -> Iterator[str]:
+        """Yield stdout lines as they arrive, until the process has exited."""
+        while True:
+            line = self._lines.get()
+            if line is _LINES_DONE:
+                return
+            yield line  # type: ignore[misc]
+
+    def result(self) -> ProcessResult:
+        try:
+            return self._future.result()
+        except (CancelledError, asyncio.CancelledError) as exc:
+            raise ProcessCancelled() from exc
+
+    def cancel(self) -> None:
+        """Stop the run: its whole process group is terminated, then killed."""
+        self.cancelled = True
+        if self._future is not None:
+            self._future.cancel()
+
+    def done(self) -> bool:
+        return self._future is not None and self._future.done()
+
+    def add_done_callback(self, callback: Callable[["RunHandle"], None]) -> None:
+        """Call callback(handle) once the run ends; it runs on the runner loop and must not block."""
+        self._future.add_done_callback(lambda _: callback(self))
+
+
+class EngineRunner:
+    """Runs engine subprocesses on one asyncio loop, so waiting turns cost no threads.
+
+    Each process gets its own session (process group). Output is read incrementally,
+    at most max_parallel processes run at once, and a cancelled or timed-out run takes
+    its child processes down with it.
+    """
+
+    def __init__(self, max_parallel: int = 4) -> None:
+        self.max_parallel = max(1, max_parallel)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._guard = threading.Lock()
+        self._running = 0
+        self._waiting = 0
+
+    @property
+    def running(self) -> int:
+        return self._running
+
+    @property
+    def waiting(self) -> int:
+        return self._waiting
+
+    @property
+    def started(self) -> bool:
+        return self._loop is not None
+
+    def submit(self, coro: Awaitable[_T]) -> "Future[_T]":
+        """Schedule coro on the runner loop, starting the loop if needed."""
+        return asyncio.run_coroutine_threadsafe(coro, self._ensure_loop())  # type: ignore[arg-type]
+
+    def start(
+        self,
+        cmd: list[str],
+        timeout_s: Optional[float] = None,
+        input_text: Optional[str] = None,
+        stream: bool = False,
+        on_line: Optional[Callable[[str], None]] = None,
+        capture: bool = True,
+    ) -> RunHandle:
+        """Start cmd; stream=True queues lines for handle.lines(), on_line gets them on the loop.
+
+        With capture=False stdout is only streamed, not kept in the result, and only the
+        last lines of stderr are kept, so a long run uses constant memory.
+        """
+        handle = RunHandle(self)
+        sink = handle._lines.put if stream else on_line
+        handle._future = self.submit(self.run_async(cmd, timeout_s, input_text, sink, capture))
+        if stream:
+            handle._future.add_done_callback(lambda _: handle._lines.put(_LINES_DONE))
+        return handle
+
+    def run(
+        self,
+        cmd: list[str],
+        timeout_s: Optional[float] = None,
+        input_text: Optional[str] = None,
+        on_line: Optional[Callable[[str], None]] = None,
+        on_start: Optional[Callable[[RunHandle], None]] = None,
+        capture: bool = True,
+    ) -> ProcessResult:
+        """Blocking facade: run cmd, feeding stdout lines to on_line in the calling thread."""
+        handle = self.start(cmd, timeout_s, input_text, stream=on_line is not None, capture=capture)
+        if on_start is not None:
+            on_start(handle)
+        notify_started(handle)
+        if on_line is not None:
+            for line in handle.lines():
+                on_line(line)
+        return handle.result()
+
+    async def run_async(
+        self,
+        cmd: list[str],
+        timeout_s: Optional[float] = None,
+        input_text: Optional[str] = None,
+        on_line: Optional[Callable[[str], None]] = None,
+        capture: bool = True,
+    ) -> ProcessResult:
+        async with self.slot():
+            return await self._run(cmd, timeout_s, input_text, on_line, capture)
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        """Hold one of the max_parallel slots; for turns that reuse a long-lived process."""
+        semaphore = self._get_semaphore()
+        self._waiting += 1
+        try:
+            await semaphore.acquire()
+        finally:
+            self._waiting -= 1
+        self._running += 1
+        try:
+            yield
+        finally:
+            self._running -= 1
+            semaphore.release()
+
+    def shutdown(self) -> None:
+        with self._guard:
+            loop, self._loop = self._loop, None
+            thread, self._thread = self._thread, None
+        if loop is None:
+            return
+        stopping = asyncio.run_coroutine_threadsafe(_cancel_tasks(), loop)
+        try:
+            stopping.result(timeout=_TERMINATE_GRACE_S + 2)
+        except Exception:
+            pass
+        loop.call_soon_threadsafe(loop.stop)
+        if thread is not None:
+            thread.join(timeout=2)
+
+    async def _run(
+        self,
+        cmd: list[str],
+        timeout_s: Optional[float],
+        input_text: Optional[str],
+        on_line: Optional[Callable[[str], None]],
+        capture: bool = True,
+    ) -> ProcessResult:
+        proc = await asyncio.create_subprocess_exec(
+            *cmd,
+            stdin=asyncio.subprocess.PIPE if input_text is not None else asyncio.subprocess.DEVNULL,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            start_new_session=True,
+            limit=LINE_LIMIT,
+        )
+        stdout_lines: Optional[list[str]] = [] if capture else None
+        stderr_lines: MutableSequence[str] = [] if capture else deque(maxlen=_STDERR_TAIL_LINES)
+
+        async def pump(
+            stream: asyncio.StreamReader,
+            lines: Optional[MutableSequence[str]],
+            callback: Optional[Callable[[str], None]],
+        ) -> None:
+            while True:
+                raw = await stream.readline()
+                if not raw:
+                    return
+                line = raw.decode("utf-8", "replace")
+                if lines is not None:
+                    lines.append(line)
+                if callback is not None:
+                    callback(line)
+
+        async def communicate() -> None:
+            if input_text is not None:
+                proc.stdin.write(input_text.encode("utf-8"))
+                try:
+                    await proc.stdin.drain()
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+                proc.stdin.close()
+            await asyncio.gather(
+                pump(proc.stdout, stdout_lines, on_line),
+                pump(proc.stderr, stderr_lines, None),
+            )
+            await proc.wait()
+
+        try:
+            await asyncio.wait_for(communicate(), timeout_s)
+        except asyncio.TimeoutError:
+            raise ProcessTimeout(timeout_s or 0)
+        finally:
+            # Every exit path, including an overlong line or a failing callback, must take
+            # the detached process group down with it.
+            await asyncio.shield(terminate(proc))
+        return ProcessResult(proc.returncode, "".join(stdout_lines or ()), "".join(stderr_lines))
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_parallel)
+        return self._semaphore
+
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        with self._guard:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                ready = threading.Event()
+
+                def serve() -> None:
+                    asyncio.set_event_loop(loop)
+                    loop.call_soon(ready.set)
+                    loop.run_forever()
+
+                self._thread = threading.Thread(target=serve, name="telecode-runner", daemon=True)
+                self._thread.start()
+                ready.wait()
+                self._loop = loop
+                self._semaphore = None
+            return self._loop
+
+
+async def _cancel_tasks() -> None:
+    current = asyncio.current_task()
+    tasks = [task for task in asyncio.all_tasks() if task is not current]
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def terminate(proc: asyncio.subprocess.Process) -> None:
+    """SIGTERM the process group, then SIGKILL it if it has not exited within the grace period."""
+    if proc.returncode is not None:
+        return
+    _signal_group(proc, signal.SIGTERM)
+    try:
+        await asyncio.wait_for(proc.wait(), _TERMINATE_GRACE_S)
+    except asyncio.TimeoutError:
+        _signal_group(proc, signal.SIGKILL)
+        await proc.wait()
+
+
+def _signal_group(proc: asyncio.subprocess.Process, sig: int) -> None:
+    try:
+        if hasattr(os, "killpg"):
+            os.killpg(proc.pid, sig)
+        else:
+            proc.send_signal(sig)
+    except ProcessLookupError:
+        pass
+
+
+@contextmanager
+def observe(callback: Callable[[RunHandle], None]) -> Iterator[None]:
+    """Pass every run started from this thread inside the block to callback, e.g. to cancel it."""
+    token = _OBSERVER.set(callback)
+    try:
+        yield
+    finally:
+        _OBSERVER.reset(token)
+
+
+def notify_started(handle: object) -> None:
+    """Report a started run (anything with a cancel() method) to the active observer."""
+    observer = _OBSERVER.get()
+    if observer is not None:
+        observer(handle)
+
+
+_DEFAULT: Optional[EngineRunner] = None
+_DEFAULT_GUARD = threading.Lock()
+
+
+def configure(max_parallel: int) -> EngineRunner:
+    """Size the shared runner. The limit of a runner that has already started is kept."""
+    global _DEFAULT
+    with _DEFAULT_GUARD:
+        if _DEFAULT is None or _DEFAULT._loop is None:
+            _DEFAULT = EngineRunner(max_parallel)
+        return _DEFAULT
+
+
+def default_runner() -> EngineRunner:
+    global _DEFAULT
+    with _DEFAULT_GUARD:
+        if _DEFAULT is None:
+            _DEFAULT = EngineRunner()
+        return _DEFAULT
+
+
+def shutdown() -> None:
+    global _DEFAULT
+    with _DEFAULT_GUARD:
+        runner, _DEFAULT = _DEFAULT, None
+    if runner is not None:
+        runner.shutdown()
@@ -1,55 +1,197 @@
 from __future__ import annotations
 
+import asyncio
+import itertools
 import json
 import os
 import re
-import subprocess
-import tempfile
+import sqlite3
 import threading
 import time
 import traceback
 import uuid
-from typing import Optional
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Optional
 
-from contextlib import asynccontextmanager
+from contextlib import asynccontextmanager, contextmanager, suppress
 
-from fastapi import BackgroundTasks, FastAPI, HTTPException, Request
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import PlainTextResponse
 from dotenv import load_dotenv
 
+from telecode.artifacts import ArtifactStore
 from telecode.claude import ask_claude_code
 from telecode.codex import ask_codex_exec
+from telecode.dedup import UpdateDeduplicator
+from telecode.delivery import preview, split_message, spool_text
+from telecode.dispatcher import Dispatcher, QueueFull
+from telecode.jobs import Job, JobManager
+from telecode.media import MediaCache
+from telecode import metrics, outbound, runner, tracing
+from telecode.state import ChatStateStore
+from telecode.transcribe import WhisperPool
+from telecode.tts import TtsCache, tts_cache_key
+from telecode.warm import WarmPool
 from telecode.telegram import (
     TelegramConfig,
+    aclose_telegram_clients,
+    close_telegram_clients,
     telegram_answer_callback_query,
-    telegram_download_voice,
-    telegram_download_file,
+    telegram_download_to_path,
+    telegram_edit_message_text,
     telegram_get_my_commands,
-    telegram_send_audio,
+    telegram_get_updates_async,
+    telegram_send_audio_by_id,
+    telegram_send_document,
     telegram_send_message,
     telegram_set_my_commands,
+    telegram_upload_audio,
 )
 
 
 @asynccontextmanager
 async def _lifespan(app: FastAPI):
+    reload_config()
+    _install_reload_signal()
+    _configure_tracing()
+    runner.configure(_env_int("TELECODE_MAX_PARALLEL", 4))
+    outbound.configure(
+        _env_float("TELECODE_SEND_RATE_PER_CHAT", 1.0),
+        _env_int("TELECODE_SEND_BURST_PER_CHAT", 3),
+        _env_float("TELECODE_SEND_RATE_GLOBAL", 30.0),
+    )
     try:
-        _, _, telegram, _, _ = get_config()
-        _ensure_bot_commands(telegram)
+        _ensure_bot_commands(get_config().telegram)
     except Exception as exc:
         print(f"Warning: failed to register bot commands: {exc}")
+    if _is_truthy_env("TELECODE_WHISPER_PREWARM"):
+        threading.Thread(target=_prewarm_whisper, daemon=True).start()
+    poller = asyncio.create_task(_poll_updates()) if _is_truthy_env("TELECODE_POLLING") else None
     yield
+    if poller is not None:
+        poller.cancel()
+        with suppress(asyncio.CancelledError):
+            await poller
+    if _DISPATCHER is not None:
+        _DISPATCHER.shutdown()
+    if _WARM_POOL is not None:
+        # Before the runner: warm workers are stopped on its loop.
+        _WARM_POOL.shutdown()
+    runner.shutdown()
+    outbound.shutdown()
+    if _WHISPER_POOL is not None:
+        _WHISPER_POOL.shutdown()
+    if _JOBS is not None:
+        _JOBS.shutdown()
+    _close_state_stores()
+    _close_artifact_stores()
+    _close_tts_client()
+    if _DEDUP is not None:
+        _DEDUP.close()
+    tracing.flush()
+    close_telegram_clients()
+    await aclose_telegram_clients()
+
+
+@dataclass(frozen=True)
+class ServerConfig:
+    """Immutable settings snapshot shared by every request until the next reload."""
+
+    webhook_secret: Optional[str]
+    timeout_s: Optional[int]
+    telegram: Optional[TelegramConfig]
+    sessions_file: str
+    engine: str
+    allowed_ids: frozenset[int]
+    allowed_names: frozenset[str]
+
+
+class _SessionLock:
+    """FIFO lock so queued turns for one chat run in arrival order."""
+
+    def __init__(self) -> None:
+        self._cond = threading.Condition()
+        self._next_ticket = 0
+        self._serving = 0
+        self.users = 0
+        self.last_used = time.monotonic()
+
+    @property
+    def held(self) -> bool:
+        with self._cond:
+            return self._serving != self._next_ticket
+
+    def __enter__(self) -> "_SessionLock":
+        with self._cond:
+            ticket = self._next_ticket
+            self._next_ticket += 1
+            while ticket != self._serving:
+                self._cond.wait()
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        with self._cond:
+            self._serving += 1
+            self._cond.notify_all()
 
 
 app = FastAPI(lifespan=_lifespan)
-_SESSION_LOCKS: dict[str, threading.Lock] = {}
+_SESSION_LOCKS: dict[str, _SessionLock] = {}
 _SESSION_LOCKS_GUARD = threading.Lock()
+_SESSION_LOCK_IDLE_S = 600
+# Telegram never uses chat id 0; its row holds the global sessions from before per-chat sessions.
+_LEGACY_SESSION_CHAT = 0
+_LEGACY_SESSION_KEYS = {"TELECODE_SESSION_CLAUDE": "claude", "TELECODE_SESSION_CODEX": "codex"}
+_LEGACY_SESSION_GUARD = threading.Lock()
+_WHISPER_POOL: WhisperPool | None = None
+_WHISPER_POOL_GUARD = threading.Lock()
+_WARM_POOL: WarmPool | None = None
+_WARM_POOL_GUARD = threading.Lock()
+_JOBS: JobManager | None = None
+_JOBS_GUARD = threading.Lock()
+_CONFIG: ServerConfig | None = None
+_CONFIG_GUARD = threading.Lock()
+_CONFIG_STALE = False
+_CONFIG_CHECK_INTERVAL_S = 2.0
+_CONFIG_CHECKED_AT = 0.0
+_CONFIG_MTIMES: tuple[Optional[float], ...] = ()
+_CONFIG_FILE_VALUES: dict[str, str] = {}
 _SESSIONS_FILE_GUARD = threading.Lock()
+_STATE_STORES: dict[str, ChatStateStore] = {}
+_ARTIFACT_STORES: dict[str, ArtifactStore] = {}
+_ARTIFACT_STORES_GUARD = threading.Lock()
+_MEDIA_CACHES: dict[str, MediaCache] = {}
+_TTS_CACHES: dict[str, TtsCache] = {}
+_TTS_CLIENT: Any = None
+_TTS_CLIENT_GUARD = threading.Lock()
+_TTS_REFERENCE_ID = "8ef4a238714b45718ce04243307c57a7"
+_DEDUP: UpdateDeduplicator | None = None
+_DEDUP_GUARD = threading.Lock()
+_DISPATCHER: Dispatcher | None = None
+_DISPATCHER_GUARD = threading.Lock()
+_PENDING: dict[int, deque[_PendingUpdate]] = {}
+_PENDING_COND = threading.Condition()
+_PENDING_TOKENS = itertools.count(1)
+_POLL_ALLOWED_UPDATES = ["message", "callback_query"]
+_NOTICES = ThreadPoolExecutor(max_workers=2, thread_name_prefix="telecode-notice")
+# Control commands and callback answers never share threads with notices stuck in rate-limit waits.
+_CONTROL = ThreadPoolExecutor(max_workers=4, thread_name_prefix="telecode-control")
+# Queue notices per chat: a chat present here has a sender running; the value is the next notice.
+_BUSY_NOTICES: dict[int, Optional[tuple[str, Optional[int]]]] = {}
+_BUSY_NOTICES_GUARD = threading.Lock()
 _ENV_FILE_GUARD = threading.Lock()
 _OPTION_PATTERN = re.compile(r"^\s*(\d+)[\.\)]\s+(.*\S)\s*$")
 _BULLET_PATTERN = re.compile(r"^\s*[-*•]\s+(.*\S)\s*$")
 _OPTION_CACHE: dict[tuple[int, int], tuple[float, list[str]]] = {}
 _OPTION_CACHE_GUARD = threading.Lock()
 _OPTION_CACHE_TTL_S = 3600
+_TELEGRAM_TEXT_LIMIT = 4096
+_CANCEL_CALLBACK = "cancel"
+_STOP_MARKUP = {"inline_keyboard": [[{"text": "Stop", "callback_data": _CANCEL_CALLBACK}]]}
+_RUNNING_TURNS: dict[int, _RunningTurn] = {}
+_RUNNING_TURNS_GUARD = threading.Lock()
 
 
 def _get_env(name: str) -> str:
@@ -59,10 +201,35 @@ def _get_env(name: str) -> str:
     return value
 
 
-def _allowed_users() -> tuple[set[int], set[str]]:
-    raw = os.getenv("TELECODE_ALLOWED_USERS", "").strip()
+def _env_int(name: str, default: int) -> int:
+    value = os.getenv(name, "").strip()
+    if not value:
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        return default
+
+
+def _is_truthy_env(name: str) -> bool:
+    value = os.getenv(name, "").strip().lower()
+    return value in {"1", "true", "yes", "on", "enable", "enabled"}
+
+
+def _env_float(name: str, default: float) -> float:
+    value = os.getenv(name, "").strip()
+    if not value:
+        return default
+    try:
+        return float(value)
+    except ValueError:
+        return default
+
+
+def _parse_allowed_users(raw: str) -> tuple[frozenset[int], frozenset[str]]:
+    raw = raw.strip()
     if not raw:
-        return set(), set()
+        return frozenset(), frozenset()
     parts = [part.strip() for part in raw.replace(",", " ").split() if part.strip()]
     allowed_ids: set[int] = set()
     allowed_names: set[str] = set()
@@ -71,7 +238,12 @@ def _allowed_users() -> tuple[set[int], set[str]]:
             allowed_ids.add(int(part))
         else:
             allowed_names.add(part.lstrip("@").lower())
-    return allowed_ids, allowed_names
+    return frozenset(allowed_ids), frozenset(allowed_names)
+
+
+def _allowed_users() -> tuple[frozenset[int], frozenset[str]]:
+    config = _current_config()
+    return config.allowed_ids, config.allowed_names
 
 
 def _is_user_allowed(user_id: Optional[int]) -> bool:
@@ -84,6 +256,11 @@ def _is_user_allowed(user_id: Optional[int]) -> bool:
 
 
 def _is_user_allowed_by_meta(user_id: Optional[int], username: Optional[str]) -> bool:
+    with tracing.span("auth"):
+        return _check_allowed(user_id, username)
+
+
+def _check_allowed(user_id: Optional[int], username: Optional[str]) -> bool:
     allowed_ids, allowed_names = _allowed_users()
     if not allowed_ids and not allowed_names:
         return True
@@ -114,7 +291,8 @@ def _is_verbose() -> bool:
 
 def _log(message: str) -> None:
     if _is_verbose():
-        print(message)
+        trace_id = tracing.current_trace_id()
+        print(f"[{trace_id[:8]}] {message}" if trace_id else message)
 
 
 def _log_exception(context: str, exc: Exception) -> None:
@@ -123,27 +301,139 @@ def _log_exception(context: str, exc: Exception) -> None:
         traceback.print_exc()
 
 
-def get_config() -> tuple[str, int | None, TelegramConfig, str, str]:
+def get_config() -> ServerConfig:
+    config = _current_config()
+    if not config.webhook_secret:
+        raise RuntimeError("Missing required env var: TELEGRAM_WEBHOOK_SECRET")
+    if config.telegram is None:
+        raise RuntimeError("Missing required env var: TELEGRAM_BOT_TOKEN")
+    return config
+
+
+def reload_config() -> ServerConfig:
+    """Re-read .telecode files and env, and publish a fresh snapshot."""
+    global _CONFIG, _CONFIG_STALE, _CONFIG_CHECKED_AT, _CONFIG_MTIMES
+    with _CONFIG_GUARD:
+        _CONFIG_MTIMES = _config_file_mtimes()
+        _CONFIG_CHECKED_AT = time.monotonic()
+        _CONFIG_STALE = False
+        _apply_config_files()
+        _CONFIG = _build_config()
+        return _CONFIG
+
+
+def _current_config() -> ServerConfig:
+    config = _CONFIG
+    if config is None or _CONFIG_STALE:
+        return reload_config()
+    now = time.monotonic()
+    if now - _CONFIG_CHECKED_AT >= _CONFIG_CHECK_INTERVAL_S:
+        return _check_config_files(now)
+    return config
+
+
+def _check_config_files(now: float) -> ServerConfig:
+    global _CONFIG_CHECKED_AT
+    with _CONFIG_GUARD:
+        _CONFIG_CHECKED_AT = now
+        changed = _config_file_mtimes() != _CONFIG_MTIMES
+    if changed:
+        _log("Config files changed; reloading.")
+        return reload_config()
+    return _CONFIG or reload_config()
+
+
+def _invalidate_config() -> None:
+    global _CONFIG_STALE
+    _CONFIG_STALE = True
+
+
+def _install_reload_signal() -> None:
+    import signal
+
+    if not hasattr(signal, "SIGHUP"):
+        return
+    try:
+        asyncio.get_running_loop().add_signal_handler(signal.SIGHUP, _invalidate_config)
+    except (NotImplementedError, RuntimeError):
+        pass
+
+
+def _build_config() -> ServerConfig:
     load_dotenv()
-    webhook_secret = _get_env("TELEGRAM_WEBHOOK_SECRET")
     timeout_s = os.getenv("CLAUDE_TIMEOUT_S")
     timeout_val = int(timeout_s) if timeout_s else None
-    telegram = TelegramConfig(bot_token=_get_env("TELEGRAM_BOT_TOKEN"))
-    sessions_file = _env_path()
+    bot_token = os.getenv("TELEGRAM_BOT_TOKEN")
     engine = os.getenv("TELECODE_ENGINE", "claude").strip().lower()
     if engine not in {"claude", "codex"}:
         raise RuntimeError("TELECODE_ENGINE must be 'claude' or 'codex'")
-    return webhook_secret, timeout_val, telegram, sessions_file, engine
+    allowed_ids, allowed_names = _parse_allowed_users(os.getenv("TELECODE_ALLOWED_USERS", ""))
+    return ServerConfig(
+        webhook_secret=os.getenv("TELEGRAM_WEBHOOK_SECRET") or None,
+        timeout_s=timeout_val,
+        telegram=_telegram_config(bot_token) if bot_token else None,
+        sessions_file=_env_path(),
+        engine=engine,
+        allowed_ids=allowed_ids,
+        allowed_names=allowed_names,
+    )
+
+
+def _config_file_paths() -> list[str]:
+    return [os.path.expanduser("~/.telecode"), _env_path()]
+
+
+def _config_file_mtimes() -> tuple[Optional[float], ...]:
+    mtimes: list[Optional[float]] = []
+    for path in _config_file_paths():
+        try:
+            mtimes.append(os.stat(path).st_mtime)
+        except OSError:
+            mtimes.append(None)
+    return tuple(mtimes)
+
+
+def _apply_config_files() -> None:
+    """Copy file values into os.environ, leaving keys set independently by the shell alone."""
+    global _CONFIG_FILE_VALUES
+    merged: dict[str, str] = {}
+    for path in _config_file_paths():
+        merged.update(_read_kv_file(path))
+    for key, value in merged.items():
+        current = os.environ.get(key)
+        if current is None or current == value or current == _CONFIG_FILE_VALUES.get(key):
+            os.environ[key] = value
+    _CONFIG_FILE_VALUES = merged
+
+
+def _telegram_config(bot_token: str) -> TelegramConfig:
+    defaults = TelegramConfig(bot_token=bot_token)
+    http2 = os.getenv("TELECODE_HTTP2", "").strip().lower() in {"1", "true", "yes", "on"}
+    return TelegramConfig(
+        bot_token=bot_token,
+        http2=http2,
+        timeout_s=_env_float("TELECODE_HTTP_TIMEOUT_S", defaults.timeout_s),
+        transfer_timeout_s=_env_float("TELECODE_HTTP_TRANSFER_TIMEOUT_S", defaults.transfer_timeout_s),
+        max_connections=_env_int("TELECODE_HTTP_MAX_CONNECTIONS", defaults.max_connections),
+        max_keepalive_connections=_env_int(
+            "TELECODE_HTTP_MAX_KEEPALIVE", defaults.max_keepalive_connections
+        ),
+        api_root=os.getenv("TELEGRAM_API_URL", "").strip().rstrip("/") or defaults.api_root,
+    )
 
 
 def _ensure_bot_commands(telegram: TelegramConfig) -> None:
     desired = [
-        {"command": "engine", "description": "Switch engine: /engine claude|codex"},
+        {"command": "engine", "description": "Switch engine: /engine claude|codex|default <name>"},
         {"command": "claude", "description": "Use Claude for this chat"},
         {"command": "codex", "description": "Use Codex for this chat"},
         {"command": "cli", "description": "Run a shell command: /cli <cmd>"},
         {"command": "tts_on", "description": "Enable TTS audio responses"},
         {"command": "tts_off", "description": "Disable TTS audio responses"},
+        {"command": "cancel", "description": "Stop the running Claude/Codex turn"},
+        {"command": "jobs", "description": "List /cli jobs of this chat"},
+        {"command": "tail", "description": "Show recent output of a job: /tail <id>"},
+        {"command": "kill", "description": "Stop a job: /kill <id>"},
     ]
     existing = telegram_get_my_commands(telegram)
     existing_commands = {cmd.get("command") for cmd in existing if isinstance(cmd, dict)}
@@ -172,7 +462,7 @@ def _handle_engine_command(
         engine = command.lstrip("/")
         _log(f"IN command chat_id={chat_id} command={command}")
         _set_engine_for_chat(chat_id, engine, sessions_file)
-        _persist_engine_default(engine)
+        _prewarm_engine(chat_id, engine, sessions_file)
         _send_message(
             telegram,
             chat_id,
@@ -188,7 +478,19 @@ def _handle_engine_command(
             _send_message(
                 telegram,
                 chat_id,
-                f"Current engine: {current}. Use /engine claude or /engine codex.",
+                f"Current engine: {current} (default: {default_engine}). "
+                "Use /engine claude, /engine codex or /engine default <name>.",
+                reply_to_message_id=message_id,
+            )
+            return True
+        target, _, name = rest.partition(" ")
+        if target == "default" and name.strip() in {"claude", "codex"}:
+            name = name.strip()
+            _persist_engine_default(name)
+            _send_message(
+                telegram,
+                chat_id,
+                f"Default engine set to {name}. Chats that have not picked an engine use it.",
                 reply_to_message_id=message_id,
             )
             return True
@@ -196,12 +498,12 @@ def _handle_engine_command(
             _send_message(
                 telegram,
                 chat_id,
-                "Usage: /engine claude or /engine codex.",
+                "Usage: /engine claude, /engine codex or /engine default <name>.",
                 reply_to_message_id=message_id,
             )
             return True
         _set_engine_for_chat(chat_id, rest, sessions_file)
-        _persist_engine_default(rest)
+        _prewarm_engine(chat_id, rest, sessions_file)
         _send_message(
             telegram,
             chat_id,
@@ -263,83 +565,475 @@ def _handle_cli_command(
         return True
 
     _log(f"IN command chat_id={chat_id} command=/cli args={cmd}")
-    output = _run_cli_command(cmd)
-    _send_message(
-        telegram,
-        chat_id,
-        output,
-        reply_to_message_id=message_id,
-    )
+    _run_cli_command(cmd, chat_id, message_id, telegram)
     return True
 
 
 @app.get("/health")
-async def health() -> dict[str, bool]:
-    return {"ok": True}
-
-
+async def health() -> dict[str, object]:
+    return {"ok": True, "queue": _get_dispatcher().stats()}
 
 
 @app.post("/telegram/{secret}")
-async def telegram_webhook(secret: str, req: Request, background: BackgroundTasks):
-    webhook_secret, timeout_s, telegram, sessions_file, engine = get_config()
-    if secret != webhook_secret:
+async def telegram_webhook(secret: str, req: Request):
+    started = time.perf_counter()
+    config = get_config()
+    if secret != config.webhook_secret:
         raise HTTPException(status_code=401)
 
     update = await req.json()
+    _process_update(update, config)
+    metrics.WEBHOOK_ACK_SECONDS.observe(time.perf_counter() - started)
+    return {"ok": True}
+
+
+@app.get("/metrics")
+async def metrics_endpoint() -> PlainTextResponse:
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
+async def _poll_updates() -> None:
+    """Pull updates with long-polling getUpdates and feed them to the webhook path."""
+    timeout_s = _env_int("TELECODE_POLL_TIMEOUT_S", 50)
+    offset: Optional[int] = None
+    backoff_s = 1.0
+    _log("Polling Telegram for updates.")
+    while True:
+        config = _current_config()
+        if config.telegram is None:
+            print("Warning: polling disabled, TELEGRAM_BOT_TOKEN is missing.")
+            return
+        try:
+            updates = await telegram_get_updates_async(
+                config.telegram,
+                offset=offset,
+                timeout_s=timeout_s,
+                limit=100,
+                allowed_updates=_POLL_ALLOWED_UPDATES,
+            )
+        except asyncio.CancelledError:
+            raise
+        except Exception as exc:
+            _log_exception("_poll_updates", exc)
+            await asyncio.sleep(backoff_s)
+            backoff_s = min(backoff_s * 2, 30.0)
+            continue
+        backoff_s = 1.0
+        for update in updates:
+            update_id = update.get("update_id")
+            if isinstance(update_id, int):
+                offset = max(offset or 0, update_id + 1)
+            try:
+                _process_update(update, config)
+            except Exception as exc:
+                _log_exception("_process_update", exc)
+
+
+def _process_update(update: dict, config: ServerConfig) -> None:
+    """Route one update onto its chat lane; never blocks on Telegram or the engines."""
+    if _get_deduplicator(config.sessions_file).check(update.get("update_id")):
+        metrics.DUPLICATE_UPDATES.inc()
+        _log(f"IN duplicate update_id={update.get('update_id')} dropped")
+        return
+
     callback = update.get("callback_query")
     if callback:
-        background.add_task(
-        handle_callback_query,
-        callback,
-        timeout_s,
-        telegram,
-        sessions_file,
-        engine,
-    )
-        return {"ok": True}
+        message = callback.get("message") or {}
+        callback_id = callback.get("id")
+        if callback_id:
+            # Answer right away so the button spinner stops even if the chat lane is busy.
+            _CONTROL.submit(_answer_callback, config.telegram, callback_id, message.get("chat", {}).get("id"))
+            callback = {key: value for key, value in callback.items() if key != "id"}
+        if (callback.get("data") or "").strip() == _CANCEL_CALLBACK:
+            _CONTROL.submit(_handle_stop_request, config.telegram, message, callback.get("from"))
+            return
+        _dispatch(
+            message.get("chat", {}).get("id"),
+            message.get("message_id"),
+            handle_callback_query,
+            callback,
+            config,
+            update_id=update.get("update_id"),
+        )
+        return
 
     msg = update.get("message")
     if not msg:
-        return {"ok": True}
+        return
 
+    control = _control_handler(msg.get("text"))
+    if control is not None:
+        # Bypass the chat lane: it is busy with the very turn or command being controlled.
+        _CONTROL.submit(control, config.telegram, msg, msg.get("from"))
+        return
     if "voice" in msg:
-        background.add_task(
-            handle_voice_message,
-            msg,
-            timeout_s,
-            telegram,
-            sessions_file,
-            engine,
-        )
+        handler = handle_voice_message
     elif "photo" in msg:
-        background.add_task(
-            handle_photo_message,
-            msg,
-            timeout_s,
-            telegram,
-            sessions_file,
-            engine,
-        )
+        handler = handle_photo_message
     elif _is_image_document(msg.get("document")):
-        background.add_task(
-            handle_document_message,
-            msg,
-            timeout_s,
-            telegram,
-            sessions_file,
-            engine,
-        )
+        handler = handle_document_message
     elif "text" in msg:
-        background.add_task(
-            handle_text_message,
-            msg,
-            timeout_s,
-            telegram,
-            sessions_file,
-            engine,
+        handler = handle_text_message
+    else:
+        return
+    _dispatch(
+        msg["chat"]["id"],
+        msg["message_id"],
+        handler,
+        msg,
+        config,
+        mergeable_text=_mergeable_text(msg) if handler is handle_text_message else None,
+        update_id=update.get("update_id"),
+    )
+
+
+def _dispatch(
+    chat_id: Optional[int],
+    reply_to_message_id: Optional[int],
+    handler: Callable[..., None],
+    payload: dict,
+    config: ServerConfig,
+    mergeable_text: Optional[str] = None,
+    update_id: Optional[int] = None,
+) -> None:
+    token = _track_pending(chat_id, reply_to_message_id, mergeable_text)
+    trace = tracing.start_trace(
+        handler.__name__,
+        chat_id=chat_id,
+        message_id=reply_to_message_id,
+        update_id=update_id,
+    )
+    try:
+        position = _get_dispatcher().submit(
+            chat_id,
+            _run_update,
+            chat_id,
+            token,
+            handler,
+            payload,
+            config.timeout_s,
+            config.telegram,
+            config.sessions_file,
+            config.engine,
+            trace=trace,
+            queued_ns=time.time_ns(),
         )
-    return {"ok": True}
+    except QueueFull as exc:
+        _forget_pending(chat_id, token)
+        metrics.JOBS_REJECTED.inc()
+        _log(f"Queue full; rejected update for chat_id={chat_id}")
+        if chat_id is not None:
+            _queue_busy_notice(
+                config.telegram,
+                chat_id,
+                f"Busy: {exc.depth} requests are already queued. Please try again shortly.",
+                reply_to_message_id,
+            )
+        return
+    if position and chat_id is not None:
+        _queue_busy_notice(
+            config.telegram,
+            chat_id,
+            f"Busy, you're #{position} in queue.",
+            reply_to_message_id,
+        )
+
+
+def _queue_busy_notice(
+    telegram: TelegramConfig,
+    chat_id: int,
+    text: str,
+    reply_to_message_id: Optional[int],
+) -> None:
+    """Send a queue notice with at most one waiting per chat; a newer notice replaces the waiting one."""
+    with _BUSY_NOTICES_GUARD:
+        running = chat_id in _BUSY_NOTICES
+        _BUSY_NOTICES[chat_id] = (text, reply_to_message_id)
+    if not running:
+        _NOTICES.submit(_drain_busy_notices, telegram, chat_id)
+
+
+def _drain_busy_notices(telegram: TelegramConfig, chat_id: int) -> None:
+    while True:
+        with _BUSY_NOTICES_GUARD:
+            notice = _BUSY_NOTICES.get(chat_id)
+            if notice is None:
+                _BUSY_NOTICES.pop(chat_id, None)
+                return
+            _BUSY_NOTICES[chat_id] = None
+        _send_notice(telegram, chat_id, *notice)
+
+
+def _run_update(
+    chat_id: Optional[int],
+    token: Optional[int],
+    handler: Callable[..., None],
+    *args: object,
+    trace: Optional[tracing.Trace] = None,
+    queued_ns: Optional[int] = None,
+) -> None:
+    if queued_ns is not None:
+        tracing.record_span(trace, "queue", queued_ns, time.time_ns())
+    try:
+        with tracing.activate(trace):
+            handler(*args)
+    finally:
+        _forget_pending(chat_id, token)
+
+
+def _configure_tracing() -> None:
+    tracing.configure(
+        json_path=os.getenv("TELECODE_TRACE_FILE", "").strip() or None,
+        otlp_endpoint=os.getenv("TELECODE_OTLP_ENDPOINT", "").strip() or None,
+    )
+
+
+@dataclass
+class _PendingUpdate:
+    token: int
+    message_id: Optional[int]
+    text: Optional[str]
+    arrived_at: float
+    consumed: bool = False
+
+
+def _mergeable_text(msg: dict) -> Optional[str]:
+    text = (msg.get("text") or "").strip()
+    if not text or text.startswith("/"):
+        return None
+    user = msg.get("from") or {}
+    if not _is_user_allowed_by_meta(user.get("id"), user.get("username")):
+        return None
+    return text
+
+
+def _track_pending(chat_id: Optional[int], message_id: Optional[int], text: Optional[str]) -> Optional[int]:
+    """Record an update in its chat's arrival order so queued prompts can be merged."""
+    if chat_id is None or not _is_coalescing_enabled():
+        return None
+    with _PENDING_COND:
+        token = next(_PENDING_TOKENS)
+        _PENDING.setdefault(chat_id, deque()).append(
+            _PendingUpdate(token, message_id, text, time.monotonic())
+        )
+        _PENDING_COND.notify_all()
+        return token
+
+
+def _forget_pending(chat_id: Optional[int], token: Optional[int]) -> None:
+    if chat_id is None or token is None:
+        return
+    with _PENDING_COND:
+        entries = _PENDING.get(chat_id)
+        if not entries:
+            return
+        for entry in entries:
+            if entry.token == token:
+                entries.remove(entry)
+                break
+        if not entries:
+            del _PENDING[chat_id]
+
+
+def _claim_text_batch(chat_id: int, message_id: int, text: str) -> Optional[tuple[str, int]]:
+    """Merge this prompt with the plain-text prompts queued right behind it.
+
+    Waits until no new message has arrived for the debounce window, then returns the
+    merged prompt and the id of the last merged message. Returns None when an earlier
+    turn already took this message.
+    """
+    window_s = max(0.0, _env_float("TELECODE_COALESCE_WINDOW_MS", 0) / 1000)
+    deadline = time.monotonic() + window_s * 4
+    with _PENDING_COND:
+        while True:
+            entries = list(_PENDING.get(chat_id) or ())
+            own = next(
+                (idx for idx, entry in enumerate(entries) if entry.message_id == message_id and entry.text),
+                None,
+            )
+            if own is None:
+                return text, message_id
+            if entries[own].consumed:
+                return None
+            batch: list[_PendingUpdate] = []
+            for entry in entries[own:]:
+                if entry.text is None or entry.consumed:
+                    break
+                batch.append(entry)
+            now = time.monotonic()
+            wait_s = min(window_s - (now - batch[-1].arrived_at), deadline - now)
+            if wait_s <= 0:
+                break
+            _PENDING_COND.wait(wait_s)
+        for entry in batch:
+            entry.consumed = True
+    if len(batch) > 1:
+        _log(f"Merged {len(batch)} messages into one turn chat_id={chat_id}")
+    return "\n\n".join(entry.text or "" for entry in batch), batch[-1].message_id or message_id
+
+
+def _is_coalescing_enabled() -> bool:
+    return os.getenv("TELECODE_COALESCE", "1").strip().lower() not in {"0", "false", "no", "off"}
+
+
+def _get_dispatcher() -> Dispatcher:
+    global _DISPATCHER
+    with _DISPATCHER_GUARD:
+        if _DISPATCHER is None:
+            _DISPATCHER = Dispatcher(
+                workers=_env_int("TELECODE_WORKERS", 8),
+                max_queue=_env_int("TELECODE_QUEUE_SIZE", 200),
+            )
+        return _DISPATCHER
+
+
+def _send_notice(
+    telegram: TelegramConfig,
+    chat_id: int,
+    text: str,
+    reply_to_message_id: Optional[int],
+) -> None:
+    try:
+        _send_message(telegram, chat_id, text, reply_to_message_id=reply_to_message_id)
+    except Exception as exc:
+        _log_exception("_send_notice", exc)
+
+
+def _control_handler(text: Optional[str]) -> Optional[Callable[[TelegramConfig, dict, Optional[dict]], None]]:
+    """Handler for commands that act on running work and so must not wait in the chat lane."""
+    command = (text or "").strip().split(" ", 1)[0]
+    return {
+        "/cancel": _handle_cancel_request,
+        "/jobs": _handle_jobs_request,
+        "/tail": _handle_tail_request,
+        "/kill": _handle_kill_request,
+    }.get(command.split("@", 1)[0].lower())
+
+
+def _control_target(telegram: TelegramConfig, message: dict, user: Optional[dict]) -> Optional[tuple[int, int]]:
+    chat_id = message.get("chat", {}).get("id")
+    message_id = message.get("message_id")
+    if chat_id is None:
+        return None
+    user = user or {}
+    if not _is_user_allowed_by_meta(user.get("id"), user.get("username")):
+        _send_notice(telegram, chat_id, "Not authorized.", message_id)
+        return None
+    return chat_id, message_id
+
+
+def _handle_cancel_request(telegram: TelegramConfig, message: dict, user: Optional[dict]) -> None:
+    target = _control_target(telegram, message, user)
+    if target is None:
+        return
+    chat_id, message_id = target
+    _log(f"IN cancel chat_id={chat_id}")
+    if _cancel_turn(chat_id) is None:
+        _send_notice(telegram, chat_id, "Nothing is running.", message_id)
+
+
+def _handle_stop_request(telegram: TelegramConfig, message: dict, user: Optional[dict]) -> None:
+    """Stop button: cancel the turn only if the button belongs to it, not a later turn in the chat."""
+    target = _control_target(telegram, message, user)
+    if target is None:
+        return
+    chat_id, message_id = target
+    _log(f"IN stop chat_id={chat_id} message_id={message_id}")
+    if _cancel_turn(chat_id, message_id) is None:
+        _send_notice(telegram, chat_id, "Nothing is running.", message_id)
+
+
+@dataclass
+class _RunningTurn:
+    engine: str
+    started_at: float
+    handles: list[runner.RunHandle] = field(default_factory=list)
+    cancelled: bool = False
+    # Messages whose Stop button controls this turn: the placeholder and the streamed reply.
+    message_ids: set[int] = field(default_factory=set)
+
+    def attach(self, handle: runner.RunHandle) -> None:
+        with _RUNNING_TURNS_GUARD:
+            self.handles.append(handle)
+            cancelled = self.cancelled
+        if cancelled:
+            handle.cancel()
+
+    @property
+    def elapsed_s(self) -> float:
+        return time.monotonic() - self.started_at
+
+
+class TurnCancelled(RuntimeError):
+    def __init__(self, engine: str, elapsed_s: float) -> None:
+        super().__init__(f"Stopped {engine} after {elapsed_s:.1f}s.")
+        self.engine = engine
+        self.elapsed_s = elapsed_s
+
+
+@contextmanager
+def _track_turn(chat_id: int, engine: str, stop_message_id: Optional[int] = None):
+    turn = _RunningTurn(engine, time.monotonic())
+    if stop_message_id is not None:
+        turn.message_ids.add(stop_message_id)
+    with _RUNNING_TURNS_GUARD:
+        _RUNNING_TURNS[chat_id] = turn
+    try:
+        with runner.observe(turn.attach):
+            yield turn
+    except Exception as exc:
+        if turn.cancelled:
+            raise TurnCancelled(engine, turn.elapsed_s) from exc
+        raise
+    finally:
+        with _RUNNING_TURNS_GUARD:
+            if _RUNNING_TURNS.get(chat_id) is turn:
+                del _RUNNING_TURNS[chat_id]
+
+
+def _cancel_turn(chat_id: int, message_id: Optional[int] = None) -> Optional[float]:
+    """Stop the chat's running engine turn; returns how long it ran, or None if idle.
+
+    With message_id only the turn whose Stop button sits on that message is stopped.
+    """
+    with _RUNNING_TURNS_GUARD:
+        turn = _RUNNING_TURNS.get(chat_id)
+        if turn is None or (message_id is not None and message_id not in turn.message_ids):
+            return None
+        turn.cancelled = True
+        handles = list(turn.handles)
+    for handle in handles:
+        handle.cancel()
+    return turn.elapsed_s
+
+
+def _attach_stop_message(chat_id: int, message_id: int) -> None:
+    """Let the Stop button on message_id cancel the chat's running turn."""
+    with _RUNNING_TURNS_GUARD:
+        turn = _RUNNING_TURNS.get(chat_id)
+        if turn is not None:
+            turn.message_ids.add(message_id)
+
+
+def _clear_stop_button(telegram: TelegramConfig, chat_id: int, message_id: Optional[int], text: str) -> None:
+    if message_id is None:
+        return
+    try:
+        _edit_message(telegram, chat_id, message_id, text, reply_markup={"inline_keyboard": []}, wait=False)
+    except Exception as exc:
+        _log_exception("_clear_stop_button", exc)
+
+
+def _answer_callback(telegram: TelegramConfig, callback_id: str, chat_id: Optional[int] = None) -> None:
+    try:
+        # Answers are not counted against send limits, but wait out a 429 on the chat.
+        outbound.default_scheduler().send(
+            chat_id,
+            lambda: telegram_answer_callback_query(telegram, callback_id),
+            limited=False,
+        )
+    except Exception as exc:
+        _log_exception("_answer_callback", exc)
 
 
 def handle_voice_message(
@@ -362,18 +1056,24 @@ def handle_voice_message(
     chat_id = msg["chat"]["id"]
     message_id = msg["message_id"]
     file_id = msg["voice"]["file_id"]
+    file_unique_id = msg["voice"].get("file_unique_id")
 
+    audio_path = None
+    placeholder_id = None
     try:
         _log(f"IN voice chat_id={chat_id} message_id={message_id} file_id={file_id}")
-        _send_message(
-            telegram,
-            chat_id,
-            "Processing your voice note...",
-            reply_to_message_id=message_id,
-        )
+        with tracing.span("placeholder"):
+            placeholder_id = _send_message(
+                telegram,
+                chat_id,
+                "Processing your voice note...",
+                reply_to_message_id=message_id,
+                reply_markup=_STOP_MARKUP,
+            )
 
-        audio = telegram_download_voice(telegram, file_id)
-        transcript = transcribe_with_whisper(audio)
+        with tracing.span("download", kind="voice"):
+            audio_path = _download_media(telegram, file_id, file_unique_id, "voice", ".oga")
+        transcript = transcribe_with_whisper(audio_path)
         _log(f"IN transcript chat_id={chat_id} text={transcript}")
         _handle_prompt(
             transcript,
@@ -383,6 +1083,7 @@ def handle_voice_message(
             telegram,
             sessions_file,
             default_engine,
+            stop_message_id=placeholder_id,
         )
     except Exception as exc:
         _log_exception("handle_voice_message", exc)
@@ -392,6 +1093,9 @@ def handle_voice_message(
             f"Error: {exc}",
             reply_to_message_id=message_id,
         )
+    finally:
+        _clear_stop_button(telegram, chat_id, placeholder_id, "Processing your voice note...")
+        _get_artifact_store().release(audio_path)
 
 
 def handle_text_message(
@@ -423,7 +1127,12 @@ def handle_text_message(
             return
         if _handle_engine_command(text, chat_id, message_id, telegram, sessions_file, default_engine):
             return
-        _handle_prompt(text, chat_id, message_id, timeout_s, telegram, sessions_file, default_engine)
+        batch = _claim_text_batch(chat_id, message_id, text)
+        if batch is None:
+            _log(f"IN text chat_id={chat_id} message_id={message_id} merged into an earlier turn")
+            return
+        prompt, reply_to_message_id = batch
+        _handle_prompt(prompt, chat_id, reply_to_message_id, timeout_s, telegram, sessions_file, default_engine)
     except Exception as exc:
         _log_exception("handle_text_message", exc)
         _send_message(
@@ -456,7 +1165,8 @@ def handle_photo_message(
     message_id = msg["message_id"]
     caption = (msg.get("caption") or "").strip()
     prompt = caption or "User sent an image."
-    photo_id = _pick_best_photo_id(msg.get("photo", []))
+    photo = _pick_best_photo(msg.get("photo", []))
+    photo_id = photo.get("file_id") if photo else None
     if not photo_id:
         _send_message(
             telegram,
@@ -467,16 +1177,19 @@ def handle_photo_message(
         return
 
     image_path = None
+    placeholder_id = None
     try:
-        _send_message(
-            telegram,
-            chat_id,
-            "Processing your image...",
-            reply_to_message_id=message_id,
-        )
+        with tracing.span("placeholder"):
+            placeholder_id = _send_message(
+                telegram,
+                chat_id,
+                "Processing your image...",
+                reply_to_message_id=message_id,
+                reply_markup=_STOP_MARKUP,
+            )
         _log(f"IN photo chat_id={chat_id} message_id={message_id} caption={caption}")
-        image_bytes, file_path = telegram_download_file(telegram, photo_id)
-        image_path = _write_temp_image(image_bytes, file_path)
+        with tracing.span("download", kind="photo"):
+            image_path = _download_media(telegram, photo_id, photo.get("file_unique_id"), "image", ".jpg")
         _handle_prompt(
             prompt,
             chat_id,
@@ -486,6 +1199,7 @@ def handle_photo_message(
             sessions_file,
             default_engine,
             image_paths=[image_path],
+            stop_message_id=placeholder_id,
         )
     except Exception as exc:
         _log_exception("handle_photo_message", exc)
@@ -496,7 +1210,8 @@ def handle_photo_message(
             reply_to_message_id=message_id,
         )
     finally:
-        pass
+        _clear_stop_button(telegram, chat_id, placeholder_id, "Processing your image...")
+        _get_artifact_store().release(image_path)
 
 
 def handle_document_message(
@@ -533,16 +1248,19 @@ def handle_document_message(
         return
 
     image_path = None
+    placeholder_id = None
     try:
-        _send_message(
-            telegram,
-            chat_id,
-            "Processing your image...",
-            reply_to_message_id=message_id,
-        )
+        with tracing.span("placeholder"):
+            placeholder_id = _send_message(
+                telegram,
+                chat_id,
+                "Processing your image...",
+                reply_to_message_id=message_id,
+                reply_markup=_STOP_MARKUP,
+            )
         _log(f"IN document chat_id={chat_id} message_id={message_id} caption={caption}")
-        image_bytes, file_path = telegram_download_file(telegram, file_id)
-        image_path = _write_temp_image(image_bytes, file_path)
+        with tracing.span("download", kind="document"):
+            image_path = _download_media(telegram, file_id, document.get("file_unique_id"), "image", ".jpg")
         _handle_prompt(
             prompt,
             chat_id,
@@ -552,6 +1270,7 @@ def handle_document_message(
             sessions_file,
             default_engine,
             image_paths=[image_path],
+            stop_message_id=placeholder_id,
         )
     except Exception as exc:
         _log_exception("handle_document_message", exc)
@@ -562,7 +1281,8 @@ def handle_document_message(
             reply_to_message_id=message_id,
         )
     finally:
-        pass
+        _clear_stop_button(telegram, chat_id, placeholder_id, "Processing your image...")
+        _get_artifact_store().release(image_path)
 
 
 def handle_callback_query(
@@ -576,7 +1296,7 @@ def handle_callback_query(
     _log_user_identity("callback", user)
     callback_id = callback.get("id")
     if callback_id:
-        telegram_answer_callback_query(telegram, callback_id)
+        _answer_callback(telegram, callback_id, (callback.get("message") or {}).get("chat", {}).get("id"))
 
     if not _is_user_allowed_by_meta(user.get("id"), user.get("username")):
         message = callback.get("message") or {}
@@ -629,46 +1349,181 @@ def _handle_prompt(
     sessions_file: str,
     default_engine: str,
     image_paths: Optional[list[str]] = None,
+    stop_message_id: Optional[int] = None,
 ) -> None:
     engine = _get_engine_for_chat(chat_id, default_engine, sessions_file)
-    session_id = _get_or_create_session(chat_id, sessions_file, engine)
-    answer, _ = _run_engine_locked(
-        prompt,
-        image_paths or [],
-        session_id,
-        timeout_s,
-        engine,
-        chat_id,
-        sessions_file,
-    )
-    _send_message(telegram, chat_id, answer.strip(), reply_to_message_id=message_id)
+    stream = _StreamingReply(telegram, chat_id, message_id) if _is_streaming_enabled() else None
+    try:
+        answer, _ = _run_engine_locked(
+            prompt,
+            image_paths or [],
+            timeout_s,
+            engine,
+            chat_id,
+            sessions_file,
+            on_text=stream.update if stream else None,
+            stop_message_id=stop_message_id,
+        )
+    except TurnCancelled as exc:
+        _log(f"Cancelled {exc.engine} turn chat_id={chat_id} after {exc.elapsed_s:.1f}s")
+        if stream:
+            stream.finish(str(exc), partial=True)
+        else:
+            _send_message(telegram, chat_id, str(exc), reply_to_message_id=message_id)
+        return
+    with tracing.span("reply", streamed=stream is not None):
+        if stream:
+            stream.finish(answer.strip())
+        else:
+            _deliver_text(telegram, chat_id, answer.strip(), reply_to_message_id=message_id)
     _maybe_send_tts(answer, chat_id, message_id, telegram)
 
 
-def transcribe_with_whisper(audio_bytes: bytes) -> str:
+class _StreamingReply:
+    """Post the partial answer once, then edit it in place at a throttled rate."""
+
+    def __init__(self, telegram: TelegramConfig, chat_id: int, reply_to_message_id: int) -> None:
+        self._telegram = telegram
+        self._chat_id = chat_id
+        self._reply_to = reply_to_message_id
+        self._interval_s = _stream_edit_interval_s()
+        self._message_id: Optional[int] = None
+        self._sent_text = ""
+        self._last_edit = 0.0
+
+    def update(self, text: str) -> None:
+        text = _stream_preview(text)
+        if not text.strip() or text == self._sent_text:
+            return
+        now = time.monotonic()
+        if self._message_id is not None and now - self._last_edit < self._interval_s:
+            return
+        try:
+            self._publish(text)
+        except Exception as exc:
+            _log(f"Streaming update failed: {exc}")
+        self._last_edit = now
+
+    def finish(self, text: str, partial: bool = False) -> None:
+        """Publish the final text and drop the Stop button; partial keeps what was streamed."""
+        if partial and self._sent_text:
+            text = f"{self._sent_text}\n\n{text}"
+        if self._message_id is None:
+            _deliver_text(self._telegram, self._chat_id, text, reply_to_message_id=self._reply_to)
+            return
+        if len(text) > _TELEGRAM_TEXT_LIMIT:
+            _deliver_text(
+                self._telegram,
+                self._chat_id,
+                text,
+                edit_message_id=self._message_id,
+                reply_markup={"inline_keyboard": []},
+            )
+            self._sent_text = text
+            return
+        self._publish(text, final=True)
+
+    def _publish(self, text: str, final: bool = False) -> None:
+        markup = _STOP_MARKUP
+        if final:
+            markup = None if self._message_id is None else {"inline_keyboard": []}
+        if self._message_id is None:
+            self._message_id = _send_message(
+                self._telegram,
+                self._chat_id,
+                text,
+                reply_to_message_id=self._reply_to,
+                reply_markup=markup,
+            )
+            if markup is _STOP_MARKUP and self._message_id is not None:
+                _attach_stop_message(self._chat_id, self._message_id)
+        else:
+            _edit_message(self._telegram, self._chat_id, self._message_id, text, reply_markup=markup, wait=final)
+        self._sent_text = text
+
+
+def _stream_preview(text: str) -> str:
+    text = text.strip()
+    if len(text) <= _TELEGRAM_TEXT_LIMIT:
+        return text
+    return text[: _TELEGRAM_TEXT_LIMIT - 1] + "…"
+
+
+def _is_streaming_enabled() -> bool:
+    return _is_truthy_env("TELECODE_STREAM")
+
+
+def _stream_edit_interval_s() -> float:
+    return max(0.0, _env_float("TELECODE_STREAM_EDIT_INTERVAL_S", 1.5))
+
+
+def transcribe_with_whisper(audio: bytes | str) -> str:
+    with tracing.span("transcribe"), metrics.WHISPER_SECONDS.time():
+        return _get_whisper_pool().transcribe(audio, timeout_s=_whisper_timeout_s())
+
+
+def _whisper_timeout_s() -> Optional[float]:
+    timeout_s = _env_float("TELECODE_WHISPER_TIMEOUT_S", 300.0)
+    return timeout_s if timeout_s > 0 else None
+
+
+def _get_whisper_pool() -> WhisperPool:
+    global _WHISPER_POOL
+    with _WHISPER_POOL_GUARD:
+        if _WHISPER_POOL is None:
+            model = os.getenv("TELECODE_WHISPER_MODEL", "").strip() or "base"
+            workers = _env_int("TELECODE_WHISPER_WORKERS", 1)
+            _WHISPER_POOL = WhisperPool(model, workers)
+        return _WHISPER_POOL
+
+
+def _prewarm_whisper() -> None:
     try:
-        import whisper  # type: ignore
-    except Exception as exc:  # pragma: no cover - optional dependency
-        raise RuntimeError(
-            "Whisper is not installed. Run `pip install openai-whisper` and ensure ffmpeg is available."
-        ) from exc
+        _get_whisper_pool().warm()
+        _log("Whisper workers ready.")
+    except Exception as exc:
+        print(f"Warning: failed to pre-warm Whisper: {exc}")
 
-    with tempfile.NamedTemporaryFile(suffix=".ogg", delete=True) as temp:
-        temp.write(audio_bytes)
-        temp.flush()
 
-        model = whisper.load_model("base")
-        result = model.transcribe(temp.name)
+def _get_warm_pool() -> Optional[WarmPool]:
+    global _WARM_POOL
+    if not _is_truthy_env("TELECODE_WARM"):
+        return None
+    with _WARM_POOL_GUARD:
+        if _WARM_POOL is None:
+            _WARM_POOL = WarmPool(
+                idle_ttl_s=_env_float("TELECODE_WARM_TTL_S", 600.0),
+                max_workers=_env_int("TELECODE_WARM_MAX", 16),
+            )
+        return _WARM_POOL
+
+
+def _warm_add_dirs(image_paths: list[str]) -> list[str]:
+    dirs = {_ensure_project_temp_dir()}
+    dirs.update(os.path.dirname(path) or "." for path in image_paths)
+    return sorted(dirs)
 
-    text = result.get("text")
-    if not text:
-        raise RuntimeError("Whisper returned empty transcript")
-    return text.strip()
+
+def _prewarm_engine(chat_id: int, engine: str, sessions_file: str) -> None:
+    """Start the chat's warm Claude worker as soon as it picks Claude; drop it when it leaves."""
+    pool = _get_warm_pool()
+    if pool is None:
+        return
+    store = _get_state_store(sessions_file)
+    if engine != "claude":
+        session_id = store.get(chat_id, "claude")
+        if session_id:
+            pool.evict(session_id)
+        return
+    fresh = not _chat_session(store, chat_id, "claude")
+    session_id = _get_or_create_session(chat_id, sessions_file, "claude")
+    if session_id:
+        pool.prespawn(session_id, _warm_add_dirs([]), fresh=fresh)
 
 
 def _get_or_create_session(chat_id: int, sessions_file: str, engine: str) -> Optional[str]:
-    sessions = _load_sessions(sessions_file)
-    session_id = sessions.get(engine)
+    store = _get_state_store(sessions_file)
+    session_id = _chat_session(store, chat_id, engine)
     if session_id:
         return session_id
 
@@ -676,23 +1531,56 @@ def _get_or_create_session(chat_id: int, sessions_file: str, engine: str) -> Opt
         return None
 
     session_id = str(uuid.uuid4())
-    sessions[engine] = session_id
-    _save_sessions(sessions_file, sessions)
+    store.set(chat_id, engine, session_id)
+    return session_id
+
+
+def _chat_session(store: ChatStateStore, chat_id: int, engine: str) -> Optional[str]:
+    """The chat's session id. The first chat without one takes over the legacy global session."""
+    session_id = store.get(chat_id, engine)
+    if session_id or chat_id == _LEGACY_SESSION_CHAT:
+        return session_id
+    with _LEGACY_SESSION_GUARD:
+        session_id = store.get(_LEGACY_SESSION_CHAT, engine)
+        if not session_id:
+            return None
+        store.set(_LEGACY_SESSION_CHAT, engine, None)
+        store.set(chat_id, engine, session_id)
+    print(f"Chat {chat_id} continues the {engine} session {session_id} shared by all chats before the upgrade.")
     return session_id
 
 
 def _run_engine_locked(
     prompt: str,
     image_paths: list[str],
-    session_id: Optional[str],
     timeout_s: Optional[int],
     engine: str,
     chat_id: int,
     sessions_file: str,
+    on_text: Optional[Callable[[str], None]] = None,
+    stop_message_id: Optional[int] = None,
 ) -> tuple[str, Optional[str]]:
-    lock_id = session_id or f"{engine}:{chat_id}"
-    session_lock = _get_session_lock(lock_id)
-    with session_lock:
+    with (
+        tracing.span("engine", engine=engine),
+        _hold_session_lock(f"chat:{chat_id}"),
+        metrics.ENGINE_SECONDS.time(engine=engine),
+        _track_turn(chat_id, engine, stop_message_id),
+    ):
+        fresh = not _chat_session(_get_state_store(sessions_file), chat_id, engine)
+        session_id = _get_or_create_session(chat_id, sessions_file, engine)
+        pool = _get_warm_pool()
+        if engine == "claude" and pool is not None:
+            return (
+                pool.ask(
+                    session_id or "",
+                    _format_prompt_with_images(prompt, image_paths),
+                    timeout_s,
+                    add_dirs=_warm_add_dirs(image_paths),
+                    on_text=on_text,
+                    fresh=fresh,
+                ),
+                None,
+            )
         if engine == "claude":
             return (
                 ask_claude_code(
@@ -700,6 +1588,7 @@ def _run_engine_locked(
                     session_id=session_id or "",
                     timeout_s=timeout_s,
                     image_paths=image_paths,
+                    on_text=on_text,
                 ),
                 None,
             )
@@ -710,6 +1599,8 @@ def _run_engine_locked(
             session_id,
             timeout_s,
             image_paths=image_paths,
+            on_text=on_text,
+            on_tool=lambda kind, summary: _log(f"Codex {kind}: {summary}"),
         )
         if new_session_id:
             _log(f"Codex session_id={new_session_id}")
@@ -721,28 +1612,32 @@ def _run_engine_locked(
         return answer, logs
 
 
-def _load_sessions(sessions_file: str) -> dict[str, Optional[str]]:
-    with _SESSIONS_FILE_GUARD:
-        if sessions_file.endswith(".json"):
-            return _load_sessions_from_json(sessions_file)
-        return _load_sessions_from_kv(sessions_file)
-
-
-def _save_sessions(sessions_file: str, sessions: dict[str, Optional[str]]) -> None:
-    with _SESSIONS_FILE_GUARD:
-        if sessions_file.endswith(".json"):
-            _save_sessions_to_json(sessions_file, sessions)
-        else:
-            _save_sessions_to_kv(sessions_file, sessions)
-
-
-def _get_session_lock(session_id: str) -> threading.Lock:
+@contextmanager
+def _hold_session_lock(lock_id: str):
     with _SESSION_LOCKS_GUARD:
-        lock = _SESSION_LOCKS.get(session_id)
+        lock = _SESSION_LOCKS.get(lock_id)
         if lock is None:
-            lock = threading.Lock()
-            _SESSION_LOCKS[session_id] = lock
-        return lock
+            lock = _SessionLock()
+            _SESSION_LOCKS[lock_id] = lock
+        lock.users += 1
+        _prune_session_locks(time.monotonic())
+    try:
+        with lock:
+            yield
+    finally:
+        with _SESSION_LOCKS_GUARD:
+            lock.users -= 1
+            lock.last_used = time.monotonic()
+
+
+def _prune_session_locks(now: float) -> None:
+    idle_keys = [
+        key
+        for key, lock in _SESSION_LOCKS.items()
+        if lock.users == 0 and now - lock.last_used > _SESSION_LOCK_IDLE_S
+    ]
+    for key in idle_keys:
+        _SESSION_LOCKS.pop(key, None)
 
 
 def _normalize_session_value(value: object) -> Optional[str]:
@@ -775,76 +1670,15 @@ def _load_sessions_data_json(path: str) -> dict[str, object] | None:
         return None
 
 
-def _load_sessions_from_json(path: str) -> dict[str, Optional[str]]:
-    if not os.path.exists(path):
-        return {"claude": None, "codex": None}
-    data = _load_sessions_data_json(path)
-    if data is None or not isinstance(data, dict):
-        return {"claude": None, "codex": None}
-
-    claude_session = _normalize_session_value(data.get("claude_session") or data.get("claude"))
-    codex_session = _normalize_session_value(data.get("codex_session") or data.get("codex"))
-    return {"claude": claude_session, "codex": codex_session}
-
-
-def _save_sessions_to_json(path: str, sessions: dict[str, Optional[str]]) -> None:
-    data = _load_sessions_data_json(path) or {}
-    if not isinstance(data, dict):
-        data = {}
-    data["claude_session"] = sessions.get("claude")
-    data["codex_session"] = sessions.get("codex")
-    with open(path, "w", encoding="utf-8") as handle:
-        json.dump(data, handle, indent=2, sort_keys=True)
-
-
-def _load_sessions_from_kv(path: str) -> dict[str, Optional[str]]:
-    data = _read_kv_file(path)
-    return {
-        "claude": _normalize_session_value(data.get("TELECODE_SESSION_CLAUDE")),
-        "codex": _normalize_session_value(data.get("TELECODE_SESSION_CODEX")),
-    }
-
-
-def _save_sessions_to_kv(path: str, sessions: dict[str, Optional[str]]) -> None:
-    lines = _read_env_lines(path)
-    filtered: list[str] = []
-    for line in lines:
-        stripped = line.strip()
-        if stripped.startswith("TELECODE_SESSION_CLAUDE=") or stripped.startswith(
-            "TELECODE_SESSION_CODEX="
-        ):
-            continue
-        filtered.append(line)
-    if sessions.get("claude"):
-        filtered.append(f"TELECODE_SESSION_CLAUDE={sessions['claude']}")
-    if sessions.get("codex"):
-        filtered.append(f"TELECODE_SESSION_CODEX={sessions['codex']}")
-    _write_env_lines(path, filtered)
-
-
 def _get_engine_for_chat(chat_id: int, default_engine: str, sessions_file: str) -> str:
-    overrides = _load_engine_overrides(sessions_file)
-    engine = overrides.get(str(chat_id), default_engine)
+    engine = _get_state_store(sessions_file).get(chat_id, "engine") or default_engine
     return engine if engine in {"claude", "codex"} else default_engine
 
 
 def _set_engine_for_chat(chat_id: int, engine: str, sessions_file: str) -> None:
     if engine not in {"claude", "codex"}:
         return
-    with _SESSIONS_FILE_GUARD:
-        if sessions_file.endswith(".json"):
-            data = _load_sessions_data_json(sessions_file) or {}
-            if not isinstance(data, dict):
-                data = {}
-            overrides = data.get("engine_overrides")
-            if not isinstance(overrides, dict):
-                overrides = {}
-            overrides[str(chat_id)] = engine
-            data["engine_overrides"] = overrides
-            with open(sessions_file, "w", encoding="utf-8") as handle:
-                json.dump(data, handle, indent=2, sort_keys=True)
-        else:
-            _save_engine_override_kv(sessions_file, chat_id, engine)
+    _get_state_store(sessions_file).set(chat_id, "engine", engine)
 
 
 def _env_path() -> str:
@@ -880,53 +1714,17 @@ def _set_env_value(lines: list[str], key: str, value: str) -> list[str]:
 
 
 def _persist_engine_default(engine: str) -> None:
+    """Write a new global default engine to .telecode; a no-op when it is already the default."""
     if engine not in {"claude", "codex"}:
         return
-    os.environ["TELECODE_ENGINE"] = engine
     env_path = _env_path()
     with _ENV_FILE_GUARD:
         lines = _read_env_lines(env_path)
-        lines = _set_env_value(lines, "TELECODE_ENGINE", engine)
-        _write_env_lines(env_path, lines)
-
-
-def _load_engine_overrides(sessions_file: str) -> dict[str, str]:
-    if sessions_file.endswith(".json"):
-        data = _load_sessions_data_json(sessions_file)
-        if not isinstance(data, dict):
-            return {}
-        overrides = data.get("engine_overrides")
-        if not isinstance(overrides, dict):
-            return {}
-        return {str(k): str(v) for k, v in overrides.items() if isinstance(v, str)}
-    return _load_engine_overrides_kv(sessions_file)
-
-
-def _load_engine_overrides_kv(path: str) -> dict[str, str]:
-    data = _read_kv_file(path)
-    prefix = "TELECODE_ENGINE_OVERRIDE_"
-    overrides: dict[str, str] = {}
-    for key, value in data.items():
-        if key.startswith(prefix):
-            overrides[key[len(prefix):]] = value
-    return overrides
-
-
-def _save_engine_override_kv(path: str, chat_id: int, engine: str) -> None:
-    prefix = "TELECODE_ENGINE_OVERRIDE_"
-    lines = _read_env_lines(path)
-    target = f"{prefix}{chat_id}="
-    updated = False
-    new_lines: list[str] = []
-    for line in lines:
-        if line.startswith(target):
-            new_lines.append(f"{prefix}{chat_id}={engine}")
-            updated = True
-        else:
-            new_lines.append(line)
-    if not updated:
-        new_lines.append(f"{prefix}{chat_id}={engine}")
-    _write_env_lines(path, new_lines)
+        if os.getenv("TELECODE_ENGINE") == engine and _read_kv_file(env_path).get("TELECODE_ENGINE") == engine:
+            return
+        os.environ["TELECODE_ENGINE"] = engine
+        _write_env_lines(env_path, _set_env_value(lines, "TELECODE_ENGINE", engine))
+    _invalidate_config()
 
 
 def _store_session(
@@ -935,9 +1733,136 @@ def _store_session(
     engine: str,
     session_id: str,
 ) -> None:
-    sessions = _load_sessions(sessions_file)
-    sessions[engine] = session_id
-    _save_sessions(sessions_file, sessions)
+    _get_state_store(sessions_file).set(chat_id, engine, session_id)
+
+
+def _get_state_store(sessions_file: str) -> ChatStateStore:
+    path = _state_db_path(sessions_file)
+    store = _STATE_STORES.get(path)
+    if store is not None:
+        return store
+    with _SESSIONS_FILE_GUARD:
+        store = _STATE_STORES.get(path)
+        if store is None:
+            store = ChatStateStore(path, flush_interval_s=_env_float("TELECODE_STATE_FLUSH_S", 0.5))
+            _migrate_legacy_chat_state(store, sessions_file)
+            _STATE_STORES[path] = store
+        return store
+
+
+def _state_db_path(sessions_file: str) -> str:
+    configured = os.getenv("TELECODE_STATE_DB", "").strip()
+    if configured:
+        return os.path.abspath(os.path.expanduser(configured))
+    directory = os.path.dirname(os.path.abspath(sessions_file))
+    return os.path.join(directory, ".telecode_state.db")
+
+
+def _get_deduplicator(sessions_file: str) -> UpdateDeduplicator:
+    global _DEDUP
+    if _DEDUP is not None:
+        return _DEDUP
+    with _DEDUP_GUARD:
+        if _DEDUP is None:
+            path = _state_db_path(sessions_file) if _is_truthy_env("TELECODE_DEDUP_PERSIST") else None
+            _DEDUP = UpdateDeduplicator(
+                window_s=_env_float("TELECODE_DEDUP_WINDOW_S", 3600),
+                max_size=_env_int("TELECODE_DEDUP_MAX", 10000),
+                path=path,
+            )
+        return _DEDUP
+
+
+def _close_state_stores() -> None:
+    with _SESSIONS_FILE_GUARD:
+        stores = list(_STATE_STORES.values())
+        _STATE_STORES.clear()
+    for store in stores:
+        store.close()
+
+
+def _migrate_legacy_chat_state(store: ChatStateStore, sessions_file: str) -> None:
+    """Move per-chat keys out of the legacy sessions file into the store, once."""
+    if not os.path.exists(sessions_file):
+        return
+    if sessions_file.endswith(".json"):
+        moved = _migrate_legacy_json(store, sessions_file)
+    else:
+        moved = _migrate_legacy_kv(store, sessions_file)
+    if moved:
+        store.flush()
+        _log(f"Migrated {moved} chat state entries from {sessions_file} to {store.path}")
+
+
+def _migrate_legacy_kv(store: ChatStateStore, path: str) -> int:
+    prefixes = {
+        "TELECODE_ENGINE_OVERRIDE_": "engine",
+        "TELECODE_SESSION_CLAUDE_": "claude",
+        "TELECODE_SESSION_CODEX_": "codex",
+    }
+    kept: list[str] = []
+    moved = 0
+    for line in _read_env_lines(path):
+        key, _, value = line.strip().partition("=")
+        kind = None
+        chat_id = ""
+        for prefix, name in prefixes.items():
+            if key.startswith(prefix):
+                kind, chat_id = name, key[len(prefix):]
+                break
+        if key.strip() in _LEGACY_SESSION_KEYS:
+            moved += _keep_legacy_session(store, _LEGACY_SESSION_KEYS[key.strip()], value)
+            continue
+        if kind is None or not chat_id.lstrip("-").isdigit():
+            kept.append(line)
+            continue
+        if value.strip() and not store.get(int(chat_id), kind):
+            store.set(int(chat_id), kind, value.strip())
+        moved += 1
+    if moved:
+        _write_env_lines(path, kept)
+    return moved
+
+
+def _migrate_legacy_json(store: ChatStateStore, path: str) -> int:
+    data = _load_sessions_data_json(path)
+    if not isinstance(data, dict):
+        return 0
+    moved = 0
+    for key, engine in (("claude_session", "claude"), ("claude", "claude"), ("codex_session", "codex"), ("codex", "codex")):
+        if key in data:
+            moved += _keep_legacy_session(store, engine, data.pop(key))
+    overrides = data.pop("engine_overrides", None)
+    if isinstance(overrides, dict):
+        for chat_id, engine in overrides.items():
+            if str(chat_id).lstrip("-").isdigit() and isinstance(engine, str):
+                store.set(int(chat_id), "engine", engine)
+                moved += 1
+    sessions = data.pop("sessions", None)
+    if isinstance(sessions, dict):
+        for chat_id, entry in sessions.items():
+            if not str(chat_id).lstrip("-").isdigit() or not isinstance(entry, dict):
+                continue
+            for engine in ("claude", "codex"):
+                value = _normalize_session_value(entry.get(engine))
+                if value:
+                    store.set(int(chat_id), engine, value)
+                    moved += 1
+    if moved:
+        with open(path, "w", encoding="utf-8") as handle:
+            json.dump(data, handle, indent=2, sort_keys=True)
+    return moved
+
+
+def _keep_legacy_session(store: ChatStateStore, engine: str, value: object) -> int:
+    """Park a pre-per-chat global session until the first chat using engine takes it over."""
+    session_id = _normalize_session_value(value.strip() if isinstance(value, str) else value)
+    if not session_id:
+        return 0
+    if not store.get(_LEGACY_SESSION_CHAT, engine):
+        store.set(_LEGACY_SESSION_CHAT, engine, session_id)
+        print(f"Legacy global {engine} session {session_id} will continue in the next chat that uses {engine}.")
+    return 1
 
 
 def _extract_options(answer: str, fallback_text: Optional[str] = None) -> tuple[str, list[str]]:
@@ -1031,7 +1956,7 @@ def _is_image_document(document: Optional[dict]) -> bool:
     return mime.startswith("image/")
 
 
-def _pick_best_photo_id(photos: list[dict]) -> Optional[str]:
+def _pick_best_photo(photos: list[dict]) -> Optional[dict]:
     if not photos:
         return None
     def score(photo: dict) -> int:
@@ -1039,21 +1964,86 @@ def _pick_best_photo_id(photos: list[dict]) -> Optional[str]:
         width = photo.get("width") or 0
         height = photo.get("height") or 0
         return file_size or (width * height)
-    best = max(photos, key=score)
-    return best.get("file_id")
-
-
-def _write_temp_image(image_bytes: bytes, file_path: str) -> str:
-    _, ext = os.path.splitext(file_path)
-    suffix = ext if ext else ".jpg"
-    temp_dir = _ensure_project_temp_dir()
-    filename = f"image_{uuid.uuid4().hex}{suffix}"
-    path = os.path.join(temp_dir, filename)
-    with open(path, "wb") as handle:
-        handle.write(image_bytes)
+    return max(photos, key=score)
+
+
+def _download_media(
+    telegram: TelegramConfig,
+    file_id: str,
+    file_unique_id: Optional[str],
+    prefix: str,
+    default_suffix: str,
+) -> str:
+    """Fetch a Telegram file into the artifact store and return its path, leased to the caller.
+
+    Repeats of the same file_unique_id are linked from the media cache instead of downloaded.
+    """
+    store = _get_artifact_store()
+    cache = _get_media_cache()
+    cached = cache.get_path(file_unique_id) if cache is not None else None
+    if cached is not None:
+        _log(f"Media cache hit file_unique_id={file_unique_id}")
+        return store.link(cached, prefix, os.path.splitext(cached)[1] or default_suffix)
+    path, file_path = telegram_download_to_path(
+        telegram,
+        file_id,
+        store.root,
+        prefix,
+        default_suffix=default_suffix,
+        max_bytes=_env_int("TELECODE_MAX_DOWNLOAD_MB", 20) << 20,
+    )
+    store.add(path)
+    if cache is not None:
+        try:
+            cache.put_file(file_unique_id, path, file_path)
+        except (OSError, sqlite3.Error) as exc:
+            print(f"Warning: failed to cache {file_unique_id}: {exc}")
     return path
 
 
+def _get_media_cache() -> Optional[MediaCache]:
+    max_mb = _env_int("TELECODE_MEDIA_CACHE_MB", 256)
+    if max_mb <= 0:
+        return None
+    root = os.getenv("TELECODE_MEDIA_CACHE_DIR", "").strip() or os.path.join(os.getcwd(), ".telecode_media")
+    with _ARTIFACT_STORES_GUARD:
+        cache = _MEDIA_CACHES.get(root)
+        if cache is None:
+            cache = MediaCache(root, max_bytes=max_mb << 20)
+            _MEDIA_CACHES[root] = cache
+        return cache
+
+
+def _get_artifact_store() -> ArtifactStore:
+    root = _ensure_project_temp_dir()
+    with _ARTIFACT_STORES_GUARD:
+        store = _ARTIFACT_STORES.get(root)
+        if store is None:
+            store = ArtifactStore(
+                root,
+                max_bytes=_env_int("TELECODE_TMP_MAX_MB", 512) << 20,
+                max_age_s=_env_float("TELECODE_TMP_MAX_AGE_S", 86400.0),
+                sweep_interval_s=_env_float("TELECODE_TMP_SWEEP_S", 60.0),
+            )
+            _ARTIFACT_STORES[root] = store
+        return store
+
+
+def _close_artifact_stores() -> None:
+    with _ARTIFACT_STORES_GUARD:
+        stores = list(_ARTIFACT_STORES.values()) + list(_MEDIA_CACHES.values()) + list(_TTS_CACHES.values())
+        _ARTIFACT_STORES.clear()
+        _MEDIA_CACHES.clear()
+        _TTS_CACHES.clear()
+    for store in stores:
+        store.close()
+
+
+def _temp_dir_bytes() -> int:
+    with _ARTIFACT_STORES_GUARD:
+        return sum(store.total_bytes for store in _ARTIFACT_STORES.values())
+
+
 def _ensure_project_temp_dir() -> str:
     path = os.path.join(os.getcwd(), ".telecode_tmp")
     os.makedirs(path, exist_ok=True)
@@ -1164,42 +2154,216 @@ def _send_message(
     _log(f"OUT message chat_id={chat_id} text={text}")
     if reply_markup is not None:
         _log(f"OUT reply_markup chat_id={chat_id} payload={reply_markup}")
-    return telegram_send_message(
-        telegram,
+    return outbound.default_scheduler().send(
+        chat_id,
+        lambda: telegram_send_message(
+            telegram,
+            chat_id,
+            text,
+            reply_to_message_id=reply_to_message_id,
+            reply_markup=reply_markup,
+        ),
+    )
+
+
+def _edit_message(
+    telegram: TelegramConfig,
+    chat_id: int,
+    message_id: int,
+    text: str,
+    reply_markup: dict | None = None,
+    wait: bool = True,
+) -> None:
+    """Edit a message; wait=False returns at once and lets a newer edit replace this one."""
+    _log(f"OUT edit chat_id={chat_id} message_id={message_id} text={text}")
+    outbound.default_scheduler().edit(
+        chat_id,
+        message_id,
+        lambda: telegram_edit_message_text(telegram, chat_id, message_id, text, reply_markup=reply_markup),
+        wait=wait,
+    )
+
+
+def _run_cli_command(cmd: str, chat_id: int, message_id: int, telegram: TelegramConfig) -> None:
+    """Run cmd as a job and stream its output into one reply.
+
+    Commands still running after TELECODE_CLI_BACKGROUND_AFTER_S are left in the
+    background, freeing the chat; their result is sent when they end.
+    """
+    job = _get_job_manager().start(
         chat_id,
-        text,
-        reply_to_message_id=reply_to_message_id,
-        reply_markup=reply_markup,
+        cmd,
+        timeout_s=_env_float("TELECODE_CLI_TIMEOUT_S", 3600.0) or None,
+        on_background_exit=lambda job: _NOTICES.submit(_report_job, telegram, job, message_id),
     )
+    reply_id = _send_message(telegram, chat_id, f"$ {cmd}", reply_to_message_id=message_id)
+    deadline = time.monotonic() + max(0.0, _env_float("TELECODE_CLI_BACKGROUND_AFTER_S", 30.0))
+    interval = max(0.2, _stream_edit_interval_s())
+    shown = ""
+    while not job.wait(min(interval, max(0.0, deadline - time.monotonic()))):
+        if time.monotonic() >= deadline and job.detach():
+            _edit_message(
+                telegram,
+                chat_id,
+                reply_id,
+                _cli_progress(job)
+                + f"\n\nStill running after {job.elapsed_s:.0f}s; continuing as job #{job.id}."
+                + f"\n/tail {job.id} to follow it, /kill {job.id} to stop it.",
+            )
+            return
+        text = _cli_progress(job)
+        if text != shown:
+            _edit_message(telegram, chat_id, reply_id, text, wait=False)
+            shown = text
+    _deliver_text(telegram, chat_id, _cli_result(job), edit_message_id=reply_id, filename="cli-output.txt")
+
 
+def _cli_progress(job: Job) -> str:
+    header = f"$ {job.command}"
+    tail = job.tail(_TELEGRAM_TEXT_LIMIT - len(header) - 200).strip()
+    return f"{header}\n{tail}" if tail else f"{header}\n(running…)"
 
-def _run_cli_command(cmd: str, timeout_s: int = 30) -> str:
+
+def _cli_result(job: Job) -> str:
+    output = job.output().strip() or "Command finished with no output."
+    if job.dropped:
+        output = f"[first {job.dropped} characters dropped]\n{output}"
+    if job.state == "timed out":
+        output += f"\n\nCommand timed out after {job.timeout_s:g}s."
+    elif job.state == "killed":
+        output += "\n\nKilled."
+    elif job.returncode:
+        output += f"\n\n(exit code {job.returncode})"
+    return output
+
+
+def _report_job(telegram: TelegramConfig, job: Job, reply_to_message_id: int) -> None:
     try:
-        completed = subprocess.run(
-            cmd,
-            shell=True,
-            text=True,
-            capture_output=True,
-            timeout=timeout_s,
-            cwd=os.getcwd(),
+        _deliver_text(
+            telegram,
+            job.chat_id,
+            f"Job #{job.id} {job.state} after {job.elapsed_s:.0f}s: {job.command}\n\n{_cli_result(job)}",
+            reply_to_message_id=reply_to_message_id,
+            filename=f"job-{job.id}.txt",
         )
-    except subprocess.TimeoutExpired:
-        return f"Command timed out after {timeout_s}s."
     except Exception as exc:
-        return f"Command failed: {exc}"
+        _log_exception("_report_job", exc)
 
-    stdout = (completed.stdout or "").strip()
-    stderr = (completed.stderr or "").strip()
-    output = "\n".join(part for part in [stdout, stderr] if part)
-    if not output:
-        output = "Command finished with no output."
-    return _truncate_message(output)
 
+def _get_job_manager() -> JobManager:
+    global _JOBS
+    with _JOBS_GUARD:
+        if _JOBS is None:
+            _JOBS = JobManager(max_parallel=_env_int("TELECODE_CLI_MAX_JOBS", 8))
+        return _JOBS
 
-def _truncate_message(text: str, limit: int = 3500) -> str:
-    if len(text) <= limit:
-        return text
-    return f"{text[:limit]}\n...[truncated]"
+
+def _job_argument(message: dict) -> Optional[int]:
+    parts = (message.get("text") or "").split()
+    if len(parts) < 2:
+        return None
+    try:
+        return int(parts[1].lstrip("#"))
+    except ValueError:
+        return None
+
+
+def _handle_jobs_request(telegram: TelegramConfig, message: dict, user: Optional[dict]) -> None:
+    target = _control_target(telegram, message, user)
+    if target is None:
+        return
+    chat_id, message_id = target
+    jobs = _get_job_manager().jobs(chat_id)
+    lines = [f"#{job.id} {job.state} {job.elapsed_s:.0f}s: {job.command}" for job in jobs]
+    _send_notice(telegram, chat_id, "\n".join(lines) or "No jobs.", message_id)
+
+
+def _handle_tail_request(telegram: TelegramConfig, message: dict, user: Optional[dict]) -> None:
+    target = _control_target(telegram, message, user)
+    if target is None:
+        return
+    chat_id, message_id = target
+    job_id = _job_argument(message)
+    job = _get_job_manager().get(chat_id, job_id) if job_id is not None else None
+    if job is None:
+        _send_notice(telegram, chat_id, "Usage: /tail <id> (see /jobs)", message_id)
+        return
+    header = f"Job #{job.id} {job.state} {job.elapsed_s:.0f}s: {job.command}"
+    tail = job.tail(_TELEGRAM_TEXT_LIMIT - len(header) - 16).strip() or "(no output yet)"
+    _send_notice(telegram, chat_id, f"{header}\n{tail}", message_id)
+
+
+def _handle_kill_request(telegram: TelegramConfig, message: dict, user: Optional[dict]) -> None:
+    target = _control_target(telegram, message, user)
+    if target is None:
+        return
+    chat_id, message_id = target
+    job_id = _job_argument(message)
+    job = _get_job_manager().get(chat_id, job_id) if job_id is not None else None
+    if job is None:
+        _send_notice(telegram, chat_id, "Usage: /kill <id> (see /jobs)", message_id)
+        return
+    _log(f"IN kill chat_id={chat_id} job={job.id}")
+    # The job's own reply (or its background report) shows that it was killed.
+    if not job.kill():
+        _send_notice(telegram, chat_id, f"Job #{job.id} is not running.", message_id)
+
+
+def _deliver_text(
+    telegram: TelegramConfig,
+    chat_id: int,
+    text: str,
+    reply_to_message_id: int | None = None,
+    edit_message_id: int | None = None,
+    reply_markup: dict | None = None,
+    filename: str = "answer.txt",
+) -> Optional[int]:
+    """Send text of any length: as one message, as ordered chunks, or past the
+    document threshold as a file upload with a preview. edit_message_id puts the
+    first chunk (or the preview) into an existing message instead of a new one.
+    """
+    text = text.strip()
+    if len(text) > _document_threshold():
+        first = preview(text, _TELEGRAM_TEXT_LIMIT - 64) + f"\n\nFull output ({len(text)} characters) attached as {filename}."
+        chunks = [first]
+    else:
+        chunks = split_message(text, _TELEGRAM_TEXT_LIMIT) or [text]
+    if edit_message_id is not None:
+        _edit_message(telegram, chat_id, edit_message_id, chunks[0], reply_markup=reply_markup)
+        first_id = edit_message_id
+    else:
+        first_id = _send_message(
+            telegram, chat_id, chunks[0], reply_to_message_id=reply_to_message_id, reply_markup=reply_markup
+        )
+    # Sent one after another over the chat's pooled connection, so they arrive in order.
+    for chunk in chunks[1:]:
+        _send_message(telegram, chat_id, chunk)
+    if len(text) > _document_threshold():
+        _send_document(telegram, chat_id, text, filename, reply_to_message_id=first_id)
+    return first_id
+
+
+def _send_document(
+    telegram: TelegramConfig,
+    chat_id: int,
+    text: str,
+    filename: str,
+    reply_to_message_id: int | None = None,
+) -> int:
+    _log(f"OUT document chat_id={chat_id} filename={filename} chars={len(text)}")
+    with spool_text(text) as spool:
+
+        def upload() -> int:
+            spool.seek(0)
+            return telegram_send_document(
+                telegram, chat_id, spool, filename, reply_to_message_id=reply_to_message_id
+            )
+
+        return outbound.default_scheduler().send(chat_id, upload)
+
+
+def _document_threshold() -> int:
+    return max(_TELEGRAM_TEXT_LIMIT, _env_int("TELECODE_DOCUMENT_THRESHOLD", 16000))
 
 
 def _is_tts_enabled() -> bool:
@@ -1223,23 +2387,73 @@ def _maybe_send_tts(answer: str, chat_id: int, message_id: int, telegram: Telegr
     if not token:
         _log("TTS enabled but TTS_TOKEN is missing.")
         return
-    try:
+    with tracing.span("tts"):
         cleaned = answer.replace("**", "").rstrip()
         cleaned = f"{cleaned} (chuckling)"
-        audio_path = _synthesize_fish_tts(cleaned, token)
-    except Exception as exc:
-        _log(f"TTS failed: {exc}")
-        return
-    try:
-        telegram_send_audio(telegram, chat_id, audio_path, reply_to_message_id=message_id)
-    except Exception as exc:
-        _log_exception("telegram_send_audio", exc)
-
+        model = os.getenv("TTS_MODEL", "s1").strip() or "s1"
+        key = tts_cache_key(cleaned, model, _TTS_REFERENCE_ID)
+        bot_id = telegram.bot_token.split(":", 1)[0]
+        cache = _get_tts_cache()
+        if cache is not None:
+            file_id = cache.file_id(key, bot_id)
+            if file_id is not None:
+                try:
+                    outbound.default_scheduler().send(
+                        chat_id,
+                        lambda: telegram_send_audio_by_id(telegram, chat_id, file_id, reply_to_message_id=message_id),
+                    )
+                    metrics.TTS_CACHE.inc(result="file_id")
+                    return
+                except Exception as exc:
+                    _log_exception("telegram_send_audio_by_id", exc)
+                    cache.forget_file_id(key, bot_id)
+        try:
+            audio_path = _tts_audio_path(cleaned, key, model, token, cache)
+        except Exception as exc:
+            _log(f"TTS failed: {exc}")
+            return
+        try:
+            _, file_id = outbound.default_scheduler().send(
+                chat_id,
+                lambda: telegram_upload_audio(telegram, chat_id, audio_path, reply_to_message_id=message_id),
+            )
+        except Exception as exc:
+            _log_exception("telegram_upload_audio", exc)
+            return
+        finally:
+            if cache is None:
+                _get_artifact_store().release(audio_path)
+        if cache is not None and file_id:
+            cache.remember_file_id(key, bot_id, file_id)
+
+
+def _tts_audio_path(text: str, key: str, model: str, token: str, cache: Optional[TtsCache]) -> str:
+    cached = cache.get_path(key) if cache is not None else None
+    if cached is not None:
+        metrics.TTS_CACHE.inc(result="audio")
+        return cached
+    metrics.TTS_CACHE.inc(result="miss")
+    with metrics.TTS_SECONDS.time():
+        audio_bytes = _synthesize_fish_tts(text, token, model)
+    if cache is not None:
+        return cache.put(key, audio_bytes)
+    return _get_artifact_store().write(audio_bytes, "tts", ".mp3")
+
+
+def _get_tts_cache() -> Optional[TtsCache]:
+    max_mb = _env_int("TELECODE_TTS_CACHE_MB", 64)
+    if max_mb <= 0:
+        return None
+    root = os.getenv("TELECODE_TTS_CACHE_DIR", "").strip() or os.path.join(os.getcwd(), ".telecode_tts")
+    with _ARTIFACT_STORES_GUARD:
+        cache = _TTS_CACHES.get(root)
+        if cache is None:
+            cache = TtsCache(root, max_bytes=max_mb << 20)
+            _TTS_CACHES[root] = cache
+        return cache
 
-def _synthesize_fish_tts(text: str, token: str) -> str:
-    import httpx
 
-    model = os.getenv("TTS_MODEL", "s1").strip() or "s1"
+def _synthesize_fish_tts(text: str, token: str, model: str) -> bytes:
     headers = {
         "Authorization": f"Bearer {token}",
         "Content-Type": "application/json",
@@ -1247,16 +2461,47 @@ def _synthesize_fish_tts(text: str, token: str) -> str:
     }
     payload = {
         "text": text.strip(),
-        "reference_id": "8ef4a238714b45718ce04243307c57a7",
+        "reference_id": _TTS_REFERENCE_ID,
     }
-    with httpx.Client(timeout=60) as client:
-        resp = client.post("https://api.fish.audio/v1/tts", json=payload, headers=headers)
-        resp.raise_for_status()
-        audio_bytes = resp.content
-
-    temp_dir = _ensure_project_temp_dir()
-    filename = f"tts_{uuid.uuid4().hex}.mp3"
-    path = os.path.join(temp_dir, filename)
-    with open(path, "wb") as handle:
-        handle.write(audio_bytes)
-    return path
+    resp = _tts_client().post("https://api.fish.audio/v1/tts", json=payload, headers=headers)
+    resp.raise_for_status()
+    return resp.content
+
+
+def _tts_client() -> Any:
+    global _TTS_CLIENT
+    import httpx
+
+    with _TTS_CLIENT_GUARD:
+        if _TTS_CLIENT is None:
+            _TTS_CLIENT = httpx.Client(timeout=60)
+        return _TTS_CLIENT
+
+
+def _close_tts_client() -> None:
+    global _TTS_CLIENT
+    with _TTS_CLIENT_GUARD:
+        client, _TTS_CLIENT = _TTS_CLIENT, None
+    if client is not None:
+        client.close()
+
+
+def _dispatcher_stat(name: str) -> float:
+    return float(_DISPATCHER.stats()[name]) if _DISPATCHER is not None else 0.0
+
+
+def _held_session_locks() -> int:
+    with _SESSION_LOCKS_GUARD:
+        return sum(1 for lock in _SESSION_LOCKS.values() if lock.held)
+
+
+metrics.JOBS_IN_FLIGHT.set_function(lambda: _dispatcher_stat("running"))
+metrics.JOBS_QUEUED.set_function(lambda: _dispatcher_stat("queued"))
+metrics.SESSION_LOCKS_HELD.set_function(_held_session_locks)
+metrics.OPTION_CACHE_ENTRIES.set_function(lambda: len(_OPTION_CACHE))
+metrics.TEMP_DIR_BYTES.set_function(_temp_dir_bytes)
+metrics.ENGINE_PROCESSES.set_function(lambda: runner.default_runner().running)
+metrics.ENGINE_WAITING.set_function(lambda: runner.default_runner().waiting)
+metrics.OUTBOUND_WAITING.set_function(lambda: outbound.default_scheduler().waiting)
+metrics.CLI_JOBS.set_function(lambda: _JOBS.running if _JOBS is not None else 0)
+metrics.WARM_WORKERS.set_function(lambda: len(_WARM_POOL) if _WARM_POOL is not None else 0)
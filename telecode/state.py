@@ -0,0 +1,107 @@
+from __future__ import annotations
+
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+_FIELDS = ("engine", "claude", "codex")
+
+
+class ChatStateStore:
+    """Per-chat engine overrides and session ids, served from memory and journaled to SQLite.
+
+    Reads never touch disk. Writes update memory immediately and are flushed in batches
+    by a background thread, so a burst of updates costs a single WAL transaction.
+    """
+
+    def __init__(self, path: str, flush_interval_s: float = 0.5) -> None:
+        self.path = path
+        self.flush_interval_s = flush_interval_s
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS chat_state ("
+            "chat_id INTEGER PRIMARY KEY, engine TEXT, claude TEXT, codex TEXT, updated_at REAL)"
+        )
+        self._rows: dict[int, dict[str, Optional[str]]] = {}
+        for chat_id, engine, claude, codex in self._conn.execute(
+            "SELECT chat_id, engine, claude, codex FROM chat_state"
+        ):
+            self._rows[int(chat_id)] = {"engine": engine, "claude": claude, "codex": codex}
+        self._dirty: set[int] = set()
+        self._wake = threading.Event()
+        self._closed = False
+        self._flusher: Optional[threading.Thread] = None
+
+    def get(self, chat_id: int, field: str) -> Optional[str]:
+        row = self._rows.get(chat_id)
+        return row.get(field) if row else None
+
+    def set(self, chat_id: int, field: str, value: Optional[str]) -> None:
+        if field not in _FIELDS:
+            raise ValueError(f"Unknown chat state field: {field}")
+        with self._lock:
+            row = self._rows.setdefault(chat_id, dict.fromkeys(_FIELDS))
+            if row[field] == value:
+                return
+            row[field] = value
+            self._dirty.add(chat_id)
+            self._ensure_flusher()
+        self._wake.set()
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def flush(self) -> None:
+        with self._lock:
+            if not self._dirty:
+                return
+            now = time.time()
+            batch = []
+            for chat_id in self._dirty:
+                row = self._rows[chat_id]
+                batch.append((chat_id, row["engine"], row["claude"], row["codex"], now))
+            self._dirty.clear()
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.executemany(
+                    "INSERT INTO chat_state (chat_id, engine, claude, codex, updated_at) "
+                    "VALUES (?, ?, ?, ?, ?) ON CONFLICT(chat_id) DO UPDATE SET "
+                    "engine=excluded.engine, claude=excluded.claude, codex=excluded.codex, "
+                    "updated_at=excluded.updated_at",
+                    batch,
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                self._dirty.update(row[0] for row in batch)
+                raise
+
+    def close(self) -> None:
+        self._closed = True
+        self._wake.set()
+        if self._flusher is not None:
+            self._flusher.join()
+        self.flush()
+        with self._lock:
+            self._conn.close()
+
+    def _ensure_flusher(self) -> None:
+        if self._flusher is None and not self._closed:
+            self._flusher = threading.Thread(target=self._flush_loop, name="telecode-state", daemon=True)
+            self._flusher.start()
+
+    def _flush_loop(self) -> None:
+        while not self._closed:
+            self._wake.wait()
+            if self._closed:
+                return
+            time.sleep(self.flush_interval_s)
+            self._wake.clear()
+            try:
+                self.flush()
+            except sqlite3.Error as exc:
+                print(f"Warning: failed to persist chat state: {exc}")
@@ -1,22 +1,38 @@
 from __future__ import annotations
 
+import importlib.util
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import suppress
 from dataclasses import dataclass
-from typing import Any
+from typing import IO, Any, Callable
 
 import httpx
 
+from telecode.metrics import DOWNLOAD_BYTES, DOWNLOAD_SECONDS, TELEGRAM_API_SECONDS
+
 
 @dataclass(frozen=True)
 class TelegramConfig:
     bot_token: str
+    http2: bool = False
+    timeout_s: float = 30.0
+    transfer_timeout_s: float = 60.0
+    max_connections: int = 20
+    max_keepalive_connections: int = 10
+    keepalive_expiry_s: float = 60.0
+    api_root: str = "https://api.telegram.org"
 
     @property
     def api_base(self) -> str:
-        return f"https://api.telegram.org/bot{self.bot_token}"
+        return f"{self.api_root}/bot{self.bot_token}"
 
     @property
     def file_base(self) -> str:
-        return f"https://api.telegram.org/file/bot{self.bot_token}"
+        return f"{self.api_root}/file/bot{self.bot_token}"
 
 
 def telegram_send_message(
@@ -32,10 +48,23 @@ def telegram_send_message(
     if reply_markup is not None:
         payload["reply_markup"] = reply_markup
 
-    data = _post_json(f"{config.api_base}/sendMessage", payload)
+    data = _post_json(config, f"{config.api_base}/sendMessage", payload)
     return data["result"]["message_id"]
 
 
+def telegram_edit_message_text(
+    config: TelegramConfig,
+    chat_id: int,
+    message_id: int,
+    text: str,
+    reply_markup: dict[str, Any] | None = None,
+) -> None:
+    payload: dict[str, Any] = {"chat_id": chat_id, "message_id": message_id, "text": text}
+    if reply_markup is not None:
+        payload["reply_markup"] = reply_markup
+    _post_json(config, f"{config.api_base}/editMessageText", payload)
+
+
 def telegram_send_audio(
     config: TelegramConfig,
     chat_id: int,
@@ -43,6 +72,17 @@ def telegram_send_audio(
     caption: str | None = None,
     reply_to_message_id: int | None = None,
 ) -> int:
+    return telegram_upload_audio(config, chat_id, audio_path, caption, reply_to_message_id)[0]
+
+
+def telegram_upload_audio(
+    config: TelegramConfig,
+    chat_id: int,
+    audio_path: str,
+    caption: str | None = None,
+    reply_to_message_id: int | None = None,
+) -> tuple[int, str | None]:
+    """Upload and send an audio file; returns the message id and the file_id to resend it by."""
     payload: dict[str, Any] = {"chat_id": chat_id}
     if caption:
         payload["caption"] = caption
@@ -50,7 +90,45 @@ def telegram_send_audio(
         payload["reply_to_message_id"] = reply_to_message_id
     with open(audio_path, "rb") as handle:
         files = {"audio": handle}
-        data = _post_multipart(f"{config.api_base}/sendAudio", payload, files)
+        data = _post_multipart(config, f"{config.api_base}/sendAudio", payload, files)
+    result = data["result"]
+    media = result.get("audio") or result.get("voice") or result.get("document") or {}
+    return result["message_id"], media.get("file_id")
+
+
+def telegram_send_audio_by_id(
+    config: TelegramConfig,
+    chat_id: int,
+    file_id: str,
+    caption: str | None = None,
+    reply_to_message_id: int | None = None,
+) -> int:
+    """Send audio Telegram already stores, without uploading it again."""
+    payload: dict[str, Any] = {"chat_id": chat_id, "audio": file_id}
+    if caption:
+        payload["caption"] = caption
+    if reply_to_message_id is not None:
+        payload["reply_to_message_id"] = reply_to_message_id
+    data = _post_json(config, f"{config.api_base}/sendAudio", payload)
+    return data["result"]["message_id"]
+
+
+def telegram_send_document(
+    config: TelegramConfig,
+    chat_id: int,
+    document: IO[bytes],
+    filename: str,
+    caption: str | None = None,
+    reply_to_message_id: int | None = None,
+) -> int:
+    """Upload a file object as a document; it is read in chunks, never loaded whole."""
+    payload: dict[str, Any] = {"chat_id": chat_id}
+    if caption:
+        payload["caption"] = caption
+    if reply_to_message_id is not None:
+        payload["reply_to_message_id"] = reply_to_message_id
+    files = {"document": (filename, document, "text/plain")}
+    data = _post_multipart(config, f"{config.api_base}/sendDocument", payload, files)
     return data["result"]["message_id"]
 
 
@@ -65,11 +143,11 @@ def telegram_answer_callback_query(
         payload["text"] = text
     if show_alert:
         payload["show_alert"] = True
-    _post_json(f"{config.api_base}/answerCallbackQuery", payload)
+    _post_json(config, f"{config.api_base}/answerCallbackQuery", payload)
 
 
 def telegram_get_my_commands(config: TelegramConfig) -> list[dict[str, Any]]:
-    data = _post_json(f"{config.api_base}/getMyCommands", {})
+    data = _post_json(config, f"{config.api_base}/getMyCommands", {})
     return data.get("result", [])
 
 
@@ -78,7 +156,7 @@ def telegram_set_my_commands(
     commands: list[dict[str, str]],
 ) -> None:
     payload: dict[str, Any] = {"commands": commands}
-    _post_json(f"{config.api_base}/setMyCommands", payload)
+    _post_json(config, f"{config.api_base}/setMyCommands", payload)
 
 
 def telegram_set_webhook(
@@ -86,14 +164,132 @@ def telegram_set_webhook(
     url: str,
 ) -> None:
     payload: dict[str, Any] = {"url": url}
-    _post_json(f"{config.api_base}/setWebhook", payload)
+    _post_json(config, f"{config.api_base}/setWebhook", payload)
+
+
+def telegram_delete_webhook(config: TelegramConfig, drop_pending_updates: bool = False) -> None:
+    payload: dict[str, Any] = {"drop_pending_updates": drop_pending_updates}
+    _post_json(config, f"{config.api_base}/deleteWebhook", payload)
+
+
+class TelegramRetryAfter(RuntimeError):
+    """Telegram answered 429 Too Many Requests; the call may be repeated after retry_after seconds."""
+
+    def __init__(self, retry_after: float, method: str = "") -> None:
+        super().__init__(f"Telegram rate limit on {method or 'request'}: retry after {retry_after:g}s")
+        self.retry_after = retry_after
+        self.method = method
 
 
-def telegram_download_file(config: TelegramConfig, file_id: str) -> tuple[bytes, str]:
-    file_info = _post_json(f"{config.api_base}/getFile", {"file_id": file_id})
-    file_path = file_info["result"]["file_path"]
+class TelegramFileTooLarge(RuntimeError):
+    """Raised before or during a download once a file exceeds the configured size cap."""
+
+    def __init__(self, size: int, limit: int) -> None:
+        super().__init__(f"File is too large ({size / (1 << 20):.1f} MB; the limit is {limit / (1 << 20):.1f} MB).")
+        self.size = size
+        self.limit = limit
+
+
+def telegram_download_file(
+    config: TelegramConfig, file_id: str, max_bytes: int | None = None
+) -> tuple[bytes, str]:
+    """Download a file into memory. Prefer telegram_download_to_path for anything large."""
+    buffer = bytearray()
+    file_path = _download(config, file_id, buffer.extend, max_bytes)
+    return bytes(buffer), file_path
+
+
+def telegram_download_to_path(
+    config: TelegramConfig,
+    file_id: str,
+    directory: str,
+    prefix: str,
+    default_suffix: str = "",
+    max_bytes: int | None = None,
+) -> tuple[str, str]:
+    """Stream a file into a new file under directory; returns (local path, Telegram file_path).
+
+    Chunks are written to a .part file that is renamed once complete, so a failed or
+    oversized download never leaves a truncated file behind.
+    """
+    info = telegram_get_file(config, file_id)
+    suffix = os.path.splitext(info["file_path"])[1] or default_suffix
+    path = os.path.join(directory, f"{prefix}_{uuid.uuid4().hex}{suffix}")
+    part_path = f"{path}.part"
+    try:
+        with open(part_path, "wb") as handle:
+            file_path = _download(config, file_id, handle.write, max_bytes)
+        os.replace(part_path, path)
+    except BaseException:
+        with suppress(OSError):
+            os.remove(part_path)
+        raise
+    return path, file_path
+
+
+def telegram_get_file(config: TelegramConfig, file_id: str) -> dict[str, Any]:
+    """Resolve file_id with getFile, reusing the answer while its download link is valid."""
+    key = (config.bot_token, file_id)
+    now = time.monotonic()
+    with _FILE_PATHS_GUARD:
+        cached = _FILE_PATHS.get(key)
+        if cached and cached[1] > now:
+            _FILE_PATHS.move_to_end(key)
+            return cached[0]
+    info = _post_json(config, f"{config.api_base}/getFile", {"file_id": file_id})["result"]
+    with _FILE_PATHS_GUARD:
+        _FILE_PATHS[key] = (info, now + _FILE_PATH_TTL_S)
+        _FILE_PATHS.move_to_end(key)
+        while len(_FILE_PATHS) > _FILE_PATHS_MAX:
+            _FILE_PATHS.popitem(last=False)
+    return info
+
+
+def _forget_file(config: TelegramConfig, file_id: str) -> None:
+    with _FILE_PATHS_GUARD:
+        _FILE_PATHS.pop((config.bot_token, file_id), None)
+
+
+def _download(
+    config: TelegramConfig, file_id: str, sink: Callable[[bytes], Any], max_bytes: int | None
+) -> str:
+    info = telegram_get_file(config, file_id)
+    _check_size(info.get("file_size"), max_bytes)
+    start = time.perf_counter()
+    try:
+        size = _stream_file(config, info["file_path"], sink, max_bytes)
+    except httpx.HTTPStatusError as exc:
+        if exc.response.status_code != 404:
+            raise
+        # The remembered download link expired early; resolve it again once.
+        _forget_file(config, file_id)
+        info = telegram_get_file(config, file_id)
+        size = _stream_file(config, info["file_path"], sink, max_bytes)
+    DOWNLOAD_SECONDS.observe(time.perf_counter() - start)
+    DOWNLOAD_BYTES.observe(size)
+    return info["file_path"]
+
+
+def _stream_file(
+    config: TelegramConfig, file_path: str, sink: Callable[[bytes], Any], max_bytes: int | None
+) -> int:
     url = f"{config.file_base}/{file_path}"
-    return _get_bytes(url), file_path
+    total = 0
+    with telegram_client(config).stream("GET", url, timeout=config.transfer_timeout_s) as resp:
+        resp.raise_for_status()
+        length = resp.headers.get("content-length", "")
+        if length.isdigit():
+            _check_size(int(length), max_bytes)
+        for chunk in resp.iter_bytes(_DOWNLOAD_CHUNK_SIZE):
+            total += len(chunk)
+            _check_size(total, max_bytes)
+            sink(chunk)
+    return total
+
+
+def _check_size(size: int | None, max_bytes: int | None) -> None:
+    if size and max_bytes and size > max_bytes:
+        raise TelegramFileTooLarge(size, max_bytes)
 
 
 def telegram_download_voice(config: TelegramConfig, file_id: str) -> bytes:
@@ -101,28 +297,131 @@ def telegram_download_voice(config: TelegramConfig, file_id: str) -> bytes:
     return data
 
 
-def _post_json(url: str, payload: dict[str, Any]) -> dict[str, Any]:
-    with httpx.Client(timeout=30) as client:
-        resp = client.post(url, json=payload)
-        resp.raise_for_status()
-        data = resp.json()
-        if not data.get("ok"):
-            raise RuntimeError(f"Telegram API error: {data}")
-        return data
+async def telegram_get_updates_async(
+    config: TelegramConfig,
+    offset: int | None = None,
+    timeout_s: int = 50,
+    limit: int = 100,
+    allowed_updates: list[str] | None = None,
+) -> list[dict[str, Any]]:
+    """Long-poll getUpdates; the HTTP timeout is stretched to cover the server-side wait."""
+    payload: dict[str, Any] = {"timeout": timeout_s, "limit": limit}
+    if offset is not None:
+        payload["offset"] = offset
+    if allowed_updates is not None:
+        payload["allowed_updates"] = allowed_updates
+    client = telegram_async_client(config)
+    with TELEGRAM_API_SECONDS.time(method="getUpdates"):
+        resp = await client.post(
+            f"{config.api_base}/getUpdates",
+            json=payload,
+            timeout=timeout_s + config.timeout_s,
+        )
+    return _parse_response(resp).get("result", [])
 
 
-def _post_multipart(url: str, payload: dict[str, Any], files: dict[str, Any]) -> dict[str, Any]:
-    with httpx.Client(timeout=60) as client:
-        resp = client.post(url, data=payload, files=files)
-        resp.raise_for_status()
-        data = resp.json()
-        if not data.get("ok"):
-            raise RuntimeError(f"Telegram API error: {data}")
-        return data
+_CLIENTS: dict[TelegramConfig, httpx.Client] = {}
+_ASYNC_CLIENTS: dict[TelegramConfig, httpx.AsyncClient] = {}
+_CLIENTS_GUARD = threading.Lock()
+# Telegram guarantees a getFile link for at least an hour; stay a little under that.
+_FILE_PATH_TTL_S = 3300.0
+_FILE_PATHS_MAX = 4096
+_FILE_PATHS: OrderedDict[tuple[str, str], tuple[dict[str, Any], float]] = OrderedDict()
+_DOWNLOAD_CHUNK_SIZE = 64 << 10
+_FILE_PATHS_GUARD = threading.Lock()
 
 
-def _get_bytes(url: str) -> bytes:
-    with httpx.Client(timeout=60) as client:
-        resp = client.get(url)
-        resp.raise_for_status()
-        return resp.content
+def telegram_client(config: TelegramConfig) -> httpx.Client:
+    """Return the shared keep-alive client for this config, creating it on first use."""
+    with _CLIENTS_GUARD:
+        client = _CLIENTS.get(config)
+        if client is None or client.is_closed:
+            client = httpx.Client(**_client_options(config))
+            _CLIENTS[config] = client
+        return client
+
+
+def telegram_async_client(config: TelegramConfig) -> httpx.AsyncClient:
+    """Async counterpart of telegram_client for use inside the server event loop."""
+    with _CLIENTS_GUARD:
+        client = _ASYNC_CLIENTS.get(config)
+        if client is None or client.is_closed:
+            client = httpx.AsyncClient(**_client_options(config))
+            _ASYNC_CLIENTS[config] = client
+        return client
+
+
+def close_telegram_clients() -> None:
+    with _CLIENTS_GUARD:
+        clients = list(_CLIENTS.values())
+        _CLIENTS.clear()
+    for client in clients:
+        client.close()
+
+
+async def aclose_telegram_clients() -> None:
+    with _CLIENTS_GUARD:
+        clients = list(_ASYNC_CLIENTS.values())
+        _ASYNC_CLIENTS.clear()
+    for client in clients:
+        await client.aclose()
+
+
+def _client_options(config: TelegramConfig) -> dict[str, Any]:
+    return {
+        "timeout": httpx.Timeout(config.timeout_s),
+        "limits": httpx.Limits(
+            max_connections=config.max_connections,
+            max_keepalive_connections=config.max_keepalive_connections,
+            keepalive_expiry=config.keepalive_expiry_s,
+        ),
+        "http2": config.http2 and _http2_available(),
+    }
+
+
+def _http2_available() -> bool:
+    return importlib.util.find_spec("h2") is not None
+
+
+def _post_json(config: TelegramConfig, url: str, payload: dict[str, Any]) -> dict[str, Any]:
+    with TELEGRAM_API_SECONDS.time(method=_method_name(url)):
+        resp = telegram_client(config).post(url, json=payload)
+    return _parse_response(resp)
+
+
+def _post_multipart(
+    config: TelegramConfig,
+    url: str,
+    payload: dict[str, Any],
+    files: dict[str, Any],
+) -> dict[str, Any]:
+    with TELEGRAM_API_SECONDS.time(method=_method_name(url)):
+        resp = telegram_client(config).post(
+            url,
+            data=payload,
+            files=files,
+            timeout=config.transfer_timeout_s,
+        )
+    return _parse_response(resp)
+
+
+def _method_name(url: str) -> str:
+    return url.rsplit("/", 1)[-1]
+
+
+def _parse_response(resp: httpx.Response) -> dict[str, Any]:
+    if resp.status_code == 429:
+        raise TelegramRetryAfter(_retry_after(resp), _method_name(str(resp.request.url)))
+    resp.raise_for_status()
+    data = resp.json()
+    if not data.get("ok"):
+        raise RuntimeError(f"Telegram API error: {data}")
+    return data
+
+
+def _retry_after(resp: httpx.Response) -> float:
+    try:
+        parameters = resp.json().get("parameters") or {}
+        return float(parameters.get("retry_after") or resp.headers.get("Retry-After") or 1)
+    except (ValueError, AttributeError):
+        return 1.0
@@ -0,0 +1,231 @@
+from __future__ import annotations
+
+import json
+import os
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Iterator, Optional
+
+import httpx
+
+
+@dataclass
+class Span:
+    name: str
+    span_id: str
+    parent_id: Optional[str]
+    start_ns: int
+    end_ns: int = 0
+    attributes: dict[str, Any] = field(default_factory=dict)
+    error: Optional[str] = None
+
+
+@dataclass
+class Trace:
+    """One handled update: a root span plus timed child spans for each stage."""
+
+    name: str
+    trace_id: str
+    root: Span
+    spans: list[Span] = field(default_factory=list)
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def add(self, span: Span) -> None:
+        with self._lock:
+            self.spans.append(span)
+
+    def to_dict(self) -> dict[str, Any]:
+        base = self.root.start_ns
+        return {
+            "trace_id": self.trace_id,
+            "name": self.name,
+            "start": self.root.start_ns / 1e9,
+            "duration_ms": (self.root.end_ns - base) / 1e6,
+            "attributes": self.root.attributes,
+            "error": self.root.error,
+            "spans": [
+                {
+                    "name": span.name,
+                    "span_id": span.span_id,
+                    "parent_id": span.parent_id,
+                    "offset_ms": (span.start_ns - base) / 1e6,
+                    "duration_ms": (span.end_ns - span.start_ns) / 1e6,
+                    "attributes": span.attributes,
+                    "error": span.error,
+                }
+                for span in self.spans
+            ],
+        }
+
+
+_CURRENT_TRACE: ContextVar[Optional[Trace]] = ContextVar("telecode_trace", default=None)
+_CURRENT_SPAN: ContextVar[Optional[str]] = ContextVar("telecode_span", default=None)
+_EXPORTERS: list[Any] = []
+_EXPORT_QUEUE: "queue.SimpleQueue[Trace]" = queue.SimpleQueue()
+_EXPORT_THREAD: Optional[threading.Thread] = None
+_EXPORT_GUARD = threading.Lock()
+_EXPORT_PENDING = 0
+
+
+def configure(json_path: Optional[str] = None, otlp_endpoint: Optional[str] = None) -> None:
+    """Select exporters; with none configured, tracing is a no-op."""
+    global _EXPORT_THREAD
+    exporters: list[Any] = []
+    if json_path:
+        exporters.append(JsonLinesExporter(json_path))
+    if otlp_endpoint:
+        exporters.append(OtlpHttpExporter(otlp_endpoint))
+    with _EXPORT_GUARD:
+        _EXPORTERS[:] = exporters
+        if exporters and _EXPORT_THREAD is None:
+            _EXPORT_THREAD = threading.Thread(target=_export_loop, name="telecode-trace", daemon=True)
+            _EXPORT_THREAD.start()
+
+
+def is_enabled() -> bool:
+    return bool(_EXPORTERS)
+
+
+def start_trace(name: str, **attributes: Any) -> Optional[Trace]:
+    if not _EXPORTERS:
+        return None
+    root = Span(name, _new_id(8), None, time.time_ns(), attributes=dict(attributes))
+    return Trace(name, _new_id(16), root)
+
+
+@contextmanager
+def activate(trace: Optional[Trace]) -> Iterator[Optional[Trace]]:
+    """Make trace current for this thread, then finish and export it on exit."""
+    if trace is None:
+        yield None
+        return
+    trace_token = _CURRENT_TRACE.set(trace)
+    span_token = _CURRENT_SPAN.set(trace.root.span_id)
+    try:
+        yield trace
+    except BaseException as exc:
+        trace.root.error = f"{type(exc).__name__}: {exc}"
+        raise
+    finally:
+        _CURRENT_SPAN.reset(span_token)
+        _CURRENT_TRACE.reset(trace_token)
+        trace.root.end_ns = time.time_ns()
+        _enqueue(trace)
+
+
+@contextmanager
+def span(name: str, **attributes: Any) -> Iterator[Optional[Span]]:
+    trace = _CURRENT_TRACE.get()
+    if trace is None:
+        yield None
+        return
+    record = Span(name, _new_id(8), _CURRENT_SPAN.get(), time.time_ns(), attributes=dict(attributes))
+    token = _CURRENT_SPAN.set(record.span_id)
+    try:
+        yield record
+    except BaseException as exc:
+        record.error = f"{type(exc).__name__}: {exc}"
+        raise
+    finally:
+        _CURRENT_SPAN.reset(token)
+        record.end_ns = time.time_ns()
+        trace.add(record)
+
+
+def record_span(trace: Optional[Trace], name: str, start_ns: int, end_ns: int, **attributes: Any) -> None:
+    """Attach an already-timed span, e.g. time spent queued before a worker picked the update up."""
+    if trace is None:
+        return
+    trace.add(Span(name, _new_id(8), trace.root.span_id, start_ns, end_ns, dict(attributes)))
+
+
+def current_trace_id() -> Optional[str]:
+    trace = _CURRENT_TRACE.get()
+    return trace.trace_id if trace else None
+
+
+def flush(timeout_s: float = 5.0) -> None:
+    deadline = time.monotonic() + timeout_s
+    while _EXPORT_PENDING and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+
+class JsonLinesExporter:
+    def __init__(self, path: str) -> None:
+        self.path = path
+
+    def export(self, trace: Trace) -> None:
+        with open(self.path, "a", encoding="utf-8") as handle:
+            handle.write(json.dumps(trace.to_dict(), default=str) + "\n")
+
+
+class OtlpHttpExporter:
+    """Send traces to an OTLP/HTTP collector using the JSON encoding."""
+
+    def __init__(self, endpoint: str) -> None:
+        self.endpoint = endpoint
+        self._client = httpx.Client(timeout=5)
+
+    def export(self, trace: Trace) -> None:
+        spans = [_otlp_span(trace, trace.root)] + [_otlp_span(trace, item) for item in trace.spans]
+        body = {
+            "resourceSpans": [
+                {
+                    "resource": {"attributes": [_otlp_attr("service.name", "telecode")]},
+                    "scopeSpans": [{"scope": {"name": "telecode"}, "spans": spans}],
+                }
+            ]
+        }
+        self._client.post(self.endpoint, json=body).raise_for_status()
+
+
+def _otlp_span(trace: Trace, item: Span) -> dict[str, Any]:
+    data: dict[str, Any] = {
+        "traceId": trace.trace_id,
+        "spanId": item.span_id,
+        "name": item.name,
+        "kind": 1,
+        "startTimeUnixNano": str(item.start_ns),
+        "endTimeUnixNano": str(item.end_ns),
+        "attributes": [_otlp_attr(key, value) for key, value in item.attributes.items()],
+        "status": {"code": 2, "message": item.error} if item.error else {"code": 1},
+    }
+    if item.parent_id:
+        data["parentSpanId"] = item.parent_id
+    return data
+
+
+def _otlp_attr(key: str, value: Any) -> dict[str, Any]:
+    if isinstance(value, bool):
+        return {"key": key, "value": {"boolValue": value}}
+    if isinstance(value, int):
+        return {"key": key, "value": {"intValue": str(value)}}
+    return {"key": key, "value": {"stringValue": str(value)}}
+
+
+def _enqueue(trace: Trace) -> None:
+    global _EXPORT_PENDING
+    with _EXPORT_GUARD:
+        _EXPORT_PENDING += 1
+    _EXPORT_QUEUE.put(trace)
+
+
+def _export_loop() -> None:
+    global _EXPORT_PENDING
+    while True:
+        trace = _EXPORT_QUEUE.get()
+        for exporter in list(_EXPORTERS):
+            try:
+                exporter.export(trace)
+            except Exception as exc:
+                print(f"Warning: failed to export trace {trace.trace_id}: {exc}")
+        with _EXPORT_GUARD:
+            _EXPORT_PENDING -= 1
+
+
+def _new_id(num_bytes: int) -> str:
+    return os.urandom(num_bytes).hex()
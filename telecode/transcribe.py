@@ -0,0 +1,162 @@
+from __future__ import annotations
+
+import importlib.util
+import multiprocessing
+import subprocess
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor, wait
+from concurrent.futures import TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Optional
+
+# Loaded once per worker process by _init_worker.
+_MODEL: Any = None
+_SAMPLE_RATE = 16000
+
+
+class WhisperPool:
+    """Whisper models kept resident in worker processes, fed audio over the pool pipe."""
+
+    def __init__(self, model_name: str = "base", workers: int = 1) -> None:
+        self.model_name = model_name
+        self.workers = max(1, workers)
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._guard = threading.Lock()
+        self._pending = 0
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    def warm(self) -> None:
+        """Spawn every worker and load its model before the first voice note arrives."""
+        executor = self._ensure_executor()
+        done, _ = wait([executor.submit(_ping) for _ in range(self.workers)])
+        if any(isinstance(future.exception(), BrokenProcessPool) for future in done):
+            self._discard(executor)
+
+    def transcribe(self, audio: bytes | str, timeout_s: Optional[float] = None) -> str:
+        """Transcribe audio bytes, or an audio file path that ffmpeg reads directly.
+
+        A pool whose worker died (OOM, a crash in torch or ffmpeg, a failed model load)
+        is replaced and the note is retried once on the new pool.
+        """
+        with self._guard:
+            self._pending += 1
+        try:
+            try:
+                return self._run(audio, timeout_s)
+            except BrokenProcessPool:
+                pass
+            try:
+                return self._run(audio, timeout_s)
+            except BrokenProcessPool as exc:
+                raise RuntimeError("Whisper worker crashed while transcribing.") from exc
+        finally:
+            with self._guard:
+                self._pending -= 1
+
+    def shutdown(self) -> None:
+        with self._guard:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def _run(self, audio: bytes | str, timeout_s: Optional[float]) -> str:
+        executor = self._ensure_executor()
+        future: Optional[Future] = None
+        try:
+            future = executor.submit(_transcribe, audio)
+            return future.result(timeout=timeout_s)
+        except BrokenProcessPool:
+            self._discard(executor)
+            raise
+        except FutureTimeout:
+            if future is not None and not future.cancel():
+                # The job still holds a worker: kill the pool rather than leave it busy forever.
+                self._discard(executor, kill=True)
+            raise RuntimeError(f"Whisper timed out after {timeout_s}s") from None
+
+    def _discard(self, executor: ProcessPoolExecutor, kill: bool = False) -> None:
+        """Drop executor so the next call starts a fresh pool."""
+        with self._guard:
+            if self._executor is executor:
+                self._executor = None
+        if kill:
+            # ProcessPoolExecutor has no public way to stop a running job.
+            for process in list((executor._processes or {}).values()):
+                process.kill()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def _ensure_executor(self) -> ProcessPoolExecutor:
+        with self._guard:
+            if self._executor is None:
+                self._executor = self._new_executor()
+            return self._executor
+
+    def _new_executor(self) -> ProcessPoolExecutor:
+        if importlib.util.find_spec("whisper") is None:
+            raise RuntimeError(
+                "Whisper is not installed. Run `pip install openai-whisper` and ensure ffmpeg is available."
+            )
+        return ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(self.model_name,),
+        )
+
+
+def _init_worker(model_name: str) -> None:
+    global _MODEL
+    import whisper  # type: ignore
+
+    _MODEL = whisper.load_model(model_name)
+
+
+def _ping() -> bool:
+    return _MODEL is not None
+
+
+def _transcribe(audio: bytes | str) -> str:
+    result = _MODEL.transcribe(_decode_audio(audio))
+    text = result.get("text")
+    if not text:
+        raise RuntimeError("Whisper returned empty transcript")
+    return text.strip()
+
+
+def _decode_audio(audio: bytes | str) -> Any:
+    """Decode any ffmpeg-readable audio, from memory or a path, into Whisper's float32 mono input."""
+    import numpy as np  # type: ignore
+
+    cmd = [
+        "ffmpeg",
+        "-nostdin",
+        "-threads",
+        "0",
+        "-i",
+        audio if isinstance(audio, str) else "pipe:0",
+        "-f",
+        "s16le",
+        "-ac",
+        "1",
+        "-acodec",
+        "pcm_s16le",
+        "-ar",
+        str(_SAMPLE_RATE),
+        "pipe:1",
+    ]
+    try:
+        completed = subprocess.run(
+            cmd,
+            input=None if isinstance(audio, str) else audio,
+            capture_output=True,
+            check=True,
+        )
+    except FileNotFoundError as exc:
+        raise RuntimeError("ffmpeg is required for voice notes but was not found on PATH.") from exc
+    except subprocess.CalledProcessError as exc:
+        detail = (exc.stderr or b"").decode("utf-8", "replace").strip()
+        raise RuntimeError(f"Failed to decode audio: {detail}") from exc
+    return np.frombuffer(completed.stdout, np.int16).flatten().astype(np.float32) / 32768.0
@@ -0,0 +1,163 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Optional
+
+
+def tts_cache_key(text: str, model: str, reference_id: str) -> str:
+    """Hash of the whitespace-normalized text and the voice settings that shape the audio."""
+    normalized = " ".join(text.split())
+    return hashlib.sha256("\0".join((normalized, model, reference_id)).encode("utf-8")).hexdigest()
+
+
+@dataclass
+class _Entry:
+    size: int
+    last_used: float
+    file_ids: dict[str, str] = field(default_factory=dict)
+
+
+class TtsCache:
+    """Synthesized speech on disk, keyed by tts_cache_key and bounded by max_bytes.
+
+    Besides the audio, each entry remembers the Telegram file_id of its first upload per
+    bot, so a repeated answer is sent by reference without synthesis or upload. The index
+    lives in SQLite beside the clips and is served from memory; eviction is LRU.
+    """
+
+    def __init__(self, root: str, max_bytes: int = 64 << 20, suffix: str = ".mp3") -> None:
+        self.root = root
+        self.max_bytes = max_bytes
+        self.suffix = suffix
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._entries: dict[str, _Entry] = {}
+        self._bytes = 0
+        os.makedirs(root, exist_ok=True)
+        self._conn = sqlite3.connect(os.path.join(root, "index.db"), check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS tts (key TEXT PRIMARY KEY, size INTEGER, last_used REAL, file_ids TEXT)"
+        )
+        for key, size, last_used, file_ids in self._conn.execute("SELECT key, size, last_used, file_ids FROM tts"):
+            if os.path.exists(self._clip_path(key)):
+                self._entries[key] = _Entry(int(size), float(last_used), _load_file_ids(file_ids))
+                self._bytes += int(size)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def total_bytes(self) -> int:
+        return self._bytes
+
+    def get_path(self, key: str) -> Optional[str]:
+        """Return the cached clip for key, or None on a miss."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                path = self._clip_path(key)
+                if os.path.exists(path):
+                    self._touch(key, entry)
+                    self.hits += 1
+                    return path
+                self._drop(key)
+            self.misses += 1
+            return None
+
+    def file_id(self, key: str, bot_id: str) -> Optional[str]:
+        """Return the file_id this bot got when it first uploaded the clip, if any."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or bot_id not in entry.file_ids:
+                return None
+            self._touch(key, entry)
+            self.hits += 1
+            return entry.file_ids[bot_id]
+
+    def put(self, key: str, audio: bytes) -> str:
+        """Store a clip and return its path."""
+        path = self._clip_path(key)
+        temp_path = f"{path}.{uuid.uuid4().hex}.part"
+        with open(temp_path, "wb") as handle:
+            handle.write(audio)
+        os.replace(temp_path, path)
+        now = time.time()
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= previous.size
+            self._entries[key] = _Entry(len(audio), now)
+            self._bytes += len(audio)
+            self._save(key)
+            self._evict(keep=key)
+        return path
+
+    def remember_file_id(self, key: str, bot_id: str, file_id: str) -> None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return
+            entry.file_ids[bot_id] = file_id
+            self._save(key)
+
+    def forget_file_id(self, key: str, bot_id: str) -> None:
+        """Drop a file_id Telegram no longer accepts; the clip itself is kept."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry.file_ids.pop(bot_id, None) is None:
+                return
+            self._save(key)
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def _clip_path(self, key: str) -> str:
+        return os.path.join(self.root, f"{key}{self.suffix}")
+
+    def _touch(self, key: str, entry: _Entry) -> None:
+        entry.last_used = time.time()
+        self._conn.execute("UPDATE tts SET last_used = ? WHERE key = ?", (entry.last_used, key))
+
+    def _save(self, key: str) -> None:
+        entry = self._entries[key]
+        self._conn.execute(
+            "INSERT OR REPLACE INTO tts (key, size, last_used, file_ids) VALUES (?, ?, ?, ?)",
+            (key, entry.size, entry.last_used, json.dumps(entry.file_ids)),
+        )
+
+    def _drop(self, key: str) -> None:
+        entry = self._entries.pop(key)
+        self._bytes -= entry.size
+        self._conn.execute("DELETE FROM tts WHERE key = ?", (key,))
+        try:
+            os.remove(self._clip_path(key))
+        except OSError:
+            pass
+
+    def _evict(self, keep: str) -> None:
+        if self._bytes <= self.max_bytes:
+            return
+        for key, _ in sorted(self._entries.items(), key=lambda item: item[1].last_used):
+            if self._bytes <= self.max_bytes:
+                break
+            if key != keep:
+                self._drop(key)
+
+
+def _load_file_ids(raw: Optional[str]) -> dict[str, str]:
+    try:
+        value = json.loads(raw or "{}")
+    except json.JSONDecodeError:
+        return {}
+    return {str(bot): str(file_id) for bot, file_id in value.items()} if isinstance(value, dict) else {}
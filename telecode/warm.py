@@ -0,0 +1,345 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+import queue
+import signal
+import threading
+import time
+from collections import deque
+from concurrent.futures import CancelledError, Future
+from typing import Callable, Iterable, Optional
+
+from telecode import runner
+from telecode.claude import StreamParser
+from telecode.runner import EngineRunner, LINE_LIMIT
+
+_TEXT_DONE = object()
+# How long stop() waits for the runner loop to take a worker down.
+_STOP_WAIT_S = 10.0
+
+
+class ClaudeWorker:
+    """One long-lived `claude` process for a session, fed prompts as stream-json over stdin.
+
+    The CLI starts, authenticates and loads the session once; every later turn is one
+    user message on stdin and ends at the matching `result` event on stdout. The process
+    lives on the engine runner's loop, and each turn holds one of its slots, so warm
+    turns count against TELECODE_MAX_PARALLEL like cold ones.
+    """
+
+    def __init__(self, session_id: str, add_dirs: Iterable[str] = (), engine_runner: Optional[EngineRunner] = None) -> None:
+        self.session_id = session_id
+        self.add_dirs = frozenset(add_dirs)
+        self.last_used = time.monotonic()
+        self.turns = 0
+        self._runner = engine_runner
+        self._lock = threading.Lock()
+        self._stderr: deque[str] = deque(maxlen=50)
+        self._proc: Optional[asyncio.subprocess.Process] = None
+        self._stderr_task: Optional[asyncio.Task] = None
+        self._spawn_lock: Optional[asyncio.Lock] = None
+        self._turn: Optional[Future] = None
+        self._fresh = False
+
+    @property
+    def alive(self) -> bool:
+        return self._proc is not None and self._proc.returncode is None
+
+    @property
+    def busy(self) -> bool:
+        return self._lock.locked()
+
+    def start(self, fresh: bool = False) -> Future:
+        """Spawn the process on the runner loop; fresh starts a new session instead of resuming one."""
+        return self._engine().submit(self._ensure_started(fresh))
+
+    def ask(
+        self,
+        prompt: str,
+        timeout_s: Optional[float],
+        on_text: Optional[Callable[[str], None]] = None,
+        fresh: bool = False,
+    ) -> str:
+        """Run one turn; fresh says the session does not exist yet, so a new process creates it."""
+        with self._lock:
+            texts: "queue.SimpleQueue[object]" = queue.SimpleQueue()
+            turn = self._engine().submit(self._ask(prompt, timeout_s, texts.put if on_text else None, fresh))
+            self._turn = turn
+            runner.notify_started(self)
+            try:
+                if on_text is not None:
+                    # Partial text is relayed here so a slow callback never stalls the loop.
+                    turn.add_done_callback(lambda _: texts.put(_TEXT_DONE))
+                    for text in iter(texts.get, _TEXT_DONE):
+                        on_text(text)  # type: ignore[arg-type]
+                return turn.result()
+            except CancelledError as exc:
+                raise RuntimeError("Claude turn was cancelled.") from exc
+            finally:
+                self._turn = None
+                self.last_used = time.monotonic()
+
+    def cancel(self) -> None:
+        """Abort the current turn; the process group is killed and respawned on next use."""
+        turn = self._turn
+        if turn is not None and turn.cancel():
+            return
+        self.stop()
+
+    def stop(self) -> None:
+        proc = self._proc
+        if proc is None or proc.returncode is not None:
+            return
+        engine = self._engine()
+        if not engine.started:
+            # The loop that owned the process is gone; nothing can await it any more.
+            _kill_group(proc.pid)
+            return
+        try:
+            engine.submit(self._stop()).result(timeout=_STOP_WAIT_S)
+        except Exception:
+            _kill_group(proc.pid)
+
+    def _engine(self) -> EngineRunner:
+        return self._runner or runner.default_runner()
+
+    async def _ask(
+        self,
+        prompt: str,
+        timeout_s: Optional[float],
+        on_text: Optional[Callable[[str], None]],
+        fresh: bool,
+    ) -> str:
+        async with self._engine().slot():
+            try:
+                return await asyncio.wait_for(self._attempt(prompt, on_text, fresh), timeout_s or None)
+            except asyncio.TimeoutError:
+                await self._stop()
+                raise RuntimeError(f"Claude timed out after {timeout_s}s") from None
+            except asyncio.CancelledError:
+                await asyncio.shield(self._stop())
+                raise
+
+    async def _attempt(self, prompt: str, on_text: Optional[Callable[[str], None]], fresh: bool) -> str:
+        await self._ensure_started(fresh)
+        try:
+            return await self._turn_once(prompt, on_text)
+        except _WorkerExited as exc:
+            if "No conversation found" not in str(exc) or self._fresh:
+                raise RuntimeError(f"Claude failed: {exc}") from exc
+        # The session does not exist yet: start it under our id and send the prompt again.
+        async with self._spawn_guard():
+            await self._spawn(fresh=True)
+        try:
+            return await self._turn_once(prompt, on_text)
+        except _WorkerExited as exc:
+            raise RuntimeError(f"Claude failed: {exc}") from exc
+
+    async def _turn_once(self, prompt: str, on_text: Optional[Callable[[str], None]]) -> str:
+        proc = self._proc
+        message = {"type": "user", "message": {"role": "user", "content": [{"type": "text", "text": prompt}]}}
+        try:
+            proc.stdin.write((json.dumps(message) + "\n").encode("utf-8"))
+            await proc.stdin.drain()
+        except (BrokenPipeError, ConnectionResetError):
+            raise _WorkerExited(await self._error_detail())
+        parser = StreamParser(on_text or (lambda _: None))
+        while parser.result is None:
+            raw = await proc.stdout.readline()
+            if not raw:
+                raise _WorkerExited(await self._error_detail())
+            parser.feed(raw.decode("utf-8", "replace"))
+        self.turns += 1
+        if parser.is_error:
+            raise RuntimeError(f"Claude failed: {parser.result.strip() or 'unknown error'}")
+        return parser.result.strip()
+
+    async def _ensure_started(self, fresh: bool) -> None:
+        async with self._spawn_guard():
+            if not self.alive:
+                await self._spawn(fresh)
+
+    def _spawn_guard(self) -> asyncio.Lock:
+        """Serializes spawns, e.g. a prespawn racing the first turn; only used on the runner loop."""
+        if self._spawn_lock is None:
+            self._spawn_lock = asyncio.Lock()
+        return self._spawn_lock
+
+    async def _spawn(self, fresh: bool) -> None:
+        await self._stop()
+        cmd = [
+            "claude",
+            "--print",
+            "--input-format",
+            "stream-json",
+            "--output-format",
+            "stream-json",
+            "--verbose",
+            "--include-partial-messages",
+        ]
+        for directory in sorted(self.add_dirs):
+            cmd.extend(["--add-dir", directory])
+        cmd.extend(["--session-id" if fresh else "--resume", self.session_id])
+        self._stderr.clear()
+        self._fresh = fresh
+        proc = await asyncio.create_subprocess_exec(
+            *cmd,
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            start_new_session=True,
+            limit=LINE_LIMIT,
+        )
+        self._proc = proc
+        self._stderr_task = asyncio.create_task(self._drain_stderr(proc))
+
+    async def _drain_stderr(self, proc: asyncio.subprocess.Process) -> None:
+        while True:
+            raw = await proc.stderr.readline()
+            if not raw:
+                return
+            self._stderr.append(raw.decode("utf-8", "replace"))
+
+    async def _stop(self) -> None:
+        proc = self._proc
+        if proc is not None:
+            await runner.terminate(proc)
+        if self._stderr_task is not None:
+            self._stderr_task.cancel()
+            self._stderr_task = None
+
+    async def _error_detail(self) -> str:
+        proc = self._proc
+        if proc is not None:
+            try:
+                await asyncio.wait_for(proc.wait(), 1)
+                if self._stderr_task is not None:
+                    await asyncio.wait_for(asyncio.shield(self._stderr_task), 1)
+            except asyncio.TimeoutError:
+                pass
+        detail = "".join(self._stderr).strip()
+        code = proc.returncode if proc is not None else None
+        return detail or f"exit code {code}"
+
+
+class _WorkerExited(RuntimeError):
+    pass
+
+
+def _kill_group(pid: int) -> None:
+    try:
+        os.killpg(pid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+
+
+class WarmPool:
+    """Warm Claude workers keyed by session id, evicted after idle_ttl_s without a turn.
+
+    Workers, and the reaper that evicts idle ones, run on the engine runner's loop.
+    """
+
+    def __init__(self, idle_ttl_s: float = 600, max_workers: int = 16, engine_runner: Optional[EngineRunner] = None) -> None:
+        self.idle_ttl_s = idle_ttl_s
+        self.max_workers = max(1, max_workers)
+        self._runner = engine_runner
+        self._workers: dict[str, ClaudeWorker] = {}
+        self._guard = threading.Lock()
+        self._reaper: Optional[Future] = None
+
+    def __len__(self) -> int:
+        return len(self._workers)
+
+    def ask(
+        self,
+        session_id: str,
+        prompt: str,
+        timeout_s: Optional[float],
+        add_dirs: Iterable[str] = (),
+        on_text: Optional[Callable[[str], None]] = None,
+        fresh: bool = False,
+    ) -> str:
+        return self._worker(session_id, add_dirs).ask(prompt, timeout_s, on_text, fresh)
+
+    def prespawn(self, session_id: str, add_dirs: Iterable[str] = (), fresh: bool = False) -> None:
+        """Start a worker ahead of the first prompt, e.g. right after a chat picks Claude."""
+        self._worker(session_id, add_dirs).start(fresh)
+
+    def evict(self, session_id: str) -> None:
+        with self._guard:
+            worker = self._workers.pop(session_id, None)
+        if worker is not None:
+            worker.stop()
+
+    def evict_idle(self, now: Optional[float] = None) -> int:
+        victims = self._pop_idle(now)
+        for worker in victims:
+            worker.stop()
+        return len(victims)
+
+    def shutdown(self) -> None:
+        with self._guard:
+            workers = list(self._workers.values())
+            self._workers.clear()
+            reaper, self._reaper = self._reaper, None
+        if reaper is not None:
+            reaper.cancel()
+        for worker in workers:
+            worker.stop()
+
+    def _engine(self) -> EngineRunner:
+        return self._runner or runner.default_runner()
+
+    def _pop_idle(self, now: Optional[float] = None) -> list[ClaudeWorker]:
+        now = time.monotonic() if now is None else now
+        with self._guard:
+            idle = [
+                key
+                for key, worker in self._workers.items()
+                if not worker.busy and now - worker.last_used > self.idle_ttl_s
+            ]
+            return [self._workers.pop(key) for key in idle]
+
+    def _worker(self, session_id: str, add_dirs: Iterable[str]) -> ClaudeWorker:
+        dirs = frozenset(add_dirs)
+        retired: list[ClaudeWorker] = []
+        with self._guard:
+            worker = self._workers.get(session_id)
+            if worker is not None and not dirs <= worker.add_dirs:
+                # --add-dir is fixed at spawn; restart with the wider set of directories.
+                retired.append(worker)
+                worker = None
+            if worker is None:
+                worker = ClaudeWorker(
+                    session_id,
+                    dirs | (retired[0].add_dirs if retired else frozenset()),
+                    engine_runner=self._runner,
+                )
+                self._workers[session_id] = worker
+                retired.extend(self._overflow(session_id))
+            if self._reaper is None:
+                self._reaper = self._engine().submit(self._reap_loop())
+        for old in retired:
+            old.stop()
+        return worker
+
+    def _overflow(self, keep: str) -> list[ClaudeWorker]:
+        idle = sorted(
+            (worker.last_used, key)
+            for key, worker in self._workers.items()
+            if key != keep and not worker.busy
+        )
+        victims = []
+        while len(self._workers) > self.max_workers and idle:
+            _, key = idle.pop(0)
+            victims.append(self._workers.pop(key))
+        return victims
+
+    async def _reap_loop(self) -> None:
+        interval = max(1.0, min(60.0, self.idle_ttl_s / 4))
+        while True:
+            await asyncio.sleep(interval)
+            for worker in self._pop_idle():
+                await worker._stop()
@@ -0,0 +1,34 @@
+import os
+import time
+
+from telecode.artifacts import ArtifactStore
+
+
+def test_leased_files_survive_lru_eviction(tmp_path):
+    store = ArtifactStore(str(tmp_path), max_bytes=10, sweep_interval_s=3600)
+    old = store.write(b"aaaaaa", "image", ".jpg")
+    store.release(old)
+    held = store.write(b"bbbbbb", "image", ".jpg")
+
+    assert store.sweep() == 1
+    assert not os.path.exists(old)
+    assert os.path.exists(held)
+    assert store.total_bytes == 6
+
+    store.release(held)
+    store.close()
+
+
+def test_expired_files_are_swept_and_existing_files_indexed(tmp_path):
+    leftover = tmp_path / "tts_leftover.mp3"
+    leftover.write_bytes(b"xyz")
+    os.utime(leftover, (time.time() - 120, time.time() - 120))
+    store = ArtifactStore(str(tmp_path), max_age_s=60, sweep_interval_s=3600)
+    assert len(store) == 1
+    fresh = store.write(b"new", "image", ".png")
+    store.release(fresh)
+
+    store.sweep()
+    assert store.evicted == 1
+    assert os.listdir(tmp_path) == [os.path.basename(fresh)]
+    store.close()
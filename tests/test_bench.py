@@ -0,0 +1,51 @@
+import asyncio
+
+import httpx
+import pytest
+
+from telecode import bench
+
+
+def test_factory_builds_each_kind_with_unique_update_ids():
+    factory = bench.UpdateFactory(chats=3, user_id=7, username="load", seed=1)
+    updates = {kind: factory.make(kind) for kind in bench.KINDS}
+
+    assert "text" in updates["text"][0]["message"]
+    assert updates["callback"][0]["callback_query"]["data"].startswith("opt:")
+    assert len(updates["photo"][0]["message"]["photo"]) == 3
+    assert updates["voice"][0]["message"]["voice"]["mime_type"] == "audio/ogg"
+    assert "edit_date" in updates["edit"][0]["edited_message"]
+    album = updates["album"]
+    assert 2 <= len(album) <= 4
+    assert len({update["message"]["media_group_id"] for update in album}) == 1
+    all_updates = [update for batch in updates.values() for update in batch]
+    assert len({update["update_id"] for update in all_updates}) == len(all_updates)
+
+
+def test_parse_mix_normalizes_and_rejects_unknown_kinds():
+    assert bench.parse_mix("text=3,photo=1") == {"text": 0.75, "photo": 0.25}
+    with pytest.raises(ValueError):
+        bench.parse_mix("sticker=1")
+    with pytest.raises(ValueError):
+        bench.parse_mix("text=0")
+
+
+def test_run_step_reports_latency_errors_and_breach():
+    seen = []
+
+    def handler(request):
+        seen.append(request)
+        return httpx.Response(500 if len(seen) % 4 == 0 else 200, json={"ok": True})
+
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            factory = bench.UpdateFactory(chats=2, user_id=7, username="load", seed=2)
+            return await bench.run_step(client, "http://bench/telegram/s", factory, {"text": 1.0}, 100, 0.2, seed=3)
+
+    step = asyncio.run(run())
+
+    assert step["sent"] == len(seen) == 20
+    assert step["errors"] == 5 and step["error_kinds"] == {"HTTP 500": 5}
+    assert step["ack_ms"]["count"] == 15
+    assert bench.breach(step, max_error_rate=0.01, max_p99_ms=1000) == "error rate 25.00% > 1.00%"
+    assert bench.breach(step, max_error_rate=0.5, max_p99_ms=1000, min_rate_ratio=0) is None
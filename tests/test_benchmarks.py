@@ -0,0 +1,25 @@
+from benchmarks.compare import compare
+from telecode.bench import percentiles
+
+
+def _report(ack_p99: float, updates_per_s: float, errors: int = 0) -> dict:
+    latency = {"count": 10, "p50": 10.0, "p95": 20.0, "p99": ack_p99, "mean": 12.0, "max": ack_p99}
+    return {"paths": {"text": {"ack_ms": latency, "e2e_ms": latency, "errors": errors, "updates_per_s": updates_per_s}}}
+
+
+def test_percentiles_use_nearest_rank():
+    stats = percentiles([float(value) for value in range(1, 101)])
+    assert (stats["p50"], stats["p95"], stats["p99"], stats["max"]) == (51.0, 96.0, 100.0, 100.0)
+    assert percentiles([])["p50"] is None
+
+
+def test_compare_flags_slower_latency_and_lower_throughput():
+    _, regressions = compare(_report(30.0, 10.0), _report(31.0, 9.8), fail_above=10)
+    assert regressions == []
+    _, regressions = compare(_report(30.0, 10.0), _report(40.0, 8.0, errors=1), fail_above=10)
+    assert regressions == [
+        "text ack p99: +33.3%",
+        "text e2e p99: +33.3%",
+        "text updates/s: -20.0%",
+        "text errors: 0 -> 1",
+    ]
@@ -0,0 +1,44 @@
+import pytest
+
+import telecode.cli as cli
+
+
+@pytest.fixture
+def started(monkeypatch):
+    """Run cli.main() with Telegram, ngrok and uvicorn stubbed; returns registered webhook URLs."""
+    webhooks = []
+    for key in ("TELECODE_ENGINE", "TELECODE_HOST", "TELECODE_PORT", "TELECODE_POLLING", "TELECODE_VERBOSE"):
+        monkeypatch.delenv(key, raising=False)
+    monkeypatch.setenv("PYTHONPATH", ".")
+    monkeypatch.setattr(cli, "_load_config", lambda: None)
+    monkeypatch.setattr(cli, "_ensure_bot_token", lambda: "123:token")
+    monkeypatch.setattr(cli, "_ensure_bot_commands", lambda token: None)
+    monkeypatch.setattr(cli, "_print_command_help", lambda: None)
+    monkeypatch.setattr(cli, "_print_boxed_message", lambda lines: None)
+    monkeypatch.setattr(cli, "telegram_set_webhook", lambda config, url: webhooks.append(url))
+    monkeypatch.setattr(cli, "telegram_delete_webhook", lambda config: None)
+    monkeypatch.setattr(cli.uvicorn, "run", lambda *args, **kwargs: None)
+    return webhooks
+
+
+def test_configured_secret_is_kept_without_tunnel(monkeypatch, started):
+    monkeypatch.setenv("TELEGRAM_WEBHOOK_SECRET", "my-secret")
+    monkeypatch.setattr(cli, "_ensure_tunnel_url", lambda no_ngrok: None)
+    monkeypatch.setattr("sys.argv", ["telecode", "--no-ngrok"])
+
+    cli.main()
+
+    assert cli.os.environ["TELEGRAM_WEBHOOK_SECRET"] == "my-secret"
+    assert started == []
+
+
+def test_tunnel_registers_a_fresh_secret(monkeypatch, started):
+    monkeypatch.setenv("TELEGRAM_WEBHOOK_SECRET", "my-secret")
+    monkeypatch.setattr(cli, "_ensure_tunnel_url", lambda no_ngrok: "https://example.test/")
+    monkeypatch.setattr("sys.argv", ["telecode"])
+
+    cli.main()
+
+    secret = cli.os.environ["TELEGRAM_WEBHOOK_SECRET"]
+    assert secret != "my-secret"
+    assert started == [f"https://example.test/telegram/{secret}"]
@@ -0,0 +1,73 @@
+import json
+import os
+import stat
+import sys
+
+import pytest
+
+from telecode import codex
+
+_EVENTS = [
+    {"type": "thread.started", "thread_id": "thread-42"},
+    {"type": "turn.started"},
+    {"type": "item.started", "item": {"id": "item_0", "type": "command_execution", "command": "bash -lc ls"}},
+    {"type": "item.completed", "item": {"id": "item_0", "type": "command_execution", "command": "bash -lc ls"}},
+    {"type": "item.completed", "item": {"id": "item_1", "type": "agent_message", "text": "Listing files."}},
+    {"type": "item.completed", "item": {"id": "item_2", "type": "agent_message", "text": "Done: 3 files."}},
+    {"type": "turn.completed", "usage": {"input_tokens": 120, "cached_input_tokens": 20, "output_tokens": 8}},
+]
+
+
+def test_parser_reads_events_in_one_pass():
+    texts = []
+    tools = []
+    parser = codex.CodexEventParser(on_text=texts.append, on_tool=lambda kind, summary: tools.append((kind, summary)))
+    parser.feed("Reading prompt from stdin...\n")
+    for event in _EVENTS:
+        parser.feed(json.dumps(event) + "\n")
+
+    assert parser.session_id == "thread-42"
+    assert parser.text == "Done: 3 files."
+    assert texts == ["Listing files.", "Done: 3 files."]
+    assert tools == [("command_execution", "bash -lc ls")]
+    assert parser.tool_calls == {"command_execution": 1}
+    assert parser.usage == {"input": 120, "cached_input": 20, "output": 8}
+
+
+def test_parser_understands_msg_envelope():
+    parser = codex.CodexEventParser()
+    for msg in [
+        {"type": "session_configured", "session_id": "sess-1"},
+        {"type": "exec_command_begin", "command": ["git", "status"]},
+        {"type": "agent_message_delta", "delta": "Hel"},
+        {"type": "agent_message_delta", "delta": "lo"},
+        {"type": "token_count", "info": {"total_token_usage": {"input_tokens": 5, "output_tokens": 2}}},
+    ]:
+        parser.feed(json.dumps({"id": "0", "msg": msg}))
+
+    assert (parser.session_id, parser.text) == ("sess-1", "Hello")
+    assert parser.tool_calls == {"command_execution": 1}
+    assert parser.usage == {"input": 5, "output": 2}
+
+
+def test_ask_codex_exec_runs_json_mode(monkeypatch, tmp_path):
+    script = tmp_path / "codex"
+    lines = "\n".join(json.dumps(event) for event in _EVENTS)
+    script.write_text(
+        f"#!{sys.executable}\n"
+        "import sys\n"
+        "assert sys.argv[1:3] == ['exec', '--json'], sys.argv\n"
+        "if 'fail' in sys.argv:\n"
+        "    print('{\"type\": \"turn.failed\", \"error\": {\"message\": \"quota exceeded\"}}')\n"
+        "    sys.exit(1)\n"
+        f"print({lines!r})\n"
+    )
+    script.chmod(script.stat().st_mode | stat.S_IEXEC)
+    monkeypatch.setenv("PATH", f"{tmp_path}{os.pathsep}{os.environ.get('PATH', '')}")
+
+    answer, session_id, logs = codex.ask_codex_exec("list files", None, 10)
+    assert (answer, session_id) == ("Done: 3 files.", "thread-42")
+    assert "input=120" in logs
+
+    with pytest.raises(RuntimeError, match="quota exceeded"):
+        codex.ask_codex_exec("fail", None, 10)
@@ -0,0 +1,47 @@
+import sqlite3
+
+from telecode.dedup import UpdateDeduplicator
+
+
+def test_duplicates_are_dropped_and_counted():
+    dedup = UpdateDeduplicator(window_s=60, max_size=2)
+
+    assert dedup.check(1) is False
+    assert dedup.check(1) is True
+    assert dedup.check(2) is False
+    assert dedup.check(3) is False
+    assert dedup.check(1) is False
+    assert dedup.check(None) is False
+    assert dedup.dropped == 1
+
+
+def test_seen_updates_survive_restart(tmp_path):
+    path = str(tmp_path / "state.db")
+    first = UpdateDeduplicator(path=path)
+    assert first.check(10) is False
+    first.close()
+
+    second = UpdateDeduplicator(path=path)
+    assert second.check(10) is True
+    second.close()
+
+
+def test_check_does_not_write_to_disk(tmp_path):
+    path = str(tmp_path / "state.db")
+    dedup = UpdateDeduplicator(path=path, flush_interval_s=60)
+
+    def stored():
+        conn = sqlite3.connect(path)
+        try:
+            return [row[0] for row in conn.execute("SELECT update_id FROM seen_updates")]
+        finally:
+            conn.close()
+
+    try:
+        assert dedup.check(20) is False
+        assert dedup.check(21) is False
+        assert stored() == []
+        dedup.flush()
+        assert sorted(stored()) == [20, 21]
+    finally:
+        dedup.close()
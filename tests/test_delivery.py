@@ -0,0 +1,27 @@
+from telecode.delivery import preview, split_message, spool_text
+
+
+def test_split_prefers_paragraphs_and_keeps_everything():
+    paragraphs = [f"Paragraph {index}. " + "word " * 30 for index in range(20)]
+    text = "\n\n".join(part.strip() for part in paragraphs)
+    chunks = split_message(text, 400)
+    assert all(len(chunk) <= 400 for chunk in chunks)
+    assert all(chunk.startswith("Paragraph") for chunk in chunks)
+    assert " ".join(" ".join(chunks).split()) == " ".join(text.split())
+
+
+def test_split_reopens_code_blocks():
+    text = "Intro\n```python\n" + "\n".join(f"print({index})" for index in range(200)) + "\n```\nDone"
+    chunks = split_message(text, 500)
+    assert len(chunks) > 1
+    assert all(len(chunk) <= 500 for chunk in chunks)
+    assert all(chunk.count("```") % 2 == 0 for chunk in chunks)
+    assert all(chunk.startswith("```python\n") for chunk in chunks[1:])
+
+
+def test_preview_and_spool():
+    assert preview("short", 10) == "short"
+    cut = preview("one two three four five", 12)
+    assert len(cut) <= 12 and cut.endswith("…")
+    with spool_text("héllo") as spool:
+        assert spool.read() == "héllo".encode("utf-8")
@@ -0,0 +1,47 @@
+import threading
+
+import pytest
+
+from telecode.dispatcher import Dispatcher, QueueFull
+
+
+def test_jobs_in_one_lane_run_in_order():
+    dispatcher = Dispatcher(workers=4, max_queue=50)
+    seen = []
+
+    for idx in range(20):
+        dispatcher.submit("chat", seen.append, idx)
+
+    assert dispatcher.join(timeout_s=5)
+    assert seen == list(range(20))
+    assert dispatcher.stats()["completed"] == 20
+    assert dispatcher.stats()["lanes"] == 0
+
+
+def test_other_lanes_are_not_blocked_by_a_busy_chat():
+    dispatcher = Dispatcher(workers=2, max_queue=10)
+    release = threading.Event()
+    done = threading.Event()
+
+    dispatcher.submit("slow", release.wait, 5)
+    dispatcher.submit("fast", done.set)
+
+    assert done.wait(2)
+    release.set()
+    assert dispatcher.join(timeout_s=5)
+
+
+def test_full_queue_rejects_and_reports_position():
+    dispatcher = Dispatcher(workers=1, max_queue=2)
+    release = threading.Event()
+    dispatcher.submit("a", release.wait, 5)
+    assert dispatcher.join(timeout_s=0.2) is False
+
+    assert dispatcher.submit("b", lambda: None) == 1
+    assert dispatcher.submit("c", lambda: None) == 2
+    with pytest.raises(QueueFull):
+        dispatcher.submit("d", lambda: None)
+
+    release.set()
+    assert dispatcher.join(timeout_s=5)
+    assert dispatcher.stats()["rejected"] == 1
@@ -0,0 +1,40 @@
+import os
+
+from telecode.media import MediaCache
+
+
+def _write(tmp_path, name, data):
+    path = tmp_path / name
+    path.write_bytes(data)
+    return str(path)
+
+
+def test_identical_bytes_share_one_blob_and_survive_restart(tmp_path):
+    root = tmp_path / "cache"
+    cache = MediaCache(str(root))
+    cache.put_file("uniq-a", _write(tmp_path, "a.jpg", b"same-bytes"), "photos/file_1.jpg")
+    cache.put_file("uniq-b", _write(tmp_path, "b.jpg", b"same-bytes"), "photos/file_2.jpg")
+    assert cache.get_path("uniq-missing") is None
+    cache.close()
+
+    reopened = MediaCache(str(root))
+    path = reopened.get_path("uniq-b")
+    assert path == reopened.get_path("uniq-a")
+    with open(path, "rb") as handle:
+        assert handle.read() == b"same-bytes"
+    assert [entry for entry in os.listdir(root) if entry.endswith(".jpg")] == [os.path.basename(path)]
+    assert reopened.total_bytes == len(b"same-bytes")
+    reopened.close()
+
+
+def test_least_recently_used_media_is_evicted(tmp_path):
+    cache = MediaCache(str(tmp_path / "cache"), max_bytes=8)
+    cache.put_file("old", _write(tmp_path, "a.jpg", b"aaaa"), "a.jpg")
+    cache.put_file("new", _write(tmp_path, "b.jpg", b"bbbb"), "b.jpg")
+    cache.get_path("old")
+    cache.put_file("newest", _write(tmp_path, "c.jpg", b"cccc"), "c.jpg")
+
+    assert cache.get_path("new") is None
+    assert cache.get_path("old")
+    assert cache.get_path("newest")
+    cache.close()
@@ -0,0 +1,29 @@
+from fastapi.testclient import TestClient
+
+import telecode.server as server
+from telecode import metrics
+
+
+def test_histogram_renders_cumulative_buckets():
+    histogram = metrics.Histogram("test_latency_seconds", "Test latency.", buckets=(0.1, 1.0))
+    try:
+        histogram.observe(0.05, method="a")
+        histogram.observe(0.5, method="a")
+        histogram.observe(5, method="a")
+        lines = histogram.render()
+    finally:
+        metrics.REGISTRY.remove(histogram)
+
+    assert 'test_latency_seconds_bucket{method="a",le="0.1"} 1' in lines
+    assert 'test_latency_seconds_bucket{method="a",le="1"} 2' in lines
+    assert 'test_latency_seconds_bucket{method="a",le="+Inf"} 3' in lines
+    assert 'test_latency_seconds_count{method="a"} 3' in lines
+
+
+def test_metrics_endpoint_exposes_pipeline_metrics():
+    response = TestClient(server.app).get("/metrics")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    for name in ("telecode_webhook_ack_seconds", "telecode_engine_seconds", "telecode_temp_dir_bytes"):
+        assert f"# TYPE {name}" in response.text
@@ -0,0 +1,42 @@
+import time
+
+from telecode.outbound import OutboundScheduler
+from telecode.telegram import TelegramRetryAfter
+
+
+def test_retry_after_blocks_chat_then_repeats_call():
+    scheduler = OutboundScheduler()
+    calls = []
+
+    def call():
+        calls.append(time.monotonic())
+        if len(calls) == 1:
+            raise TelegramRetryAfter(0.2, "sendMessage")
+        return 7
+
+    assert scheduler.send(1, call) == 7
+    assert len(calls) == 2
+    assert calls[1] - calls[0] >= 0.2
+
+
+def test_sends_are_paced_per_chat_only():
+    scheduler = OutboundScheduler(chat_rate=10, chat_burst=2, global_rate=1000)
+    started = time.monotonic()
+    for _ in range(4):
+        scheduler.send(1, lambda: None)
+    assert time.monotonic() - started >= 0.19
+    started = time.monotonic()
+    scheduler.send(2, lambda: None)
+    assert time.monotonic() - started < 0.05
+
+
+def test_waiting_edits_of_one_message_are_merged():
+    scheduler = OutboundScheduler(chat_rate=5, chat_burst=1, global_rate=1000)
+    sent = []
+    try:
+        for text in ["a", "b", "c"]:
+            scheduler.edit(1, 10, lambda text=text: sent.append(text), wait=False)
+        scheduler.edit(1, 10, lambda: sent.append("final"))
+    finally:
+        scheduler.shutdown()
+    assert sent == ["a", "final"]
@@ -0,0 +1,91 @@
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+from telecode.runner import LINE_LIMIT, EngineRunner, ProcessCancelled, ProcessTimeout
+
+_SPAWN_CHILD = (
+    "import subprocess, sys, time\n"
+    "child = subprocess.Popen([sys.executable, '-c', 'import time; time.sleep(60)'])\n"
+    "print(child.pid, flush=True)\n"
+    "time.sleep(60)\n"
+)
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    # A killed child may linger as a zombie of its killed parent until init reaps it.
+    try:
+        with open(f"/proc/{pid}/stat") as handle:
+            return handle.read().split()[2] != "Z"
+    except FileNotFoundError:
+        return False
+
+
+def _wait_dead(pid, timeout_s=5):
+    deadline = time.monotonic() + timeout_s
+    while _alive(pid) and time.monotonic() < deadline:
+        time.sleep(0.05)
+    return not _alive(pid)
+
+
+def test_lines_stream_to_caller_and_stdin_is_fed():
+    runner = EngineRunner()
+    lines = []
+    try:
+        result = runner.run(
+            [sys.executable, "-c", "import sys\nfor word in sys.stdin.read().split(): print(word)"],
+            timeout_s=10,
+            input_text="alpha beta",
+            on_line=lines.append,
+        )
+    finally:
+        runner.shutdown()
+    assert result.returncode == 0
+    assert lines == ["alpha\n", "beta\n"]
+    assert result.stdout == "alpha\nbeta\n"
+
+
+def test_timeout_kills_the_whole_process_group():
+    runner = EngineRunner()
+    lines = []
+    try:
+        with pytest.raises(ProcessTimeout):
+            runner.run([sys.executable, "-c", _SPAWN_CHILD], timeout_s=1, on_line=lines.append)
+    finally:
+        runner.shutdown()
+    assert _wait_dead(int(lines[0]))
+
+
+def test_overlong_line_kills_the_whole_process_group():
+    runner = EngineRunner()
+    lines = []
+    script = _SPAWN_CHILD.replace("time.sleep(60)\n", "sys.stdout.write('x' * (LIMIT + 1)); sys.stdout.flush(); time.sleep(60)\n")
+    script = script.replace("LIMIT", str(LINE_LIMIT))
+    try:
+        with pytest.raises(ValueError):
+            runner.run([sys.executable, "-c", script], timeout_s=30, on_line=lines.append)
+    finally:
+        runner.shutdown()
+    assert _wait_dead(int(lines[0]))
+
+
+def test_cancel_stops_a_running_process():
+    runner = EngineRunner()
+    handle = runner.start([sys.executable, "-c", _SPAWN_CHILD], stream=True)
+    lines = handle.lines()
+    child_pid = int(next(lines))
+    threading.Timer(0.1, handle.cancel).start()
+    try:
+        with pytest.raises(ProcessCancelled):
+            list(lines)
+            handle.result()
+    finally:
+        runner.shutdown()
+    assert _wait_dead(child_pid)
@@ -1,4 +1,6 @@
 import os
+import threading
+import time
 
 import telecode.server as server
 
@@ -13,6 +15,23 @@ def _set_cwd(tmp_path, monkeypatch):
     os.environ.pop("TELEGRAM_BOT_TOKEN", None)
 
 
+def _allow_users(value):
+    os.environ["TELECODE_ALLOWED_USERS"] = value
+    server.reload_config()
+
+
+def _fake_download_to(data, file_path, calls=None):
+    def download(config, file_id, directory, prefix, default_suffix="", max_bytes=None):
+        if calls is not None:
+            calls.append(file_id)
+        path = os.path.join(directory, f"{prefix}_{file_id}{os.path.splitext(file_path)[1]}")
+        with open(path, "wb") as handle:
+            handle.write(data)
+        return path, file_path
+
+    return download
+
+
 def test_handle_text_message_calls_prompt(monkeypatch, tmp_path):
     _set_cwd(tmp_path, monkeypatch)
     captured = {}
@@ -22,7 +41,7 @@ def test_handle_text_message_calls_prompt(monkeypatch, tmp_path):
 
     monkeypatch.setattr(server, "_handle_prompt", fake_handle_prompt)
     monkeypatch.setattr(server, "_send_message", lambda *args, **kwargs: 1)
-    os.environ["TELECODE_ALLOWED_USERS"] = ""
+    _allow_users("")
 
     msg = {
         "message_id": 1,
@@ -35,9 +54,10 @@ def test_handle_text_message_calls_prompt(monkeypatch, tmp_path):
     assert captured["prompt"] == "hello"
 
 
-def test_engine_command_persists_to_local_file(monkeypatch, tmp_path):
+def test_engine_switch_is_per_chat_and_default_persists(monkeypatch, tmp_path):
     _set_cwd(tmp_path, monkeypatch)
-    os.environ["TELECODE_ALLOWED_USERS"] = ""
+    _allow_users("")
+    monkeypatch.setenv("TELECODE_ENGINE", "claude")
     sent = []
 
     def fake_send(*args, **kwargs):
@@ -46,61 +66,99 @@ def test_engine_command_persists_to_local_file(monkeypatch, tmp_path):
 
     monkeypatch.setattr(server, "_send_message", fake_send)
 
-    msg = {
-        "message_id": 2,
-        "chat": {"id": 222},
-        "text": "/engine codex",
-        "from": {"id": 222, "username": "tester"},
-    }
-    server.handle_text_message(msg, None, _dummy_telegram(), ".telecode", "claude")
+    def send(text):
+        msg = {
+            "message_id": 2,
+            "chat": {"id": 222},
+            "text": text,
+            "from": {"id": 222, "username": "tester"},
+        }
+        server.handle_text_message(msg, None, _dummy_telegram(), ".telecode", "claude")
 
     config_path = tmp_path / ".telecode"
-    assert config_path.exists()
-    content = config_path.read_text()
-    assert "TELECODE_ENGINE=codex" in content
+    send("/engine codex")
+    assert not config_path.exists()
+    assert server._get_engine_for_chat(222, "claude", ".telecode") == "codex"
+    assert server._get_engine_for_chat(333, "claude", ".telecode") == "claude"
     assert any("Switched engine" in line for line in sent)
 
+    send("/engine default codex")
+    assert "TELECODE_ENGINE=codex" in config_path.read_text()
+    assert any("Default engine set to codex" in line for line in sent)
+    mtime = config_path.stat().st_mtime_ns
+    send("/engine default codex")
+    assert config_path.stat().st_mtime_ns == mtime
+
 
 def test_cli_command_runs_without_prompt(monkeypatch, tmp_path):
     _set_cwd(tmp_path, monkeypatch)
-    os.environ["TELECODE_ALLOWED_USERS"] = ""
-    captured = {"ran": False}
+    _allow_users("")
     sent = []
+    edits = []
 
-    def fake_run(cmd):
-        captured["ran"] = True
-        return "ok"
-
-    monkeypatch.setattr(server, "_run_cli_command", fake_run)
     monkeypatch.setattr(server, "_send_message", lambda *args, **kwargs: sent.append(args[2]) or 1)
+    monkeypatch.setattr(server, "_edit_message", lambda *args, **kwargs: edits.append(args[3]))
     monkeypatch.setattr(server, "_handle_prompt", lambda *args, **kwargs: (_ for _ in ()).throw(AssertionError))
 
     msg = {
         "message_id": 3,
         "chat": {"id": 333},
-        "text": "/cli pwd",
+        "text": "/cli printf ok; printf ' err' >&2",
         "from": {"id": 333, "username": "tester"},
     }
     server.handle_text_message(msg, None, _dummy_telegram(), ".telecode", "claude")
 
-    assert captured["ran"] is True
-    assert sent == ["ok"]
+    assert sent == ["$ printf ok; printf ' err' >&2"]
+    assert edits[-1] == "ok err"
+
+
+def test_slow_cli_command_becomes_background_job(monkeypatch, tmp_path):
+    _set_cwd(tmp_path, monkeypatch)
+    _allow_users("")
+    monkeypatch.setenv("TELECODE_CLI_BACKGROUND_AFTER_S", "0.3")
+    monkeypatch.setattr(server, "_JOBS", None)
+    sent = []
+    edits = []
+    monkeypatch.setattr(server, "_send_message", lambda *args, **kwargs: sent.append(args[2]) or len(sent))
+    monkeypatch.setattr(server, "_edit_message", lambda *args, **kwargs: edits.append(args[3]))
+
+    def command(text):
+        return {"message_id": 4, "chat": {"id": 334}, "text": text, "from": {"id": 334}}
+
+    started = time.monotonic()
+    server.handle_text_message(command("/cli echo first; sleep 30"), None, _dummy_telegram(), ".telecode", "claude")
+    assert time.monotonic() - started < 5
+    assert "continuing as job #" in edits[-1]
+    job = server._get_job_manager().jobs(334)[0]
+    assert job.background and not job.done
+
+    server._handle_tail_request(_dummy_telegram(), command(f"/tail {job.id}"), {"id": 334})
+    assert sent[-1].endswith("first")
+    server._handle_jobs_request(_dummy_telegram(), command("/jobs"), {"id": 334})
+    assert sent[-1].startswith(f"#{job.id} running")
+
+    server._handle_kill_request(_dummy_telegram(), command(f"/kill {job.id}"), {"id": 334})
+    assert job.wait(10)
+    deadline = time.monotonic() + 5
+    while not sent[-1].startswith(f"Job #{job.id} killed") and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert sent[-1].startswith(f"Job #{job.id} killed")
+    assert sent[-1].endswith("Killed.")
+    server._get_job_manager().shutdown()
 
 
 def test_handle_photo_message_passes_image_path(monkeypatch, tmp_path):
     _set_cwd(tmp_path, monkeypatch)
-    os.environ["TELECODE_ALLOWED_USERS"] = ""
+    _allow_users("")
     captured = {}
 
-    def fake_download(config, file_id):
-        return b"fake", "image.jpg"
-
-    def fake_handle_prompt(prompt, chat_id, message_id, timeout_s, telegram, sessions_file, engine, image_paths=None):
+    def fake_handle_prompt(prompt, chat_id, message_id, timeout_s, telegram, sessions_file, engine, image_paths=None, **kwargs):
         captured["paths"] = image_paths
 
-    monkeypatch.setattr(server, "telegram_download_file", fake_download)
+    monkeypatch.setattr(server, "telegram_download_to_path", _fake_download_to(b"fake", "image.jpg"))
     monkeypatch.setattr(server, "_handle_prompt", fake_handle_prompt)
     monkeypatch.setattr(server, "_send_message", lambda *args, **kwargs: 1)
+    monkeypatch.setattr(server, "_edit_message", lambda *args, **kwargs: None)
 
     msg = {
         "message_id": 4,
@@ -117,18 +175,16 @@ def test_handle_photo_message_passes_image_path(monkeypatch, tmp_path):
 
 def test_handle_document_image_passes_image_path(monkeypatch, tmp_path):
     _set_cwd(tmp_path, monkeypatch)
-    os.environ["TELECODE_ALLOWED_USERS"] = ""
+    _allow_users("")
     captured = {}
 
-    def fake_download(config, file_id):
-        return b"fake", "image.png"
-
-    def fake_handle_prompt(prompt, chat_id, message_id, timeout_s, telegram, sessions_file, engine, image_paths=None):
+    def fake_handle_prompt(prompt, chat_id, message_id, timeout_s, telegram, sessions_file, engine, image_paths=None, **kwargs):
         captured["paths"] = image_paths
 
-    monkeypatch.setattr(server, "telegram_download_file", fake_download)
+    monkeypatch.setattr(server, "telegram_download_to_path", _fake_download_to(b"fake", "image.png"))
     monkeypatch.setattr(server, "_handle_prompt", fake_handle_prompt)
     monkeypatch.setattr(server, "_send_message", lambda *args, **kwargs: 1)
+    monkeypatch.setattr(server, "_edit_message", lambda *args, **kwargs: None)
 
     msg = {
         "message_id": 5,
@@ -145,7 +201,7 @@ def test_handle_document_image_passes_image_path(monkeypatch, tmp_path):
 
 def test_disallowed_user_is_blocked(monkeypatch, tmp_path):
     _set_cwd(tmp_path, monkeypatch)
-    os.environ["TELECODE_ALLOWED_USERS"] = "1234"
+    _allow_users("1234")
     sent = []
 
     monkeypatch.setattr(server, "_send_message", lambda *args, **kwargs: sent.append(args[2]) or 1)
@@ -164,7 +220,7 @@ def test_disallowed_user_is_blocked(monkeypatch, tmp_path):
 
 def test_allowed_username_is_accepted(monkeypatch, tmp_path):
     _set_cwd(tmp_path, monkeypatch)
-    os.environ["TELECODE_ALLOWED_USERS"] = "testuser"
+    _allow_users("testuser")
     captured = {}
 
     def fake_handle_prompt(prompt, chat_id, message_id, timeout_s, telegram, sessions_file, engine):
@@ -172,6 +228,7 @@ def test_allowed_username_is_accepted(monkeypatch, tmp_path):
 
     monkeypatch.setattr(server, "_handle_prompt", fake_handle_prompt)
     monkeypatch.setattr(server, "_send_message", lambda *args, **kwargs: 1)
+    monkeypatch.setattr(server, "_edit_message", lambda *args, **kwargs: None)
 
     msg = {
         "message_id": 7,
@@ -183,3 +240,444 @@ def test_allowed_username_is_accepted(monkeypatch, tmp_path):
 
     assert captured["prompt"] == "hi"
 
+
+def test_sessions_are_per_chat(monkeypatch, tmp_path):
+    _set_cwd(tmp_path, monkeypatch)
+
+    first = server._get_or_create_session(101, ".telecode", "claude")
+    second = server._get_or_create_session(202, ".telecode", "claude")
+
+    assert first and second and first != second
+    assert server._get_or_create_session(101, ".telecode", "claude") == first
+
+
+def test_legacy_chat_state_is_migrated_to_store(monkeypatch, tmp_path):
+    _set_cwd(tmp_path, monkeypatch)
+    (tmp_path / ".telecode").write_text(
+        "TELEGRAM_BOT_TOKEN=abc\n"
+        "TELECODE_ENGINE_OVERRIDE_-100=codex\n"
+        "TELECODE_SESSION_CODEX_-100=thread-1\n"
+    )
+
+    assert server._get_engine_for_chat(-100, "claude", ".telecode") == "codex"
+    assert server._get_or_create_session(-100, ".telecode", "codex") == "thread-1"
+    assert (tmp_path / ".telecode").read_text() == "TELEGRAM_BOT_TOKEN=abc\n"
+
+    server._set_engine_for_chat(-100, "claude", ".telecode")
+    server._close_state_stores()
+    assert server._get_engine_for_chat(-100, "codex", ".telecode") == "claude"
+
+
+def test_legacy_global_session_continues_in_first_chat(monkeypatch, tmp_path):
+    _set_cwd(tmp_path, monkeypatch)
+    (tmp_path / ".telecode").write_text(
+        "TELEGRAM_BOT_TOKEN=abc\n"
+        "TELECODE_SESSION_CLAUDE=legacy-claude\n"
+        "TELECODE_SESSION_CODEX=legacy-thread\n"
+    )
+
+    assert server._get_or_create_session(303, ".telecode", "claude") == "legacy-claude"
+    assert server._get_or_create_session(303, ".telecode", "codex") == "legacy-thread"
+    assert (tmp_path / ".telecode").read_text() == "TELEGRAM_BOT_TOKEN=abc\n"
+    other = server._get_or_create_session(404, ".telecode", "claude")
+    assert other and other != "legacy-claude"
+    assert server._get_or_create_session(404, ".telecode", "codex") is None
+
+    server._close_state_stores()
+    assert server._get_or_create_session(303, ".telecode", "claude") == "legacy-claude"
+
+
+def test_streaming_prompt_posts_once_then_edits(monkeypatch, tmp_path):
+    _set_cwd(tmp_path, monkeypatch)
+    monkeypatch.setenv("TELECODE_STREAM", "1")
+    monkeypatch.setenv("TELECODE_STREAM_EDIT_INTERVAL_S", "0")
+    sent = []
+    edits = []
+
+    def fake_engine(prompt, image_paths, timeout_s, engine, chat_id, sessions_file, on_text=None, **kwargs):
+        on_text("Hel")
+        on_text("Hello")
+        return "Hello world", None
+
+    monkeypatch.setattr(server, "_run_engine_locked", fake_engine)
+    monkeypatch.setattr(server, "_send_message", lambda *args, **kwargs: sent.append(args[2]) or 42)
+    monkeypatch.setattr(server, "_edit_message", lambda *args, **kwargs: edits.append((args[2], args[3])))
+
+    server._handle_prompt("hi", 888, 8, None, _dummy_telegram(), ".telecode", "claude")
+
+    assert sent == ["Hel"]
+    assert edits == [(42, "Hello"), (42, "Hello world")]
+
+
+def test_config_snapshot_reloads_when_local_file_changes(monkeypatch, tmp_path):
+    _set_cwd(tmp_path, monkeypatch)
+    monkeypatch.setenv("TELECODE_ALLOWED_USERS", "")
+    monkeypatch.delenv("TELECODE_ALLOWED_USERS")
+    monkeypatch.setattr(server, "_CONFIG_CHECK_INTERVAL_S", 0)
+    server.reload_config()
+    assert server._is_user_allowed_by_meta(5, "someone")
+
+    (tmp_path / ".telecode").write_text("TELECODE_ALLOWED_USERS=42\n")
+
+    assert not server._is_user_allowed_by_meta(5, "someone")
+    assert server._is_user_allowed_by_meta(42, None)
+
+
+def test_webhook_drops_redelivered_update(monkeypatch, tmp_path):
+    from fastapi.testclient import TestClient
+
+    _set_cwd(tmp_path, monkeypatch)
+    monkeypatch.setenv("TELEGRAM_WEBHOOK_SECRET", "s3cret")
+    monkeypatch.setenv("TELEGRAM_BOT_TOKEN", "test-token")
+    monkeypatch.setattr(server, "_DEDUP", None)
+    monkeypatch.setattr(server, "_DISPATCHER", None)
+    server.reload_config()
+    handled = []
+    monkeypatch.setattr(server, "handle_text_message", lambda msg, *args: handled.append(msg["message_id"]))
+
+    update = {
+        "update_id": 9001,
+        "message": {"message_id": 9, "chat": {"id": 999}, "text": "hi", "from": {"id": 999}},
+    }
+    client = TestClient(server.app)
+    assert client.post("/telegram/s3cret", json=update).json() == {"ok": True}
+    assert client.post("/telegram/s3cret", json=update).json() == {"ok": True}
+    assert server._get_dispatcher().join(timeout_s=5)
+
+    assert handled == [9]
+    assert server._DEDUP.dropped == 1
+
+
+def test_queued_texts_are_merged_into_one_turn(monkeypatch, tmp_path):
+    _set_cwd(tmp_path, monkeypatch)
+    _allow_users("")
+    calls = []
+
+    def fake_handle_prompt(prompt, chat_id, message_id, timeout_s, telegram, sessions_file, engine):
+        calls.append((prompt, message_id))
+
+    monkeypatch.setattr(server, "_handle_prompt", fake_handle_prompt)
+    monkeypatch.setattr(server, "_send_message", lambda *args, **kwargs: 1)
+
+    msgs = [
+        {"message_id": 10 + idx, "chat": {"id": 1010}, "text": text, "from": {"id": 1010}}
+        for idx, text in enumerate(["one", "two", "/engine", "three"])
+    ]
+    tokens = [server._track_pending(1010, msg["message_id"], server._mergeable_text(msg)) for msg in msgs]
+    for msg, token in zip(msgs, tokens):
+        server._run_update(1010, token, server.handle_text_message, msg, None, _dummy_telegram(), ".telecode", "claude")
+
+    assert calls == [("one\n\ntwo", 11), ("three", 13)]
+    assert 1010 not in server._PENDING
+
+
+def test_polling_feeds_updates_and_advances_offset(monkeypatch, tmp_path):
+    import asyncio
+
+    _set_cwd(tmp_path, monkeypatch)
+    monkeypatch.setenv("TELEGRAM_BOT_TOKEN", "test-token")
+    server.reload_config()
+    offsets = []
+    processed = []
+
+    async def fake_get_updates(config, offset=None, timeout_s=50, limit=100, allowed_updates=None):
+        offsets.append(offset)
+        if len(offsets) == 1:
+            return [{"update_id": 5}, {"update_id": 6}]
+        raise asyncio.CancelledError
+
+    monkeypatch.setattr(server, "telegram_get_updates_async", fake_get_updates)
+    monkeypatch.setattr(server, "_process_update", lambda update, config: processed.append(update["update_id"]))
+
+    try:
+        asyncio.run(server._poll_updates())
+    except asyncio.CancelledError:
+        pass
+
+    assert processed == [5, 6]
+    assert offsets == [None, 7]
+
+
+def test_voice_update_is_traced_per_stage(monkeypatch, tmp_path):
+    import json
+
+    from telecode import tracing
+
+    _set_cwd(tmp_path, monkeypatch)
+    _allow_users("")
+    monkeypatch.setattr(tracing, "_EXPORTERS", [])
+    trace_file = tmp_path / "traces.jsonl"
+    tracing.configure(json_path=str(trace_file))
+
+    class FakePool:
+        def transcribe(self, audio, timeout_s=None):
+            return "hello"
+
+    monkeypatch.setattr(server, "_send_message", lambda *args, **kwargs: 1)
+    monkeypatch.setattr(server, "_edit_message", lambda *args, **kwargs: None)
+    monkeypatch.setattr(server, "telegram_download_to_path", _fake_download_to(b"ogg", "voice/file_1.oga"))
+    monkeypatch.setattr(server, "_get_whisper_pool", lambda: FakePool())
+    monkeypatch.setattr(server, "ask_claude_code", lambda prompt, **kwargs: "hi there")
+
+    msg = {"message_id": 4, "chat": {"id": 404}, "voice": {"file_id": "v1"}, "from": {"id": 404}}
+    trace = tracing.start_trace("handle_voice_message", chat_id=404)
+    server._run_update(
+        404, None, server.handle_voice_message, msg, None, _dummy_telegram(), ".telecode", "claude",
+        trace=trace, queued_ns=trace.root.start_ns,
+    )
+    tracing.flush()
+
+    record = json.loads(trace_file.read_text().strip())
+    assert record["trace_id"] == trace.trace_id
+    names = [span["name"] for span in record["spans"]]
+    assert names == ["queue", "auth", "placeholder", "download", "transcribe", "engine", "reply"]
+
+
+def test_repeated_photo_is_served_from_media_cache(monkeypatch, tmp_path):
+    _set_cwd(tmp_path, monkeypatch)
+    _allow_users("")
+    downloads = []
+    prompts = []
+
+    def fake_handle_prompt(prompt, chat_id, message_id, timeout_s, telegram, sessions_file, engine, image_paths=None, **kwargs):
+        with open(image_paths[0], "rb") as handle:
+            prompts.append(handle.read())
+
+    monkeypatch.setattr(server, "telegram_download_to_path", _fake_download_to(b"jpeg-bytes", "photos/file_1.jpg", downloads))
+    monkeypatch.setattr(server, "_handle_prompt", fake_handle_prompt)
+    monkeypatch.setattr(server, "_send_message", lambda *args, **kwargs: 1)
+    monkeypatch.setattr(server, "_edit_message", lambda *args, **kwargs: None)
+
+    for chat_id, file_id in [(501, "file-a"), (502, "file-b")]:
+        msg = {
+            "message_id": 5,
+            "chat": {"id": chat_id},
+            "photo": [{"file_id": file_id, "file_unique_id": "uniq-photo", "file_size": 10}],
+            "from": {"id": chat_id},
+        }
+        server.handle_photo_message(msg, None, _dummy_telegram(), ".telecode", "claude")
+
+    assert downloads == ["file-a"]
+    assert prompts == [b"jpeg-bytes", b"jpeg-bytes"]
+
+
+def test_cancel_command_stops_running_turn(monkeypatch, tmp_path):
+    import sys
+    import threading
+    import time
+
+    from telecode import runner
+
+    _set_cwd(tmp_path, monkeypatch)
+    monkeypatch.setenv("TELEGRAM_BOT_TOKEN", "test-token")
+    monkeypatch.setenv("TELEGRAM_WEBHOOK_SECRET", "s3cret")
+    _allow_users("")
+    sent = []
+
+    def fake_claude(prompt, **kwargs):
+        try:
+            runner.default_runner().run([sys.executable, "-c", "import time; time.sleep(60)"])
+        except runner.ProcessCancelled as exc:
+            raise RuntimeError("Claude turn was cancelled.") from exc
+        return "never"
+
+    monkeypatch.setattr(server, "ask_claude_code", fake_claude)
+    monkeypatch.setattr(server, "_send_message", lambda *args, **kwargs: sent.append(args[2]) or 1)
+
+    turn = threading.Thread(
+        target=server._handle_prompt,
+        args=("long task", 707, 7, None, _dummy_telegram(), ".telecode", "claude"),
+    )
+    turn.start()
+    deadline = time.monotonic() + 5
+    while 707 not in server._RUNNING_TURNS and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    update = {"message": {"message_id": 8, "chat": {"id": 707}, "text": "/cancel", "from": {"id": 707}}}
+    server._process_update(update, server.get_config())
+    turn.join(timeout=5)
+
+    assert not turn.is_alive()
+    assert 707 not in server._RUNNING_TURNS
+    assert sent and sent[-1].startswith("Stopped claude after ")
+
+
+def test_stop_button_only_stops_its_own_turn(monkeypatch, tmp_path):
+    import sys
+
+    from telecode import runner
+
+    _set_cwd(tmp_path, monkeypatch)
+    monkeypatch.setenv("TELEGRAM_BOT_TOKEN", "test-token")
+    monkeypatch.setenv("TELEGRAM_WEBHOOK_SECRET", "s3cret")
+    _allow_users("")
+    sent = []
+
+    def fake_claude(prompt, **kwargs):
+        try:
+            runner.default_runner().run([sys.executable, "-c", "import time; time.sleep(60)"])
+        except runner.ProcessCancelled as exc:
+            raise RuntimeError("Claude turn was cancelled.") from exc
+        return "never"
+
+    monkeypatch.setattr(server, "ask_claude_code", fake_claude)
+    monkeypatch.setattr(server, "_send_message", lambda *args, **kwargs: sent.append(args[2]) or 1)
+    monkeypatch.setattr(server, "_answer_callback", lambda *args: None)
+
+    turn = threading.Thread(
+        target=server._handle_prompt,
+        args=("long task", 708, 7, None, _dummy_telegram(), ".telecode", "claude"),
+        kwargs={"stop_message_id": 70},
+    )
+    turn.start()
+    deadline = time.monotonic() + 5
+    while 708 not in server._RUNNING_TURNS and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    def press_stop(message_id):
+        message = {"message_id": message_id, "chat": {"id": 708}, "text": "Processing your image..."}
+        update = {"callback_query": {"id": "cb", "data": server._CANCEL_CALLBACK, "message": message, "from": {"id": 708}}}
+        server._process_update(update, server.get_config())
+
+    press_stop(60)
+    while "Nothing is running." not in sent and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert turn.is_alive()
+
+    press_stop(70)
+    turn.join(timeout=5)
+    assert not turn.is_alive()
+    assert sent[-1].startswith("Stopped claude after ")
+
+
+def test_placeholder_stop_button_is_cleared(monkeypatch, tmp_path):
+    _set_cwd(tmp_path, monkeypatch)
+    _allow_users("")
+    edits = []
+    stop_ids = []
+
+    monkeypatch.setattr(server, "telegram_download_to_path", _fake_download_to(b"jpeg-bytes", "photos/file_1.jpg"))
+    monkeypatch.setattr(server, "_handle_prompt", lambda *args, **kwargs: stop_ids.append(kwargs["stop_message_id"]))
+    monkeypatch.setattr(server, "_send_message", lambda *args, **kwargs: 31)
+    monkeypatch.setattr(server, "_edit_message", lambda *args, **kwargs: edits.append((args[2], kwargs["reply_markup"])))
+
+    msg = {
+        "message_id": 5,
+        "chat": {"id": 503},
+        "photo": [{"file_id": "file-c", "file_unique_id": "uniq-c", "file_size": 10}],
+        "from": {"id": 503},
+    }
+    server.handle_photo_message(msg, None, _dummy_telegram(), ".telecode", "claude")
+
+    assert stop_ids == [31]
+    assert edits == [(31, {"inline_keyboard": []})]
+
+def test_repeated_tts_reply_is_sent_by_file_id(monkeypatch, tmp_path):
+    _set_cwd(tmp_path, monkeypatch)
+    monkeypatch.setenv("TELECODE_TTS", "1")
+    monkeypatch.setenv("TTS_TOKEN", "tts-token")
+    synthesized = []
+    uploads = []
+    resent = []
+
+    def fake_synthesize(text, token, model):
+        synthesized.append(text)
+        return b"mp3-bytes"
+
+    def fake_upload(config, chat_id, audio_path, caption=None, reply_to_message_id=None):
+        with open(audio_path, "rb") as handle:
+            uploads.append(handle.read())
+        return 10, "audio-file-id"
+
+    monkeypatch.setattr(server, "_synthesize_fish_tts", fake_synthesize)
+    monkeypatch.setattr(server, "telegram_upload_audio", fake_upload)
+    monkeypatch.setattr(
+        server,
+        "telegram_send_audio_by_id",
+        lambda config, chat_id, file_id, caption=None, reply_to_message_id=None: resent.append((chat_id, file_id)) or 11,
+    )
+
+    server._maybe_send_tts("**Done.**", 601, 1, _dummy_telegram())
+    server._maybe_send_tts("Done.  ", 602, 2, _dummy_telegram())
+
+    assert synthesized == ["Done. (chuckling)"]
+    assert uploads == [b"mp3-bytes"]
+    assert resent == [(602, "audio-file-id")]
+
+
+def test_long_answer_is_chunked_or_sent_as_document(monkeypatch, tmp_path):
+    _set_cwd(tmp_path, monkeypatch)
+    monkeypatch.setenv("TELECODE_DOCUMENT_THRESHOLD", "10000")
+    sent = []
+    documents = []
+    monkeypatch.setattr(server, "_send_message", lambda *args, **kwargs: sent.append(args[2]) or len(sent))
+    monkeypatch.setattr(
+        server,
+        "telegram_send_document",
+        lambda config, chat_id, document, filename, caption=None, reply_to_message_id=None: documents.append(
+            (filename, document.read(), reply_to_message_id)
+        )
+        or 99,
+    )
+
+    answer = "\n".join(f"line {index} " + "x" * 60 for index in range(100))
+    server._deliver_text(_dummy_telegram(), 701, answer, reply_to_message_id=1)
+    assert len(sent) == 2
+    assert all(len(chunk) <= server._TELEGRAM_TEXT_LIMIT for chunk in sent)
+    assert "\n".join(sent) == answer
+    assert documents == []
+
+    sent.clear()
+    huge = answer * 3
+    server._deliver_text(_dummy_telegram(), 701, huge, reply_to_message_id=1, filename="cli-output.txt")
+    assert len(sent) == 1
+    assert "attached as cli-output.txt" in sent[0]
+    assert documents == [("cli-output.txt", huge.encode("utf-8"), 1)]
+
+
+def test_busy_notices_are_coalesced_per_chat(monkeypatch):
+    release = threading.Event()
+    sent = []
+
+    def fake_send(telegram, chat_id, text, reply_to_message_id=None):
+        sent.append((chat_id, text))
+        release.wait(5)
+        return 1
+
+    monkeypatch.setattr(server, "_send_message", fake_send)
+
+    def notify(position):
+        server._queue_busy_notice(_dummy_telegram(), 444, f"Busy, you're #{position} in queue.", 1)
+
+    notify(1)
+    deadline = time.monotonic() + 5
+    while not sent and time.monotonic() < deadline:
+        time.sleep(0.01)
+    for position in range(2, 6):
+        notify(position)
+    release.set()
+    while 444 in server._BUSY_NOTICES and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    assert sent == [(444, "Busy, you're #1 in queue."), (444, "Busy, you're #5 in queue.")]
+
+
+def test_control_commands_do_not_wait_behind_notices(monkeypatch, tmp_path):
+    _set_cwd(tmp_path, monkeypatch)
+    monkeypatch.setenv("TELEGRAM_BOT_TOKEN", "test-token")
+    monkeypatch.setenv("TELEGRAM_WEBHOOK_SECRET", "s3cret")
+    _allow_users("")
+    release = threading.Event()
+    handled = threading.Event()
+    monkeypatch.setattr(server, "_handle_cancel_request", lambda *args: handled.set())
+
+    # Two notices stuck in rate-limit waits occupy every notice thread.
+    blockers = [server._NOTICES.submit(release.wait, 5) for _ in range(2)]
+    try:
+        update = {"message": {"message_id": 9, "chat": {"id": 909}, "text": "/cancel", "from": {"id": 909}}}
+        server._process_update(update, server.get_config())
+        assert handled.wait(2)
+    finally:
+        release.set()
+        for blocker in blockers:
+            blocker.result()
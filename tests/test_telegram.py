@@ -0,0 +1,134 @@
+import httpx
+
+import telecode.telegram as telegram
+
+
+def test_client_is_reused_per_config(monkeypatch):
+    calls = []
+
+    def handler(request):
+        calls.append(request.url.path)
+        return httpx.Response(200, json={"ok": True, "result": {"message_id": len(calls)}})
+
+    original = telegram._client_options
+    monkeypatch.setattr(
+        telegram,
+        "_client_options",
+        lambda config: {**original(config), "transport": httpx.MockTransport(handler)},
+    )
+    config = telegram.TelegramConfig(bot_token="pool-token")
+    try:
+        first = telegram.telegram_client(config)
+        assert telegram.telegram_send_message(config, 1, "a") == 1
+        assert telegram.telegram_send_message(config, 1, "b") == 2
+        assert telegram.telegram_client(config) is first
+        assert telegram.telegram_client(telegram.TelegramConfig(bot_token="other")) is not first
+    finally:
+        telegram.close_telegram_clients()
+    assert calls == ["/botpool-token/sendMessage", "/botpool-token/sendMessage"]
+
+
+def test_get_file_path_is_reused_until_link_expires(monkeypatch):
+    calls = []
+
+    def handler(request):
+        calls.append(request.url.path)
+        if request.url.path.endswith("/getFile"):
+            return httpx.Response(200, json={"ok": True, "result": {"file_path": "photos/file_1.jpg"}})
+        return httpx.Response(200, content=b"jpeg")
+
+    original = telegram._client_options
+    monkeypatch.setattr(
+        telegram,
+        "_client_options",
+        lambda config: {**original(config), "transport": httpx.MockTransport(handler)},
+    )
+    monkeypatch.setattr(telegram, "_FILE_PATHS", telegram.OrderedDict())
+    config = telegram.TelegramConfig(bot_token="file-token")
+    try:
+        assert telegram.telegram_download_file(config, "f1") == (b"jpeg", "photos/file_1.jpg")
+        assert telegram.telegram_download_file(config, "f1") == (b"jpeg", "photos/file_1.jpg")
+    finally:
+        telegram.close_telegram_clients()
+    assert calls.count("/botfile-token/getFile") == 1
+    assert calls.count("/file/botfile-token/photos/file_1.jpg") == 2
+
+
+def test_download_to_path_enforces_size_cap(monkeypatch, tmp_path):
+    import pytest
+
+    def handler(request):
+        if request.url.path.endswith("/getFile"):
+            return httpx.Response(200, json={"ok": True, "result": {"file_path": "docs/f.pdf"}})
+        return httpx.Response(200, content=b"x" * 32)
+
+    original = telegram._client_options
+    monkeypatch.setattr(
+        telegram,
+        "_client_options",
+        lambda config: {**original(config), "transport": httpx.MockTransport(handler)},
+    )
+    monkeypatch.setattr(telegram, "_FILE_PATHS", telegram.OrderedDict())
+    config = telegram.TelegramConfig(bot_token="cap-token")
+    try:
+        path, file_path = telegram.telegram_download_to_path(config, "unknown-size", str(tmp_path), "doc")
+        assert file_path == "docs/f.pdf"
+        assert path.endswith(".pdf")
+        with open(path, "rb") as handle:
+            assert handle.read() == b"x" * 32
+        with pytest.raises(telegram.TelegramFileTooLarge):
+            telegram.telegram_download_to_path(config, "stream-too-big", str(tmp_path), "doc", max_bytes=16)
+    finally:
+        telegram.close_telegram_clients()
+    assert sorted(entry.name for entry in tmp_path.iterdir()) == [path.rsplit("/", 1)[-1]]
+
+
+def test_too_many_requests_raises_retry_after(monkeypatch):
+    import pytest
+
+    def handler(request):
+        return httpx.Response(
+            429,
+            json={"ok": False, "error_code": 429, "parameters": {"retry_after": 3}},
+        )
+
+    original = telegram._client_options
+    monkeypatch.setattr(
+        telegram,
+        "_client_options",
+        lambda config: {**original(config), "transport": httpx.MockTransport(handler)},
+    )
+    config = telegram.TelegramConfig(bot_token="flood-token")
+    try:
+        with pytest.raises(telegram.TelegramRetryAfter) as excinfo:
+            telegram.telegram_send_message(config, 1, "a")
+    finally:
+        telegram.close_telegram_clients()
+    assert excinfo.value.retry_after == 3
+    assert excinfo.value.method == "sendMessage"
+
+
+def test_api_root_redirects_bot_and_file_urls(monkeypatch):
+    calls = []
+
+    def handler(request):
+        calls.append(str(request.url))
+        if request.url.path.endswith("/getFile"):
+            return httpx.Response(200, json={"ok": True, "result": {"file_path": "voice/file_2.oga"}})
+        return httpx.Response(200, content=b"ogg")
+
+    original = telegram._client_options
+    monkeypatch.setattr(
+        telegram,
+        "_client_options",
+        lambda config: {**original(config), "transport": httpx.MockTransport(handler)},
+    )
+    config = telegram.TelegramConfig(bot_token="root-token", api_root="http://127.0.0.1:8081")
+    try:
+        assert telegram.telegram_download_file(config, "voice-1") == (b"ogg", "voice/file_2.oga")
+    finally:
+        telegram.close_telegram_clients()
+    assert calls == [
+        "http://127.0.0.1:8081/botroot-token/getFile",
+        "http://127.0.0.1:8081/file/botroot-token/voice/file_2.oga",
+    ]
@@ -0,0 +1,97 @@
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import pytest
+
+import telecode.transcribe as transcribe
+from telecode.transcribe import WhisperPool
+
+
+def _echo(audio):
+    return f"heard {audio}"
+
+
+def _crash_once(audio):
+    # audio is a marker path: the first worker to see it dies, the retry succeeds.
+    if not os.path.exists(audio):
+        open(audio, "w").close()
+        os._exit(1)
+    return "recovered"
+
+
+def _slow(audio):
+    time.sleep(float(audio))
+    return "late"
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    created = []
+
+    def new_executor(self):
+        executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"))
+        created.append(executor)
+        return executor
+
+    monkeypatch.setattr(WhisperPool, "_new_executor", new_executor)
+    whisper_pool = WhisperPool("tiny", workers=1)
+    whisper_pool.created = created
+    yield whisper_pool
+    whisper_pool.shutdown()
+
+
+def test_pool_starts_lazily_and_counts_pending(monkeypatch, pool):
+    monkeypatch.setattr(transcribe, "_transcribe", _slow)
+    assert pool.created == []
+
+    results = []
+    thread = threading.Thread(target=lambda: results.append(pool.transcribe("0.5")))
+    thread.start()
+    deadline = time.monotonic() + 5
+    while pool.pending == 0 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert pool.pending == 1
+    thread.join()
+
+    assert results == ["late"]
+    assert pool.pending == 0
+    assert len(pool.created) == 1
+
+
+def test_broken_pool_is_replaced_and_retried(monkeypatch, pool, tmp_path):
+    monkeypatch.setattr(transcribe, "_transcribe", _crash_once)
+
+    assert pool.transcribe(str(tmp_path / "crashed")) == "recovered"
+    assert len(pool.created) == 2
+
+    monkeypatch.setattr(transcribe, "_transcribe", _echo)
+    assert pool.transcribe("again") == "heard again"
+    assert len(pool.created) == 2
+
+
+def test_timed_out_job_recycles_the_pool(monkeypatch, pool):
+    monkeypatch.setattr(transcribe, "_transcribe", _slow)
+
+    with pytest.raises(RuntimeError, match="timed out"):
+        pool.transcribe("30", timeout_s=0.5)
+
+    monkeypatch.setattr(transcribe, "_transcribe", _echo)
+    assert pool.transcribe("next", timeout_s=10) == "heard next"
+    assert len(pool.created) == 2
+
+
+def test_server_applies_whisper_timeout(monkeypatch, pool):
+    import telecode.server as server
+
+    monkeypatch.setattr(transcribe, "_transcribe", _slow)
+    monkeypatch.setattr(server, "_get_whisper_pool", lambda: pool)
+    monkeypatch.setenv("TELECODE_WHISPER_TIMEOUT_S", "0.5")
+
+    started = time.monotonic()
+    with pytest.raises(RuntimeError, match="timed out after 0.5s"):
+        server.transcribe_with_whisper("30")
+    assert time.monotonic() - started < 20
+    assert pool.pending == 0
@@ -0,0 +1,26 @@
+from telecode.tts import TtsCache, tts_cache_key
+
+
+def test_key_ignores_whitespace_but_not_voice():
+    key = tts_cache_key("Hello  there\n", "s1", "voice-a")
+    assert key == tts_cache_key(" Hello there", "s1", "voice-a")
+    assert key != tts_cache_key("Hello there", "s1", "voice-b")
+    assert key != tts_cache_key("Hello there", "speech-1.6", "voice-a")
+
+
+def test_file_ids_survive_restart_and_lru_evicts(tmp_path):
+    root = tmp_path / "tts"
+    cache = TtsCache(str(root), max_bytes=8)
+    cache.put("old", b"aaaa")
+    cache.remember_file_id("old", "123", "file-old")
+    cache.put("new", b"bbbb")
+    cache.close()
+
+    reopened = TtsCache(str(root), max_bytes=8)
+    assert reopened.file_id("old", "123") == "file-old"
+    assert reopened.file_id("old", "456") is None
+    reopened.put("newest", b"cccc")
+    assert reopened.get_path("new") is None
+    assert reopened.get_path("old")
+    assert reopened.total_bytes == 8
+    reopened.close()
@@ -0,0 +1,107 @@
+import os
+import stat
+import sys
+import threading
+import time
+
+from telecode.runner import EngineRunner
+from telecode.warm import WarmPool
+
+_FAKE_CLAUDE = """#!{python}
+import json
+import os
+import sys
+import time
+
+args = sys.argv[1:]
+if os.environ.get("FAKE_CLAUDE_LOG"):
+    with open(os.environ["FAKE_CLAUDE_LOG"], "a") as log:
+        log.write(" ".join(args[-2:]) + "\\n")
+if "--resume" in args:
+    print("No conversation found with session ID: " + args[args.index("--resume") + 1], file=sys.stderr)
+    sys.exit(1)
+for line in sys.stdin:
+    prompt = json.loads(line)["message"]["content"][0]["text"]
+    if prompt.startswith("sleep "):
+        time.sleep(float(prompt.split()[1]))
+    print(json.dumps({{"type": "assistant", "message": {{"content": [{{"type": "text", "text": prompt}}]}}}}), flush=True)
+    print(json.dumps({{"type": "result", "result": "%d:%s" % (os.getpid(), prompt)}}), flush=True)
+"""
+
+
+def _install_fake_claude(monkeypatch, tmp_path):
+    script = tmp_path / "claude"
+    script.write_text(_FAKE_CLAUDE.format(python=sys.executable))
+    script.chmod(script.stat().st_mode | stat.S_IEXEC)
+    monkeypatch.setenv("PATH", f"{tmp_path}{os.pathsep}{os.environ.get('PATH', '')}")
+
+
+def test_warm_worker_reuses_one_process(monkeypatch, tmp_path):
+    _install_fake_claude(monkeypatch, tmp_path)
+    pool = WarmPool(idle_ttl_s=60)
+    seen = []
+    try:
+        first = pool.ask("s1", "hello", timeout_s=10, on_text=seen.append)
+        second = pool.ask("s1", "again", timeout_s=10)
+    finally:
+        pool.shutdown()
+    first_pid, first_text = first.split(":", 1)
+    second_pid, second_text = second.split(":", 1)
+    assert (first_text, second_text) == ("hello", "again")
+    assert first_pid == second_pid
+    assert seen == ["hello"]
+
+
+def test_idle_workers_are_evicted(monkeypatch, tmp_path):
+    _install_fake_claude(monkeypatch, tmp_path)
+    pool = WarmPool(idle_ttl_s=30)
+    try:
+        pool.ask("s1", "hi", timeout_s=10)
+        pool.ask("s2", "hi", timeout_s=10)
+        worker = pool._workers["s1"]
+        worker.last_used -= 60
+        assert pool.evict_idle() == 1
+        assert len(pool) == 1
+        assert not worker.alive
+    finally:
+        pool.shutdown()
+
+
+def test_warm_turns_take_runner_slots(monkeypatch, tmp_path):
+    _install_fake_claude(monkeypatch, tmp_path)
+    engine = EngineRunner(max_parallel=1)
+    pool = WarmPool(idle_ttl_s=60, engine_runner=engine)
+    answers = []
+    try:
+        pool.ask("s1", "warm up", timeout_s=10)
+        pool.ask("s2", "warm up", timeout_s=10)
+        threads = [
+            threading.Thread(target=lambda key=key: answers.append(pool.ask(key, "sleep 0.5", timeout_s=10)))
+            for key in ("s1", "s2")
+        ]
+        for thread in threads:
+            thread.start()
+        deadline = time.monotonic() + 5
+        while engine.waiting == 0 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert (engine.running, engine.waiting) == (1, 1)
+        for thread in threads:
+            thread.join()
+    finally:
+        pool.shutdown()
+        engine.shutdown()
+    assert len(answers) == 2
+
+
+def test_new_session_spawns_once(monkeypatch, tmp_path):
+    _install_fake_claude(monkeypatch, tmp_path)
+    log = tmp_path / "spawns.log"
+    monkeypatch.setenv("FAKE_CLAUDE_LOG", str(log))
+    pool = WarmPool(idle_ttl_s=60)
+    try:
+        pool.prespawn("s1", fresh=True)
+        assert pool.ask("s1", "hi", timeout_s=10, fresh=True).endswith(":hi")
+        assert pool.ask("s2", "hi", timeout_s=10, fresh=True).endswith(":hi")
+    finally:
+        pool.shutdown()
+    assert log.read_text().splitlines() == ["--session-id s1", "--session-id s2"]